@@ -0,0 +1,78 @@
+from database import db
+import csv
+import io
+import json
+
+# Admin data browser: keyset pagination over rowid, validated table/column names
+# and chunked NDJSON/CSV export that never holds a whole table in memory.
+EXPORT_CHUNK_ROWS = 1000
+FILTER_OPERATORS = {'': '=', 'ne': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=', 'like': 'LIKE'}
+RESERVED_PARAMS = {'after', 'limit', 'format', 'order'}
+
+def table_names():
+    return [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+def table_schema(table_name: str):
+    """Columns of a table; raises KeyError if the table doesn't exist"""
+    if table_name not in table_names():
+        raise KeyError(f"Unknown table: {table_name}")
+    return [{"column": row[1], "type": row[2], "nullable": not row[3]} for row in db.execute(f'PRAGMA table_info("{table_name}")')]
+
+def parse_filters(table_name: str, params):
+    """Turn `column` / `column__op` query parameters into a WHERE clause"""
+    columns = {c['column'] for c in table_schema(table_name)}
+    clauses, values = [], []
+    for key, value in params.items():
+        if key in RESERVED_PARAMS:
+            continue
+        column, _, op = key.partition('__')
+        if column not in columns or op not in FILTER_OPERATORS:
+            raise ValueError(f"Invalid filter: {key}")
+        clauses.append(f'"{column}" {FILTER_OPERATORS[op]} ?')
+        values.append(value)
+    return clauses, values
+
+def browse_table(table_name: str, filters=None, after: int = None, limit: int = 100, descending: bool = False):
+    """One page of rows ordered by rowid; returns (rows, next_rowid)"""
+    clauses, values = parse_filters(table_name, filters or {})
+    if after is not None:
+        clauses.append("rowid < ?" if descending else "rowid > ?")
+        values.append(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = "DESC" if descending else "ASC"
+    rows = db.q(f'SELECT rowid AS _rowid, * FROM "{table_name}" {where} ORDER BY rowid {order} LIMIT ?', values + [limit + 1])
+    next_rowid = rows[limit - 1]['_rowid'] if len(rows) > limit else None
+    return rows[:limit], next_rowid
+
+def iter_table_rows(table_name: str, filters=None):
+    """Yield every matching row, one short keyset query per chunk so no read transaction stays open"""
+    after = None
+    while True:
+        rows, after = browse_table(table_name, filters, after, EXPORT_CHUNK_ROWS)
+        yield from rows
+        if after is None:
+            break
+
+def export_ndjson(table_name: str, filters=None):
+    buffer = []
+    for row in iter_table_rows(table_name, filters):
+        row.pop('_rowid', None)
+        buffer.append(json.dumps(row, default=str))
+        if len(buffer) >= EXPORT_CHUNK_ROWS:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+def export_csv(table_name: str, filters=None):
+    columns = [c['column'] for c in table_schema(table_name)]
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for i, row in enumerate(iter_table_rows(table_name, filters), 1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
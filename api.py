@@ -0,0 +1,62 @@
+from fasthtml.common import *
+import base64
+import hashlib
+import json
+
+# Versioned JSON API helpers: opaque keyset cursors, field selection and ETags
+API_VERSION = 'v1'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(key):
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def id_cursor(key):
+    """Row-id keysets (schedule, picks, lines)"""
+    return isinstance(key, int) and not isinstance(key, bool)
+
+def score_cursor(key):
+    """[score, user_id] keysets (standings)"""
+    return (isinstance(key, list) and len(key) == 2 and isinstance(key[0], (int, float)) and not isinstance(key[0], bool)
+            and isinstance(key[1], str))
+
+def decode_cursor(cursor, valid=id_cursor):
+    """Decode a cursor produced by encode_cursor; raises ValueError on garbage or a key of another endpoint's shape"""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not valid(key):
+        raise ValueError("Invalid cursor")
+    return key
+
+def page_size(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def select_fields(rows, fields):
+    """Keep only the comma-separated `fields` that exist on the rows"""
+    if not fields:
+        return rows
+    wanted = [f.strip() for f in fields.split(',') if f.strip()]
+    if isinstance(rows, dict):
+        return {f: rows[f] for f in wanted if f in rows}
+    return [{f: row[f] for f in wanted if f in row} for row in rows]
+
+def api_response(req, data, next_key=None, fields=None, **meta):
+    """JSON response with a strong ETag; answers 304 when the client already has this body"""
+    payload = {'data': select_fields(data, fields), 'next': encode_cursor(next_key), **meta}
+    body = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag in [t.strip() for t in req.headers.get('if-none-match', '').split(',')]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+def api_error(message, status_code=400):
+    return JSONResponse({'error': message}, status_code=status_code)
@@ -1,7 +1,12 @@
 from fasthtml.common import *
 from fasthtml.oauth import GoogleAppClient
-from database import db
+from database import db, upsert_user
 import os
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 google_secret = None
 client = None
@@ -23,9 +28,8 @@ else:
     # Local development
     base_url = "http://localhost:8000"
 
-print(f"DEBUG: base_url set to: {base_url}")  # Debug logging
-print(f"DEBUG: RAILWAY_ENVIRONMENT: {os.environ.get('RAILWAY_ENVIRONMENT')}")  # Debug logging
-print(f"DEBUG: RAILWAY_PUBLIC_DOMAIN: {os.environ.get('RAILWAY_PUBLIC_DOMAIN')}")  # Debug logging
+logger.info(f"OAuth base_url: {base_url} (RAILWAY_ENVIRONMENT={os.environ.get('RAILWAY_ENVIRONMENT')}, "
+            f"RAILWAY_PUBLIC_DOMAIN={os.environ.get('RAILWAY_PUBLIC_DOMAIN')})")
 
 # Set up the Google OAuth client
 def get_google_client():
@@ -39,7 +43,7 @@ def get_google_client():
     if not client_secret or not client_id:
         # For local development, return a mock client
         if not os.environ.get('RAILWAY_ENVIRONMENT'):
-            print("DEBUG: Running in local development mode - using mock Google client")
+            logger.debug("Running in local development mode - using mock Google client")
             return MockGoogleClient()
         raise ValueError("Google OAuth credentials are not available")
 
@@ -82,7 +86,7 @@ def before(req, session):
     return None
 
 # Create Beforeware object
-bware = Beforeware(before, skip=['/login', '/auth_redirect', '/mock_login', '/update_results', '/update_spreads'])
+bware = Beforeware(before, skip=['/login', '/auth_redirect', '/mock_login', '/update_results', '/update_spreads', '/metrics', '/healthz', '/readyz'])
 
 # Login page
 def login(extra_content=None):
@@ -94,9 +98,8 @@ def login(extra_content=None):
         content = ["Login - Local Development", login_button]
     else:
         redirect_uri = f"{base_url}/auth_redirect"
-        print(f"DEBUG: Using redirect_uri: {redirect_uri}")  # Debug logging
         login_url = client.login_link(redirect_uri=redirect_uri)
-        print(f"DEBUG: Generated login_url: {login_url}")  # Debug logging
+        logger.debug(f"Login link for redirect_uri {redirect_uri}: {login_url}")
         login_button = A("Login with Google", href=login_url, cls="button")
         content = ["Login", login_button]
     
@@ -115,8 +118,7 @@ def auth_redirect(code:str, session, state:str=None):
     try:
         client = get_google_client()
         redirect_uri = f"{base_url}/auth_redirect"
-        print(f"DEBUG: Using redirect_uri in auth_redirect: {redirect_uri}")  # Debug logging
-        print(f"DEBUG: Received code: {code}")  # Debug logging
+        logger.debug(f"Exchanging OAuth code with redirect_uri {redirect_uri}")
         info = client.retr_info(code, redirect_uri=redirect_uri)
         user_id = info[client.id_key]
         user_name = info.get('name', user_id)  # Get the user's name, fallback to user_id if not available
@@ -128,9 +130,9 @@ def auth_redirect(code:str, session, state:str=None):
         session['username'] = username  # Store the username in the session
         
         # Always update or insert user information
-        db.t.users.upsert(dict(user_id=user_id, name=user_name, username=username), pk='user_id')
+        upsert_user(user_id, user_name, username)
         
         return RedirectResponse('/', status_code=303)
     except Exception as e:
-        print(f"Error in auth_redirect: {e}")
+        logger.exception(f"Error in auth_redirect: {e}")
         return f"Could not log in. Error: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,90 @@
+from database import db_path
+from datetime import datetime
+import apsw
+import os
+import tempfile
+import time
+import zlib
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.environ.get('BACKUP_DIR', os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups'))
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))
+BACKUP_INTERVAL_HOURS = float(os.environ.get('BACKUP_INTERVAL_HOURS', 24))
+CHUNK_SIZE = 1024 * 1024
+
+def snapshot_to(path: str):
+    """Write a consistent copy of the live database to `path` with the online backup API"""
+    # A connection of its own, so the snapshot never shares one with a request, job or the writer.
+    # One step copies every page inside a single read transaction: under WAL that doesn't hold up
+    # the writer, and a write landing between steps would restart the copy.
+    source = apsw.Connection(db_path, flags=apsw.SQLITE_OPEN_READONLY)
+    dest = apsw.Connection(path)
+    try:
+        with dest.backup("main", source, "main") as backup:
+            backup.step(-1)
+    finally:
+        dest.close()
+        source.close()
+    return path
+
+def create_snapshot():
+    """Snapshot into a temp file next to the database (same volume, so no RAM or /tmp pressure)"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='snapshot-', dir=BACKUP_DIR)
+    os.close(fd)
+    try:
+        return snapshot_to(path)
+    except Exception:
+        os.remove(path)
+        raise
+
+def iter_file(path: str, compress: bool = False, delete: bool = False):
+    """Yield a file in chunks, optionally gzip-compressed on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    try:
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield compressor.compress(chunk) if compressor else chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        if delete:
+            os.remove(path)
+
+def snapshot_filename(compress: bool = False):
+    return f"main-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db" + ('.gz' if compress else '')
+
+def run_scheduled_backup():
+    """Write a gzipped snapshot into BACKUP_DIR and keep only the newest BACKUP_KEEP"""
+    started = time.time()
+    snapshot = create_snapshot()
+    target = os.path.join(BACKUP_DIR, snapshot_filename(compress=True))
+    with open(target + '.part', 'wb') as out:
+        for chunk in iter_file(snapshot, compress=True, delete=True):
+            out.write(chunk)
+    os.replace(target + '.part', target)
+    logger.info(f"Backup written to {target} in {time.time() - started:.1f}s")
+    rotate_backups()
+    return target
+
+def list_backups():
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    return sorted(f for f in os.listdir(BACKUP_DIR) if f.startswith('main-') and f.endswith('.db.gz'))
+
+def next_backup_delay(interval_hours: float = BACKUP_INTERVAL_HOURS):
+    """Seconds until a backup is due: none yet, or the newest older than the interval, means now"""
+    backups = list_backups()
+    if not backups:
+        return 0
+    age = time.time() - os.path.getmtime(os.path.join(BACKUP_DIR, backups[-1]))
+    return max(interval_hours * 3600 - age, 0)
+
+def rotate_backups(keep: int = BACKUP_KEEP):
+    for name in list_backups()[:-keep or None]:
+        os.remove(os.path.join(BACKUP_DIR, name))
+        logger.info(f"Removed old backup {name}")
@@ -0,0 +1,5 @@
+"""Synthetic-league benchmarks: `python -m bench.run` from the repository root.
+
+The app modules bind their database at import time, so bench.run sets PICKEM_DB_PATH to a
+scratch file before it imports bench.generate or bench.scenarios.
+"""
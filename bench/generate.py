@@ -0,0 +1,149 @@
+from database import (db, db_path, picks, spreads, users, league_members, refresh_kickoffs, rebuild_pick_counts, backfill_pick_events,
+                      record_rank_history, current_season, DEFAULT_LEAGUE_ID)
+from datetime import datetime
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Deterministic synthetic league: for a given seed and date, the same users, picks and line
+# history every run. Writes straight into the scratch database named by PICKEM_DB_PATH.
+
+BOOKMAKERS = ['draftkings', 'fanduel', 'betmgm', 'caesars', 'bovada', 'pointsbetus']
+# Games this long past kickoff are treated as final and graded
+FINAL_AFTER_SECONDS = 4 * 3600
+
+def bench_user_id(i: int):
+    return f"bench-user-{i:05d}"
+
+def shift_schedule(now: float):
+    """Move the bundled schedule forward whole 364-day years (weekdays and week numbers hold) until its season is current or next"""
+    last_kickoff = db.execute('SELECT MAX(kickoff) FROM schedule').fetchone()[0]
+    years = 0
+    while last_kickoff + years * 364 * 86400 < now:
+        years += 1
+    if years:
+        db.execute(f"UPDATE schedule SET datetime = strftime('%Y-%m-%dT%H:%M:%S', datetime, '+{364 * years} days')")
+    refresh_kickoffs()
+    return years
+
+def generate_lines(games, polls: int, rng):
+    """Home-team spread polls per game and bookmaker: an opening line plus a half-point random walk"""
+    rows, closing = [], {}
+    for game in games:
+        opening = np.round(rng.normal(-2.0, 6.0) * 2) / 2
+        for bookmaker in BOOKMAKERS:
+            steps = rng.choice([-0.5, 0.0, 0.0, 0.0, 0.5], size=polls)
+            steps[0] = rng.choice([-0.5, 0.0, 0.5])
+            points = opening + np.cumsum(steps)
+            prices = -110 + rng.integers(-8, 9, size=polls)
+            # Polls spread evenly over the six days before kickoff
+            stamps = pd.to_datetime(game['kickoff'] - 6 * 86400 + np.arange(polls) * (6 * 86400 // polls), unit='s', utc=True)
+            stamps = stamps.tz_convert('US/Eastern').map(lambda t: t.isoformat())
+            for point, price, stamp in zip(points, prices, stamps):
+                rows.append(dict(game_id=game['game_id'], bookmaker=bookmaker, team=game['home_team'], team_id=game['home_team_id'],
+                                 point=float(point), price=int(price), timestamp=stamp, season=game['season']))
+                rows.append(dict(game_id=game['game_id'], bookmaker=bookmaker, team=game['away_team'], team_id=game['away_team_id'],
+                                 point=float(-point), price=int(-220 - price), timestamp=stamp, season=game['season']))
+        closing[game['game_id']] = float(points[-1])
+    return rows, closing
+
+def generate_picks(games, user_ids, closing, rng):
+    """Two lock picks (each team once a season, favorites more likely) and one upset pick per user and week"""
+    weeks = {}
+    for game in games:
+        weeks.setdefault(game['week'], []).append(game)
+    rows = []
+    for user_id in user_ids:
+        used_locks = set()
+        for week in sorted(weeks):
+            week_games = weeks[week]
+            order = rng.permutation(len(week_games))
+            picked_games = set()
+            for i in order:
+                if len(picked_games) == 2:
+                    break
+                game = week_games[i]
+                home_favored = closing[game['game_id']] < 0
+                side = 'home' if (rng.random() < 0.7) == home_favored else 'away'
+                if game[f'{side}_team'] in used_locks:
+                    continue
+                used_locks.add(game[f'{side}_team'])
+                picked_games.add(game['game_id'])
+                rows.append(pick_row(user_id, game, side, 'lock', 3.0))
+            underdogs = [week_games[i] for i in order if week_games[i]['game_id'] not in picked_games and closing[week_games[i]['game_id']] != 0]
+            if underdogs:
+                game = underdogs[0]
+                line = closing[game['game_id']]
+                rows.append(pick_row(user_id, game, 'away' if line < 0 else 'home', 'upset', abs(line)))
+    return rows
+
+def pick_row(user_id, game, side, pick_type, points):
+    return dict(user_id=user_id, game_id=game['game_id'], pick=game[f'{side}_team'], team_id=game[f'{side}_team_id'],
+                timestamp=datetime.fromtimestamp(game['kickoff'] - 86400).isoformat(), correct=None, pick_type=pick_type,
+                points=points, season=game['season'], league_id=DEFAULT_LEAGUE_ID)
+
+def grade_finished_games(games, now: float, rng):
+    """Final scores for every game well past kickoff, then grade picks, pick counts and rank history in bulk"""
+    finished = [game for game in games if game['kickoff'] + FINAL_AFTER_SECONDS < now]
+    with db.conn:
+        for game in finished:
+            home, away = rng.integers(3, 38, size=2)
+            if home == away:
+                home += 3
+            db.execute('UPDATE schedule SET home_team_score = ?, away_team_score = ?, completed = 1 WHERE game_id = ?',
+                       [int(home), int(away), game['game_id']])
+        db.execute("""UPDATE picks SET correct = (team_id = (SELECT CASE WHEN s.home_team_score > s.away_team_score
+                                                                         THEN s.home_team_id ELSE s.away_team_id END
+                                                             FROM schedule s WHERE s.game_id = picks.game_id))
+                      WHERE game_id IN (SELECT game_id FROM schedule WHERE completed = 1)""")
+    rebuild_pick_counts()
+    record_rank_history()
+    return len(finished)
+
+def generate_league(n_users: int = 200, polls: int = 12, seed: int = 0, now: float = None):
+    """Fill the empty scratch database with a season of users, picks and spread polls; returns row counts"""
+    if not os.environ.get('PICKEM_DB_PATH'):
+        raise RuntimeError("Set PICKEM_DB_PATH to a scratch database before generating a benchmark league")
+    if db.execute('SELECT COUNT(*) FROM picks').fetchone()[0]:
+        raise RuntimeError(f"{db_path} already has picks; the generator only fills an empty database")
+    started = time.time()
+    now = now or time.time()
+    rng = np.random.default_rng(seed)
+    years = shift_schedule(now)
+    games = db.q("""SELECT game_id, week, season, kickoff, home_team, away_team, home_team_id, away_team_id
+                    FROM schedule WHERE season = ? ORDER BY kickoff, game_id""", [current_season()])
+
+    user_ids = [bench_user_id(i) for i in range(n_users)]
+    joined = datetime.fromtimestamp(now).isoformat()
+    with db.conn:
+        users.insert_all([dict(user_id=user_id, name=f"Bench User {i}", dname=None, username=f"bench{i:05d}")
+                          for i, user_id in enumerate(user_ids)])
+        league_members.insert_all([dict(league_id=DEFAULT_LEAGUE_ID, user_id=user_id, role='member', joined_at=joined)
+                                   for user_id in user_ids])
+        line_rows, closing = generate_lines(games, polls, rng)
+        spreads.insert_all(line_rows)
+        pick_rows = generate_picks(games, user_ids, closing, rng)
+        picks.insert_all(pick_rows)
+    graded = grade_finished_games(games, now, rng)
+    backfill_pick_events()
+    db.execute('ANALYZE')
+
+    summary = dict(season=current_season(), shifted_years=years, users=n_users, games=len(games), graded_games=graded,
+                   picks=len(pick_rows), spreads=len(line_rows), seconds=round(time.time() - started, 2))
+    logger.info(f"Generated benchmark league in {db_path}: {summary}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic league into the empty database at PICKEM_DB_PATH")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--polls', type=int, default=12, help="Spread polls per game and bookmaker")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate_league(args.users, args.polls, args.seed))
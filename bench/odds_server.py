@@ -0,0 +1,160 @@
+from fasthtml.common import FastHTML, JSONResponse
+from fastlite import database
+import pandas as pd
+import numpy as np
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import logging
+import requests
+import uvicorn
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Stand-in for the Odds API's /scores and /odds endpoints. Serves recorded payloads
+# (scores.json / odds.json from `record`) or synthetic ones built from a schedule database,
+# optionally scaled up, with injected latency, errors and a request quota. Point the app at
+# it with ODDS_API_BASE_URL=http://127.0.0.1:<port>.
+
+SPORT = 'americanfootball_nfl'
+BOOKMAKERS = ['draftkings', 'fanduel', 'betmgm', 'caesars', 'bovada', 'pointsbetus', 'betrivers', 'williamhill_us',
+              'unibet_us', 'wynnbet', 'superbook', 'lowvig', 'betonlineag', 'mybookieag', 'betus', 'fliff']
+
+def odds_time(epoch: int):
+    return pd.Timestamp(epoch, unit='s', tz='UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def synthetic_payloads(db_path: str, bookmakers: int = 6, now: float = None, seed: int = 0):
+    """Scores for games kicked off in the last three days and spreads for upcoming ones, from a schedule database"""
+    now = now or time.time()
+    rng = np.random.default_rng(seed)
+    games = database(db_path).q("""SELECT game_id, kickoff, home_team, away_team, home_team_score, away_team_score, completed
+                                   FROM schedule WHERE kickoff BETWEEN ? AND ? ORDER BY kickoff""", [now - 3 * 86400, now + 14 * 86400])
+    scores, odds = [], []
+    for g in games:
+        event = dict(id=f"stub-{g['game_id']}", sport_key=SPORT, sport_title='NFL', commence_time=odds_time(g['kickoff']),
+                     home_team=g['home_team'], away_team=g['away_team'])
+        if g['kickoff'] <= now:
+            home, away = (g['home_team_score'], g['away_team_score']) if g['completed'] else rng.integers(3, 38, size=2)
+            scores.append(dict(event, completed=bool(g['kickoff'] + 4 * 3600 < now), last_update=odds_time(int(now)),
+                               scores=[dict(name=g['home_team'], score=str(home)), dict(name=g['away_team'], score=str(away))]))
+        else:
+            scores.append(dict(event, completed=False, scores=None, last_update=None))
+            point = float(np.round(rng.normal(-2.0, 6.0) * 2) / 2)
+            odds.append(dict(event, bookmakers=[dict(key=key, title=key, last_update=odds_time(int(now)), markets=[dict(
+                key='spreads', last_update=odds_time(int(now)), outcomes=[
+                    dict(name=g['home_team'], price=-110, point=point),
+                    dict(name=g['away_team'], price=-110, point=-point)])]) for key in BOOKMAKERS[:bookmakers]]))
+    return scores, odds
+
+def scale_payload(events, copies: int):
+    """Repeat every event `copies` times under new ids (extra copies don't match the schedule; they load the parser)"""
+    return [dict(e, id=f"{e['id']}-x{i}" if i else e['id']) for i in range(copies) for e in events]
+
+def load_recorded(directory: str):
+    with open(os.path.join(directory, 'scores.json')) as f:
+        scores = json.load(f)
+    with open(os.path.join(directory, 'odds.json')) as f:
+        odds = json.load(f)
+    return scores, odds
+
+def record_payloads(directory: str, base_url: str = 'https://api.the-odds-api.com'):
+    """Save the real API's current /scores and /odds responses as fixtures (uses ODDS_API_KEY and two quota requests)"""
+    os.makedirs(directory, exist_ok=True)
+    api_key = os.environ['ODDS_API_KEY']
+    for name, endpoint, params in [('scores', 'scores', dict(daysFrom=3)),
+                                   ('odds', 'odds', dict(regions='us', markets='spreads', oddsFormat='american'))]:
+        response = requests.get(f"{base_url}/v4/sports/{SPORT}/{endpoint}/", params=dict(apiKey=api_key, **params), timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(directory, f"{name}.json"), 'w') as f:
+            json.dump(response.json(), f, indent=1)
+        logger.info(f"Recorded {len(response.json())} {name} events to {directory}")
+
+def create_app(scores, odds, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, quota: int = 500, seed: int = 0):
+    """The stand-in app; `app.state.stats` counts requests, injected errors and quota used"""
+    app = FastHTML()
+    rng = np.random.default_rng(seed)
+    state = dict(remaining=quota, used=0, requests=0, errors=0)
+    app.state.stats = state
+    lock = threading.Lock()
+
+    async def serve(payload, cost: int):
+        with lock:
+            state['requests'] += 1
+            delay = max(0.0, latency_ms + (rng.normal(0, jitter_ms) if jitter_ms else 0)) / 1000
+            fail = rng.random() < error_rate
+            if state['remaining'] < cost:
+                return JSONResponse({"message": "Usage quota has been reached.", "error_code": "OUT_OF_USAGE_CREDITS"},
+                                    status_code=401, headers=quota_headers(0))
+            state['remaining'] -= cost
+            state['used'] += cost
+            headers = quota_headers(cost)
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            with lock:
+                state['errors'] += 1
+            return JSONResponse({"message": "Injected failure"}, status_code=int(rng.choice([429, 500, 502, 503])), headers=headers)
+        return JSONResponse(payload, headers=headers)
+
+    def quota_headers(cost: int):
+        return {'x-requests-remaining': str(state['remaining']), 'x-requests-used': str(state['used']), 'x-requests-last': str(cost)}
+
+    @app.route(f'/v4/sports/{SPORT}/scores/')
+    async def get_scores(daysFrom: int = None):
+        # Scores cost 2 with daysFrom, 1 without
+        return await serve(scores, 2 if daysFrom else 1)
+
+    @app.route(f'/v4/sports/{SPORT}/odds/')
+    async def get_odds(markets: str = 'h2h', regions: str = 'us'):
+        # Odds cost one per market per region
+        return await serve(odds, len(markets.split(',')) * len(regions.split(',')))
+
+    @app.route('/stats')
+    def get_stats():
+        return JSONResponse(state)
+
+    return app
+
+def start_in_thread(app, port: int = 0):
+    """Run the stand-in on a background thread; returns its base URL once it is listening"""
+    config = uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning')
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="odds-server", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Odds API")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve_parser = sub.add_parser('serve', help="Serve recorded or synthetic payloads")
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--fixtures', help="Directory with recorded scores.json and odds.json")
+    serve_parser.add_argument('--db', default=os.environ.get('PICKEM_DB_PATH', 'data/local_dev.db'),
+                              help="Schedule database for synthetic payloads (when no --fixtures)")
+    serve_parser.add_argument('--bookmakers', type=int, default=6, help="Bookmakers per synthetic event")
+    serve_parser.add_argument('--scale', type=int, default=1, help="Serve each event this many times")
+    serve_parser.add_argument('--latency-ms', type=float, default=0)
+    serve_parser.add_argument('--jitter-ms', type=float, default=0)
+    serve_parser.add_argument('--error-rate', type=float, default=0, help="Share of requests answered with 429/5xx")
+    serve_parser.add_argument('--quota', type=int, default=500, help="Requests left in the simulated monthly quota")
+    serve_parser.add_argument('--seed', type=int, default=0)
+    record_parser = sub.add_parser('record', help="Save the real API's current payloads as fixtures")
+    record_parser.add_argument('directory')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_payloads(args.directory)
+    else:
+        scores, odds = load_recorded(args.fixtures) if args.fixtures else synthetic_payloads(args.db, args.bookmakers, seed=args.seed)
+        scores, odds = scale_payload(scores, args.scale), scale_payload(odds, args.scale)
+        logger.info(f"Serving {len(scores)} score events and {len(odds)} odds events on port {args.port}")
+        uvicorn.run(create_app(scores, odds, args.latency_ms, args.jitter_ms, args.error_rate, args.quota, args.seed),
+                    host='127.0.0.1', port=args.port, log_level='warning')
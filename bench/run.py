@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import logging
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# End-to-end benchmark: generate a league into a scratch database, run every scenario,
+# report p50/p99 latency and queries per request, and diff against the stored baseline.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def measure(db, run, reset, runs: int, warmup: int):
+    """Time `runs` iterations after `warmup` untimed ones; returns per-iteration seconds and statement counts"""
+    queries = 0
+
+    def count(cursor, sql, bindings):
+        nonlocal queries
+        queries += 1
+        return True
+
+    timings, counts, errors = [], [], 0
+    for i in range(warmup + runs):
+        queries = 0
+        db.conn.exec_trace = count
+        started = time.perf_counter()
+        try:
+            response = run(i)
+            errors += getattr(response, 'status_code', 200) >= 400
+        except Exception as e:
+            logger.warning(f"Iteration {i} failed: {e}")
+            errors += 1
+        finally:
+            elapsed = time.perf_counter() - started
+            db.conn.exec_trace = None
+        if i >= warmup:
+            timings.append(elapsed)
+            counts.append(queries)
+        if reset:
+            reset(i)
+    return timings, counts, errors
+
+def summarize(timings, counts, errors):
+    p50, p99 = np.percentile(np.array(timings) * 1000, [50, 99])
+    return dict(runs=len(timings), p50_ms=round(float(p50), 2), p99_ms=round(float(p99), 2),
+                queries=round(float(np.mean(counts)), 1), errors=errors)
+
+def compare(results, baseline, tolerance: float):
+    """Per-scenario changes against the baseline; a scenario regresses on more queries or a slower p50 beyond tolerance"""
+    diffs = {}
+    for name, result in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        p50_change = result['p50_ms'] / base['p50_ms'] - 1 if base['p50_ms'] else 0.0
+        diffs[name] = dict(p50_change=p50_change, queries_change=result['queries'] - base['queries'],
+                           regressed=result['queries'] > base['queries'] or p50_change > tolerance)
+    return diffs
+
+def format_results(results, diffs):
+    lines = [f"{'scenario':<16}{'runs':>6}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}   vs baseline"]
+    for name, r in results.items():
+        line = f"{name:<16}{r['runs']:>6}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['queries']:>9.1f}{r['errors']:>8}"
+        if name in diffs:
+            d = diffs[name]
+            line += f"   p50 {d['p50_change']:+.0%}, queries {d['queries_change']:+.1f}{'  REGRESSED' if d['regressed'] else ''}"
+        lines.append(line)
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the end-to-end benchmark suite against a generated league")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--polls', type=int, default=12, help="Spread polls per game and bookmaker")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--runs', type=int, default=30, help="Timed iterations per scenario")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', help="Comma-separated scenario names")
+    parser.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'pickem-bench'),
+                        help="Scratch directory for the generated database (emptied first)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="Write these results as the new baseline")
+    parser.add_argument('--check', action='store_true', help="Exit non-zero if any scenario regressed")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p50 slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument('--odds-latency-ms', type=float, default=0, help="Latency the Odds API stand-in adds to each response")
+    parser.add_argument('--odds-error-rate', type=float, default=0, help="Share of stand-in responses that fail with 429/5xx")
+    parser.add_argument('--odds-scale', type=int, default=1, help="Serve each stand-in event this many times")
+    args = parser.parse_args()
+
+    # The app binds its database at import, so point it at the scratch file first
+    shutil.rmtree(args.dir, ignore_errors=True)
+    os.makedirs(args.dir)
+    os.environ['PICKEM_DB_PATH'] = os.path.join(args.dir, 'bench.db')
+    from database import db
+    from bench.generate import generate_league
+    from bench.odds_server import synthetic_payloads, scale_payload, create_app, start_in_thread
+
+    config = dict(users=args.users, polls=args.polls, seed=args.seed, runs=args.runs)
+    league = generate_league(args.users, args.polls, args.seed)
+
+    # The fetch scenarios go over HTTP to a local Odds API stand-in serving the generated schedule
+    scores, odds = synthetic_payloads(os.environ['PICKEM_DB_PATH'], seed=args.seed)
+    odds_app = create_app(scale_payload(scores, args.odds_scale), scale_payload(odds, args.odds_scale),
+                          latency_ms=args.odds_latency_ms, error_rate=args.odds_error_rate, quota=1_000_000, seed=args.seed)
+    os.environ['ODDS_API_BASE_URL'] = start_in_thread(odds_app)
+    os.environ['ODDS_API_KEY'] = 'bench'
+    from bench.scenarios import build_scenarios
+    # Request logging would dominate the timings
+    logging.disable(logging.INFO)
+    only = set(args.only.split(',')) if args.only else None
+    results = {}
+    for name, run, reset in build_scenarios():
+        if only and name not in only:
+            continue
+        results[name] = summarize(*measure(db, run, reset, args.runs, args.warmup))
+    logging.disable(logging.NOTSET)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline and baseline.get('config') != config:
+        logger.warning(f"Baseline was recorded with {baseline.get('config')}, this run used {config}")
+    diffs = compare(results, baseline, args.tolerance)
+    print(f"League: {league}")
+    print(format_results(results, diffs))
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(config=config, league={k: v for k, v in league.items() if k != 'seconds'}, scenarios=results), f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+    if args.check and any(d['regressed'] for d in diffs.values()):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
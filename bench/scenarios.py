@@ -0,0 +1,75 @@
+from database import db, current_season, remove_pick, DEFAULT_LEAGUE_ID
+from bench.generate import bench_user_id, BOOKMAKERS
+from update_results import process_results, fetch_and_process_results
+from update_spreads import process_spreads, fetch_and_process_spreads
+from starlette.testclient import TestClient
+import pandas as pd
+import time
+import main
+
+# Scripted scenarios: each is (name, run, reset). `run(i)` is the timed work for iteration i;
+# `reset(i)`, if given, runs untimed after it so every iteration starts from the same state.
+
+BENCH_USER = 'local_test_user'
+
+def odds_time(kickoff: int):
+    return pd.Timestamp(kickoff, unit='s', tz='UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def scores_payload(games):
+    """Odds API /scores body for final games"""
+    return [dict(id=f"bench-{g['game_id']}", sport_key='americanfootball_nfl', sport_title='NFL', commence_time=odds_time(g['kickoff']),
+                 completed=True, home_team=g['home_team'], away_team=g['away_team'],
+                 scores=[dict(name=g['home_team'], score=str(g['home_team_score'])), dict(name=g['away_team'], score=str(g['away_team_score']))],
+                 last_update=odds_time(g['kickoff'] + 4 * 3600))
+            for g in games]
+
+def odds_payload(games, i: int):
+    """Odds API /odds body with one spreads poll per bookmaker, moving half a point every other iteration"""
+    return [dict(id=f"bench-{g['game_id']}", sport_key='americanfootball_nfl', sport_title='NFL', commence_time=odds_time(g['kickoff']),
+                 home_team=g['home_team'], away_team=g['away_team'],
+                 bookmakers=[dict(key=bookmaker, title=bookmaker, last_update=odds_time(g['kickoff']),
+                                  markets=[dict(key='spreads', last_update=odds_time(g['kickoff']), outcomes=[
+                                      dict(name=g['home_team'], price=-110, point=-3.0 - 0.5 * (i % 2)),
+                                      dict(name=g['away_team'], price=-110, point=3.0 + 0.5 * (i % 2))])])
+                             for bookmaker in BOOKMAKERS])
+            for g in games]
+
+def build_scenarios():
+    """Log the bench user in and script the scenarios against the generated league"""
+    client = TestClient(main.app)
+    client.get('/mock_login')
+    season = current_season()
+    open_games = db.q("SELECT game_id, home_team FROM schedule WHERE season = ? AND kickoff > ? ORDER BY kickoff, game_id",
+                      [season, time.time() + 3600])
+    graded_week = db.execute("SELECT MAX(week) FROM schedule WHERE season = ? AND completed = 1", [season]).fetchone()[0]
+    final_games = db.q("""SELECT game_id, kickoff, home_team, away_team, home_team_score, away_team_score FROM schedule
+                          WHERE season = ? AND week = ? AND completed = 1""", [season, graded_week])
+    next_week = db.execute("SELECT MIN(week) FROM schedule WHERE season = ? AND kickoff > ?", [season, time.time()]).fetchone()[0]
+    line_games = db.q("SELECT game_id, kickoff, home_team, away_team FROM schedule WHERE season = ? AND week = ?", [season, next_week])
+    viewed_user = db.execute('SELECT username FROM users WHERE user_id = ?', [bench_user_id(0)]).fetchone()[0]
+
+    def get(path):
+        return lambda i: client.get(path)
+
+    def pick(i):
+        game = open_games[i % len(open_games)]
+        return client.post(f"/pick/{game['game_id']}/{game['home_team']}/lock")
+
+    def unpick(i):
+        remove_pick(BENCH_USER, open_games[i % len(open_games)]['game_id'], DEFAULT_LEAGUE_ID)
+
+    scenarios = [
+        ('home', get('/'), None),
+        ('leaderboard', get('/leaderboard'), None),
+        ('user_page', get(f'/user/{viewed_user}'), None),
+    ]
+    if open_games:
+        scenarios.append(('pick_post', pick, unpick))
+    if final_games:
+        scenarios.append(('results_ingest', lambda i: process_results(scores_payload(final_games)), None))
+    if line_games:
+        scenarios.append(('spreads_ingest', lambda i: process_spreads(odds_payload(line_games, i)), None))
+    # Full fetch + ingest over HTTP, against the stand-in when ODDS_API_BASE_URL points at one
+    scenarios.append(('results_fetch', lambda i: fetch_and_process_results(), None))
+    scenarios.append(('spreads_fetch', lambda i: fetch_and_process_spreads(), None))
+    return scenarios
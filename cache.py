@@ -0,0 +1,52 @@
+from collections import OrderedDict
+import threading
+
+# Data versions: writers bump a name (e.g. "spreads:12"), cached values computed
+# under an older version of any name they depend on are recomputed on next read.
+_versions = {}
+_versions_lock = threading.Lock()
+
+def bump(*names):
+    with _versions_lock:
+        for name in names:
+            _versions[name] = _versions.get(name, 0) + 1
+
+def version(name):
+    return _versions.get(name, 0)
+
+class VersionedCache:
+    """Small LRU cache whose entries are tagged with the data versions they were built from"""
+    registry = {}
+
+    def __init__(self, name, depends_on, maxsize=256):
+        self.name, self.depends_on, self.maxsize = name, depends_on, maxsize
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        VersionedCache.registry[name] = self
+
+    def get_or_compute(self, key, compute):
+        tag = tuple(version(name) for name in self.depends_on(key))
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == tag:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._data[key] = (tag, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else None
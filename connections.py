@@ -0,0 +1,54 @@
+import apsw
+import os
+import threading
+import weakref
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# One apsw connection can't be used by two threads at once (it raises ThreadingViolationError
+# rather than waiting), so db.conn is a ThreadConnections: every statement and `with db.conn:`
+# goes to the calling thread's own connection to the database file, opened on its first use.
+# WAL lets those readers run alongside the writer thread, which commits on a connection of its
+# own. The connection the handle was created with stays with the thread that created it.
+
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+
+class ThreadConnections:
+    """Stands in for db.conn, routing to the calling thread's connection"""
+    def __init__(self, conn, path: str):
+        conn.setbusytimeout(DB_BUSY_TIMEOUT_MS)
+        # Plain attributes bypass __setattr__, which forwards to the connections
+        vars(self).update(path=path, local=threading.local(), opened=weakref.WeakSet([conn]), settings={})
+        self.local.conn = conn
+
+    def current(self):
+        conn = getattr(self.local, 'conn', None)
+        return conn if conn is not None else self.open()
+
+    def open(self):
+        """Give the calling thread a new connection (closed with the thread's locals when it exits)"""
+        conn = apsw.Connection(self.path)
+        conn.setbusytimeout(DB_BUSY_TIMEOUT_MS)
+        for name, value in self.settings.items():
+            setattr(conn, name, value)
+        self.opened.add(conn)
+        self.local.conn = conn
+        return conn
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+    def __setattr__(self, name, value):
+        # Connection settings (exec_trace for the benchmarks) apply to every connection, including later ones
+        self.settings[name] = value
+        for conn in list(self.opened):
+            setattr(conn, name, value)
+
+    def __enter__(self):
+        return self.current().__enter__()
+
+    def __exit__(self, *exc):
+        return self.current().__exit__(*exc)
@@ -4,7 +4,14 @@ from datetime import datetime, timedelta
 from dataclasses import dataclass
 import os
 import pytz
+import time
+import threading
 import logging
+from live import publish_game_updates
+from cache import bump
+from writer import writer, serialized_write, after_commit
+from query_stats import instrument
+from connections import ThreadConnections
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -47,6 +54,19 @@ TEAM_ABBREVIATIONS = {
     "Washington Commanders": "WAS"
 }
 
+# Other names feeds use for a team (old franchise names, short city forms)
+TEAM_ALIASES = {
+    "Washington Football Team": "Washington Commanders",
+    "Washington Redskins": "Washington Commanders",
+    "Oakland Raiders": "Las Vegas Raiders",
+    "San Diego Chargers": "Los Angeles Chargers",
+    "St. Louis Rams": "Los Angeles Rams",
+    "LA Chargers": "Los Angeles Chargers",
+    "LA Rams": "Los Angeles Rams",
+    "NY Giants": "New York Giants",
+    "NY Jets": "New York Jets"
+}
+
 @dataclass
 class Pick:
     id: int
@@ -57,6 +77,7 @@ class Pick:
     correct: bool = None
     pick_type: str = 'lock'  # 'lock' or 'upset'
     points: float = 3.0  # Default to 3 points for lock picks
+    team_id: int = None
 
 @dataclass
 class User:
@@ -75,10 +96,17 @@ class ScheduleGame:
     completed: bool
     home_team_short: str
     away_team_short: str
+    season: int = None
+    home_team_id: int = None
+    away_team_id: int = None
 
 # Set up the main database
+# PICKEM_DB_PATH points a process at another database file (benchmarks, scratch copies)
+if os.environ.get('PICKEM_DB_PATH'):
+    db_path = os.environ['PICKEM_DB_PATH']
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
 # Railway provides persistent storage in the /app/data directory
-if os.environ.get('RAILWAY_ENVIRONMENT') or os.path.exists('/app/data'):
+elif os.environ.get('RAILWAY_ENVIRONMENT') or os.path.exists('/app/data'):
     # When running on Railway or when /app/data volume exists
     db_path = '/app/data/main.db'
     try:
@@ -97,6 +125,52 @@ else:
     os.makedirs('data', exist_ok=True)
 
 db = database(db_path)
+# Per-thread connections behind db.conn (connections.py)
+db.conn = ThreadConnections(db.conn, db_path)
+# Count and time every statement per request (query_stats.py, /admin/queries)
+instrument(db)
+# WAL lets readers (and backups) run alongside the writer
+db.execute('PRAGMA journal_mode=WAL')
+
+# Team dimension: small integer ids that schedule, picks and spreads store next to the team names
+teams = db.t.teams
+if teams not in db.t:
+    teams.create(dict(
+        team_id=int,
+        name=str,
+        abbreviation=str
+    ), pk='team_id')
+    teams.insert_all([dict(team_id=i, name=name, abbreviation=abbreviation)
+                      for i, (name, abbreviation) in enumerate(TEAM_ABBREVIATIONS.items(), start=1)])
+
+# Every spelling that resolves to a team: full name, abbreviation and feed aliases
+team_aliases = db.t.team_aliases
+if team_aliases not in db.t:
+    team_aliases.create(dict(
+        alias=str,
+        team_id=int
+    ), pk='alias')
+_team_ids_by_name = {row[0]: row[1] for row in db.execute('SELECT name, team_id FROM teams')}
+for alias, team_id in [*_team_ids_by_name.items(),
+                       *((abbreviation, _team_ids_by_name[name]) for name, abbreviation in TEAM_ABBREVIATIONS.items()),
+                       *((alias, _team_ids_by_name[name]) for alias, name in TEAM_ALIASES.items())]:
+    db.execute('INSERT OR IGNORE INTO team_aliases (alias, team_id) VALUES (?, ?)', [alias, team_id])
+
+# Resolved once at startup; names are only translated at ingest and pick time
+TEAM_IDS = {row[0]: row[1] for row in db.execute('SELECT alias, team_id FROM team_aliases')}
+TEAM_NAMES = {row[0]: row[1] for row in db.execute('SELECT team_id, name FROM teams')}
+
+def get_team_id(name: str):
+    """Team id for a name, abbreviation or alias; None if unknown"""
+    return TEAM_IDS.get(name) if name is not None else None
+
+def canonical_team_names(names):
+    """Map a Series of feed team names onto the schedule's names, leaving (and logging) unknown ones"""
+    ids = names.map(TEAM_IDS)
+    unknown = sorted(set(names[ids.isna()].dropna()))
+    if unknown:
+        logger.warning(f"Unknown team names: {unknown}")
+    return ids.map(TEAM_NAMES).fillna(names)
 
 # Schedule table
 schedule = db.t.schedule
@@ -114,7 +188,13 @@ if schedule not in db.t:
         away_team=str,
         home_team_score=int,
         away_team_score=int,
-        completed=bool
+        completed=bool,
+        kickoff=int,
+        locked=bool,
+        week=int,
+        season=int,
+        home_team_id=int,
+        away_team_id=int
     ), pk='game_id')
     
     # Insert the data from the DataFrame into the table
@@ -124,6 +204,8 @@ if schedule not in db.t:
             datetime=row['datetime'],
             home_team=row['home_team'],
             away_team=row['away_team'],
+            home_team_id=get_team_id(row['home_team']),
+            away_team_id=get_team_id(row['away_team']),
             home_team_score=None,
             away_team_score=None,
             completed=False
@@ -137,6 +219,32 @@ else:
         db.execute('ALTER TABLE schedule ADD COLUMN away_team_score INTEGER')
         db.execute('ALTER TABLE schedule ADD COLUMN completed BOOLEAN DEFAULT FALSE')
 
+# Check if the kickoff lock columns exist, if not, add them
+try:
+    db.execute('SELECT kickoff, locked FROM schedule LIMIT 1')
+except Exception:
+    db.execute('ALTER TABLE schedule ADD COLUMN kickoff INTEGER')
+    db.execute('ALTER TABLE schedule ADD COLUMN locked BOOLEAN DEFAULT FALSE')
+
+# Check if the week column exists, if not, add it (filled in by refresh_kickoffs)
+try:
+    db.execute('SELECT week FROM schedule LIMIT 1')
+except Exception:
+    db.execute('ALTER TABLE schedule ADD COLUMN week INTEGER')
+
+# Check if the season column exists, if not, add it (filled in by refresh_kickoffs)
+try:
+    db.execute('SELECT season FROM schedule LIMIT 1')
+except Exception:
+    db.execute('ALTER TABLE schedule ADD COLUMN season INTEGER')
+
+# Check if the team id columns exist, if not, add them (filled in below)
+try:
+    db.execute('SELECT home_team_id, away_team_id FROM schedule LIMIT 1')
+except Exception:
+    db.execute('ALTER TABLE schedule ADD COLUMN home_team_id INTEGER')
+    db.execute('ALTER TABLE schedule ADD COLUMN away_team_id INTEGER')
+
 # Picks table (existing)
 picks = db.t.picks
 if picks not in db.t:
@@ -148,7 +256,10 @@ if picks not in db.t:
         timestamp=str,
         correct=bool,
         pick_type=str,
-        points=float
+        points=float,
+        season=int,
+        league_id=int,
+        team_id=int
     ), pk='id')
 else:
     # Check if the new columns exist, if not, add them
@@ -158,6 +269,99 @@ else:
         db.execute('ALTER TABLE picks ADD COLUMN pick_type TEXT DEFAULT "lock"')
         db.execute('ALTER TABLE picks ADD COLUMN points FLOAT DEFAULT 3.0')
 
+# Picks carry their game's season so season queries never touch other years
+try:
+    db.execute('SELECT season FROM picks LIMIT 1')
+except Exception:
+    db.execute('ALTER TABLE picks ADD COLUMN season INTEGER')
+
+# Picks belong to a league; everything made before leagues existed is in the default league
+DEFAULT_LEAGUE_ID = 1
+try:
+    db.execute('SELECT league_id FROM picks LIMIT 1')
+except Exception:
+    db.execute(f'ALTER TABLE picks ADD COLUMN league_id INTEGER DEFAULT {DEFAULT_LEAGUE_ID}')
+
+# The picked team's id, compared against the schedule's team ids when grading
+try:
+    db.execute('SELECT team_id FROM picks LIMIT 1')
+except Exception:
+    db.execute('ALTER TABLE picks ADD COLUMN team_id INTEGER')
+
+# Leagues: independent pools on one instance, each with its own members and admins
+leagues = db.t.leagues
+if leagues not in db.t:
+    leagues.create(dict(
+        league_id=int,
+        name=str,
+        slug=str,
+        created_at=str
+    ), pk='league_id')
+    leagues.insert(dict(league_id=DEFAULT_LEAGUE_ID, name='NFL Pickem', slug='main', created_at=datetime.now().isoformat()))
+db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_leagues_slug ON leagues(slug)')
+
+league_members = db.t.league_members
+build_league_members = league_members not in db.t
+if build_league_members:
+    league_members.create(dict(
+        league_id=int,
+        user_id=str,
+        role=str,  # 'member' or 'admin'
+        joined_at=str
+    ), pk=('league_id', 'user_id'))
+db.execute('CREATE INDEX IF NOT EXISTS idx_league_members_user ON league_members(user_id, league_id)')
+
+# Usernames that are made admins of the default league when they join it
+ADMIN_USERNAMES = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', 'gregsharvey').split(',') if name.strip()}
+
+# How many users of a league took each side of a game, kept in step with picks by every pick write
+pick_counts = db.t.pick_counts
+if pick_counts in db.t and 'league_id' not in pick_counts.columns_dict:
+    # Counts are derived data: recreate per league and recount below
+    pick_counts.drop()
+build_pick_counts = pick_counts not in db.t
+if build_pick_counts:
+    pick_counts.create(dict(
+        league_id=int,
+        game_id=int,
+        team=str,
+        pick_type=str,
+        count=int
+    ), pk=('league_id', 'game_id', 'team', 'pick_type'))
+
+# Append-only history of every pick write, replayed by pick_events.py (recovery, audits, as-of standings).
+# Kinds and pick types are stored as small integers and teams by id to keep the rows compact.
+PICK_EVENT_KINDS = {'placed': 1, 'changed': 2, 'removed': 3, 'graded': 4, 'override': 5}
+PICK_TYPE_CODES = {'lock': 1, 'upset': 2}
+pick_events = db.t.pick_events
+build_pick_events = pick_events not in db.t
+if build_pick_events:
+    pick_events.create(dict(
+        id=int,
+        ts=float,
+        kind=int,
+        league_id=int,
+        user_id=str,
+        game_id=int,
+        team_id=int,
+        pick_type=int,
+        points=float,
+        correct=int,
+        actor=str
+    ), pk='id')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_pick_events_user ON pick_events(user_id, id)')
+
+def log_pick_event(kind: str, league_id: int, user_id: str, game_id: int, team: str = None, pick_type: str = None,
+                   points: float = None, correct=None, actor: str = None):
+    """Append one event; call inside the pick write's transaction. `actor` marks an admin override (removal: no team)"""
+    if actor is not None and kind != 'graded':
+        kind = 'override'
+    db.execute("""INSERT INTO pick_events (ts, kind, league_id, user_id, game_id, team_id, pick_type, points, correct, actor)
+                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+               [time.time(), PICK_EVENT_KINDS[kind], league_id, user_id, game_id, get_team_id(team) if team else None,
+                PICK_TYPE_CODES.get(pick_type), points, None if correct is None else int(bool(correct)),
+                actor])
+
 # Users table (existing)
 users = db.t.users
 if users not in db.t:
@@ -174,8 +378,69 @@ else:
     except Exception:
         db.execute('ALTER TABLE users ADD COLUMN username TEXT')
 
+# A user's name in queries over `users u`: the display name, else the profile name (empty counts as unset), else the username
+USER_NAME_SQL = "COALESCE(NULLIF(u.dname, ''), NULLIF(u.name, ''), u.username)"
+
 Users = users.dataclass()
 
+if build_league_members:
+    # Everyone who signed up before leagues existed is in the default league
+    now = datetime.now().isoformat()
+    league_members.insert_all([dict(league_id=DEFAULT_LEAGUE_ID, user_id=u['user_id'],
+                                    role='admin' if u['username'] in ADMIN_USERNAMES else 'member', joined_at=now)
+                               for u in users.rows])
+
+def get_league(league_id: int):
+    return next(iter(db.q('SELECT * FROM leagues WHERE league_id = ?', [league_id])), None)
+
+def get_league_by_slug(slug: str):
+    return next(iter(db.q('SELECT * FROM leagues WHERE slug = ?', [slug])), None)
+
+# The leagues a user belongs to, with their role in each
+def get_user_leagues(user_id: str):
+    return db.q("""SELECT l.league_id, l.name, l.slug, m.role FROM league_members m
+                    JOIN leagues l ON l.league_id = m.league_id
+                    WHERE m.user_id = ? ORDER BY l.league_id""", [user_id])
+
+def get_league_members(league_id: int):
+    return db.q(f"""SELECT u.user_id, {USER_NAME_SQL} AS name, u.username, m.role
+                    FROM league_members m JOIN users u ON u.user_id = m.user_id
+                    WHERE m.league_id = ? ORDER BY u.rowid""", [league_id])
+
+# 'admin', 'member', or None for non-members
+def get_league_role(league_id: int, user_id: str):
+    row = db.execute('SELECT role FROM league_members WHERE league_id = ? AND user_id = ?', [league_id, user_id]).fetchone()
+    return row[0] if row else None
+
+def is_league_admin(league_id: int, user_id: str):
+    return get_league_role(league_id, user_id) == 'admin'
+
+@serialized_write
+def join_league(league_id: int, user_id: str, role: str = None):
+    """Add a user to a league (no-op for existing members unless a role is given)"""
+    if role is None:
+        user = users.get(user_id)
+        role = 'admin' if league_id == DEFAULT_LEAGUE_ID and user.username in ADMIN_USERNAMES else 'member'
+        db.execute('INSERT OR IGNORE INTO league_members (league_id, user_id, role, joined_at) VALUES (?, ?, ?, ?)',
+                   [league_id, user_id, role, datetime.now().isoformat()])
+    else:
+        league_members.upsert(dict(league_id=league_id, user_id=user_id, role=role, joined_at=datetime.now().isoformat()),
+                              pk=('league_id', 'user_id'))
+
+@serialized_write
+def create_league(name: str, slug: str, owner_id: str):
+    """Create a league with its creator as admin"""
+    slug = slug.strip().lower()
+    if not name.strip() or not slug.replace('-', '').isalnum():
+        raise ValueError("League names must not be empty and slugs may only use letters, digits and dashes")
+    if get_league_by_slug(slug):
+        raise ValueError(f"The league slug '{slug}' is taken")
+    with db.conn:
+        league_id = leagues.insert(dict(name=name.strip(), slug=slug, created_at=datetime.now().isoformat()))['league_id']
+        join_league(league_id, owner_id, role='admin')
+    logger.info(f"Created league {league_id} ({slug}) for {owner_id}")
+    return get_league(league_id)
+
 # Create dataclass for Schedule and Pick
 Schedule = schedule.dataclass()
 Pick = picks.dataclass()
@@ -190,6 +455,10 @@ def to_est(dt):
     else:
         return dt.astimezone(eastern)
 
+def get_season_year(game_date):
+    # If the game is in January or February, it's part of the previous year's season
+    return game_date.year - 1 if game_date.month < 3 else game_date.year
+
 def get_game_week(game_datetime):
     eastern = pytz.timezone('US/Eastern')
     if isinstance(game_datetime, str):
@@ -202,17 +471,43 @@ def get_game_week(game_datetime):
     else:
         game_date = game_date.astimezone(eastern)
     
-    season_start = eastern.localize(datetime(game_date.year, 9, 4))  # Assuming season starts on September 4th
-    return (game_date - season_start).days // 7 + 1
+    # Determine the year of the season based on the game date
+    season_year = get_season_year(game_date)
+
+    # Set the season start to the first Thursday of September
+    season_start = eastern.localize(datetime(season_year, 9, 1))
+    while season_start.weekday() != 3:  # 3 represents Thursday
+        season_start += timedelta(days=1)
+
+    # Calculate the week number
+    week = (game_date - season_start).days // 7 + 1
 
-def add_pick(user_id: str, game_id: int, pick: str, pick_type: str = 'lock', points: float = 3.0):
+    # Handle the case for week 18 (which occurs in the next calendar year)
+    if week <= 0:
+        week = 18
+
+    return week
+
+@serialized_write
+def add_pick(user_id: str, game_id: int, pick: str, pick_type: str = 'lock', points: float = 3.0, allow_locked: bool = False,
+             league_id: int = DEFAULT_LEAGUE_ID, actor: str = None):
     # Check if the game exists
     game = get_game(game_id)
     if not game:
         raise ValueError(f"Game with ID {game_id} does not exist")
 
-    # Check if the user has already picked this team (only for lock picks)
-    user_picks = get_user_picks(user_id)
+    # Picks close at kickoff (admins may still edit)
+    if not allow_locked and is_game_locked(game_id):
+        raise ValueError("You cannot make a pick after the game has started.")
+
+    # Upset points come from the latest spread, not from the client
+    if pick_type == 'upset':
+        points = get_latest_spread_point(game_id, pick)
+        if points is None or points <= 0:
+            raise ValueError(f"{pick} is not an underdog in game {game_id}")
+
+    # Check if the user has already picked this team this season (only for lock picks)
+    user_picks = get_user_picks(user_id, game['season'], league_id)
     if pick_type == 'lock' and any(p.pick == pick and p.pick_type == 'lock' for p in user_picks):
         raise ValueError(f"You have already made a lock pick for {pick} in a previous week")
 
@@ -220,7 +515,8 @@ def add_pick(user_id: str, game_id: int, pick: str, pick_type: str = 'lock', poi
     game_week = get_game_week(to_est(game['datetime']))
 
     # Check if the user has already made 2 lock picks and 1 upset pick for this week
-    week_picks = [p for p in user_picks if get_game_week(to_est(get_game(p.game_id)['datetime'])) == game_week]
+    week_game_ids = {row[0] for row in db.execute('SELECT game_id FROM schedule WHERE season = ? AND week = ?', [game['season'], game_week])}
+    week_picks = [p for p in user_picks if p.game_id in week_game_ids]
     lock_picks = [p for p in week_picks if p.pick_type == 'lock']
     upset_picks = [p for p in week_picks if p.pick_type == 'upset']
 
@@ -229,62 +525,330 @@ def add_pick(user_id: str, game_id: int, pick: str, pick_type: str = 'lock', poi
     elif pick_type == 'upset' and len(upset_picks) >= 1:
         raise ValueError(f"You have already made an upset pick for week {game_week}")
 
-    # Remove any existing pick for this user and game
+    # Replace any existing pick for this user and game
     user_id = str(user_id)
-    existing_picks = [p for p in picks() if p.user_id == user_id and p.game_id == game_id]
-    for old_pick in existing_picks:
-        picks.delete(old_pick.id)
-        print(f"Removed old pick: {old_pick}")
-
-    # Create a new pick
-    new_pick = picks.insert({
-        "user_id": user_id,
-        "game_id": game_id,
-        "pick": pick,
-        "timestamp": datetime.now().isoformat(),
-        "correct": None,  # Initialize as None
-        "pick_type": pick_type,
-        "points": points
-    })
-    print(f"New pick: {new_pick}")
+    existing_picks = [p for p in user_picks if p.game_id == game_id]
+    with db.conn:
+        for old_pick in existing_picks:
+            picks.delete(old_pick.id)
+        adjust_pick_counts(league_id, [(p.game_id, p.pick, p.pick_type, -1) for p in existing_picks] + [(game_id, pick, pick_type, 1)])
+
+        # Create a new pick
+        new_pick = picks.insert({
+            "user_id": user_id,
+            "game_id": game_id,
+            "pick": pick,
+            "timestamp": datetime.now().isoformat(),
+            "correct": None,  # Initialize as None
+            "pick_type": pick_type,
+            "points": points,
+            "season": game['season'],
+            "league_id": league_id,
+            "team_id": get_team_id(pick)
+        })
+        log_pick_event('changed' if existing_picks else 'placed', league_id, user_id, game_id, pick, pick_type, points, actor=actor)
+    # Audit line for every pick write (never sampled)
+    logger.info(f"Pick saved: {user_id} {pick_type} {pick} in game {game_id}",
+                extra=dict(user_id=user_id, game_id=game_id, pick=pick, pick_type=pick_type, league_id=league_id,
+                           replaced=[p.pick for p in existing_picks]))
+    after_commit(bump, f"picks:{league_id}")
     return Pick(id=new_pick.id, user_id=new_pick.user_id, game_id=new_pick.game_id, 
                 pick=new_pick.pick, timestamp=new_pick.timestamp, correct=new_pick.correct, 
-                pick_type=new_pick.pick_type, points=new_pick.points)
-
-# Helper function to get the week number of a game
-def get_all_games():
-    games = schedule()
-    return [ScheduleGame(
-        game_id=game.game_id,
-        datetime=game.datetime,
-        home_team=game.home_team,
-        away_team=game.away_team,
-        home_team_score=game.home_team_score,
-        away_team_score=game.away_team_score,
-        completed=game.completed,
-        home_team_short=TEAM_ABBREVIATIONS.get(game.home_team, game.home_team),
-        away_team_short=TEAM_ABBREVIATIONS.get(game.away_team, game.away_team)
-    ) for game in games]
+                pick_type=new_pick.pick_type, points=new_pick.points, season=new_pick.season,
+                league_id=new_pick.league_id, team_id=new_pick.team_id)
+
+# Replace a user's picks for one week in a single transaction
+@serialized_write
+def set_week_picks(user_id: str, week_games, locks, upset=None, allow_locked: bool = False, league_id: int = DEFAULT_LEAGUE_ID,
+                   actor: str = None):
+    """Validate and save a weekly slate: up to two (game_id, team) lock picks and one upset pick.
+
+    `week_games` are the games of the week being set. Picks on games that have already
+    kicked off are kept as they are; the slate may repeat them but not change them.
+    Upset points come from the latest spread, not from the client.
+    """
+    user_id = str(user_id)
+    games = {g.game_id: g for g in week_games}
+    season = week_games[0].season if week_games else None
+    slate = [(int(game_id), team, 'lock') for game_id, team in locks]
+    if upset:
+        slate.append((int(upset[0]), upset[1], 'upset'))
+
+    if len([p for p in slate if p[2] == 'lock']) > 2:
+        raise ValueError("You can only make 2 lock picks per week")
+    if len({game_id for game_id, _, _ in slate}) != len(slate):
+        raise ValueError("You can only make one pick per game")
+    for game_id, team, _ in slate:
+        game = games.get(game_id)
+        if game is None:
+            raise ValueError(f"Game with ID {game_id} is not in this week")
+        if team not in (game.home_team, game.away_team):
+            raise ValueError(f"{team} is not playing in game {game_id}")
+
+    user_picks = get_user_picks(user_id, season, league_id)
+    week_picks = {p.game_id: p for p in user_picks if p.game_id in games}
+    kept = {game_id: p for game_id, p in week_picks.items() if not allow_locked and is_game_locked(game_id)}
+    for game_id, team, pick_type in slate:
+        if game_id in kept:
+            if (kept[game_id].pick, kept[game_id].pick_type) != (team, pick_type):
+                raise ValueError("You cannot change a pick after the game has started.")
+        elif not allow_locked and is_game_locked(game_id):
+            raise ValueError("You cannot make a pick after the game has started.")
+    slate = [p for p in slate if p[0] not in kept]
+
+    # The week limits count picks on started games that are being kept
+    pick_types = [p.pick_type for p in kept.values()] + [pick_type for _, _, pick_type in slate]
+    if pick_types.count('lock') > 2:
+        raise ValueError("You can only make 2 lock picks per week")
+    if pick_types.count('upset') > 1:
+        raise ValueError("You can only make 1 upset pick per week")
+
+    # Lock teams can only be used once a season
+    used_locks = {p.pick for p in user_picks if p.pick_type == 'lock' and p.game_id not in games}
+    used_locks.update(p.pick for p in kept.values() if p.pick_type == 'lock')
+    for _, team, pick_type in slate:
+        if pick_type == 'lock' and team in used_locks:
+            raise ValueError(f"You have already made a lock pick for {team} in a previous week")
+        if pick_type == 'lock':
+            used_locks.add(team)
+
+    rows = []
+    timestamp = datetime.now().isoformat()
+    for game_id, team, pick_type in slate:
+        points = 3.0
+        if pick_type == 'upset':
+            points = get_latest_spread_point(game_id, team)
+            if points is None or points <= 0:
+                raise ValueError(f"{team} is not an underdog in game {game_id}")
+        rows.append(dict(user_id=user_id, game_id=game_id, pick=team, timestamp=timestamp,
+                         correct=None, pick_type=pick_type, points=points, season=season, league_id=league_id,
+                         team_id=get_team_id(team)))
+
+    replaced = [p for game_id, p in week_picks.items() if game_id not in kept]
+    with db.conn:
+        for pick in replaced:
+            picks.delete(pick.id)
+        if rows:
+            picks.insert_all(rows)
+        adjust_pick_counts(league_id, [(p.game_id, p.pick, p.pick_type, -1) for p in replaced] +
+                                      [(r['game_id'], r['pick'], r['pick_type'], 1) for r in rows])
+        replaced_games = {p.game_id for p in replaced}
+        for r in rows:
+            log_pick_event('changed' if r['game_id'] in replaced_games else 'placed', league_id, user_id, r['game_id'],
+                           r['pick'], r['pick_type'], r['points'], actor=actor)
+        for game_id in replaced_games - {r['game_id'] for r in rows}:
+            log_pick_event('removed', league_id, user_id, game_id, actor=actor)
+    logger.info(f"Set {len(rows)} picks for user {user_id}, replaced {len(replaced)}")
+    after_commit(bump, f"picks:{league_id}")
+    return get_user_picks(user_id, season, league_id)
+
+# Remove a user's pick for a game, if any
+@serialized_write
+def remove_pick(user_id: str, game_id: int, league_id: int = DEFAULT_LEAGUE_ID, actor: str = None):
+    removed = [Pick(**p) for p in picks.rows_where("user_id = ? AND game_id = ? AND league_id = ?", [str(user_id), game_id, league_id])]
+    with db.conn:
+        for pick in removed:
+            picks.delete(pick.id)
+        adjust_pick_counts(league_id, [(p.game_id, p.pick, p.pick_type, -1) for p in removed])
+        if removed:
+            log_pick_event('removed', league_id, str(user_id), game_id, actor=actor)
+    if removed:
+        after_commit(bump, f"picks:{league_id}")
+    return removed
+
+# Apply (game_id, team, pick_type, delta) changes to a league's pick_counts; call inside the pick write's transaction
+def adjust_pick_counts(league_id: int, changes):
+    totals = {}
+    for game_id, team, pick_type, delta in changes:
+        key = (game_id, team, pick_type)
+        totals[key] = totals.get(key, 0) + delta
+    for (game_id, team, pick_type), delta in totals.items():
+        if delta:
+            db.execute("""INSERT INTO pick_counts (league_id, game_id, team, pick_type, count) VALUES (?, ?, ?, ?, ?)
+                          ON CONFLICT (league_id, game_id, team, pick_type) DO UPDATE SET count = count + excluded.count""",
+                       [league_id, game_id, team, pick_type, delta])
+
+# Recount pick_counts from the picks table, for one league or all of them
+@serialized_write
+def rebuild_pick_counts(league_id: int = None):
+    where, params = ("WHERE league_id = ?", [league_id]) if league_id is not None else ("", [])
+    with db.conn:
+        db.execute(f'DELETE FROM pick_counts {where}', params)
+        db.execute(f"""INSERT INTO pick_counts (league_id, game_id, team, pick_type, count)
+                       SELECT league_id, game_id, pick, pick_type, COUNT(*) FROM picks {where}
+                       GROUP BY league_id, game_id, pick, pick_type""", params)
+    logger.info(f"Rebuilt pick counts{f' for league {league_id}' if league_id is not None else ''}")
+
+if build_pick_counts:
+    rebuild_pick_counts()
+
+# A league's pick counts for many games in one query: {game_id: {(team, pick_type): count}}
+def get_pick_counts(game_ids=None, league_id: int = DEFAULT_LEAGUE_ID):
+    sql, params = 'SELECT game_id, team, pick_type, count FROM pick_counts WHERE league_id = ? AND count > 0', [league_id]
+    if game_ids is not None:
+        game_ids = list(game_ids)
+        if not game_ids:
+            return {}
+        sql += f" AND game_id IN ({','.join('?' * len(game_ids))})"
+        params += game_ids
+    counts = {}
+    for game_id, team, pick_type, count in db.execute(sql, params):
+        counts.setdefault(game_id, {})[(team, pick_type)] = count
+    return counts
+
+# Schedule rows with the teams' abbreviations joined in from the team dimension
+GAME_COLUMNS = """SELECT s.game_id, s.datetime, s.home_team, s.away_team, s.home_team_score, s.away_team_score, s.completed,
+                         COALESCE(h.abbreviation, s.home_team) AS home_team_short, COALESCE(a.abbreviation, s.away_team) AS away_team_short,
+                         s.season, s.home_team_id, s.away_team_id
+                  FROM schedule s LEFT JOIN teams h ON h.team_id = s.home_team_id LEFT JOIN teams a ON a.team_id = s.away_team_id"""
+
+# All games of a season (default: the current one)
+def get_all_games(season: int = None):
+    return [ScheduleGame(**game) for game in db.q(f"{GAME_COLUMNS} WHERE s.season = ? ORDER BY s.game_id", [season or current_season()])]
 
 # Modify the get_game function
 def get_game(game_id: int):
-    game = schedule.get(game_id)
+    game = next(iter(db.q(f"{GAME_COLUMNS} WHERE s.game_id = ?", [game_id])), None)
     if game:
         return {
-            'game_id': game.game_id,
-            'home_team': game.home_team,
-            'away_team': game.away_team,
-            'home_team_short': TEAM_ABBREVIATIONS.get(game.home_team, game.home_team),
-            'away_team_short': TEAM_ABBREVIATIONS.get(game.away_team, game.away_team),
-            'datetime': game.datetime.isoformat() if isinstance(game.datetime, datetime) else game.datetime,
-            'home_team_score': game.home_team_score,
-            'away_team_score': game.away_team_score,
-            'completed': game.completed
+            'game_id': game['game_id'],
+            'home_team': game['home_team'],
+            'away_team': game['away_team'],
+            'home_team_short': game['home_team_short'],
+            'away_team_short': game['away_team_short'],
+            'datetime': game['datetime'],
+            'home_team_score': game['home_team_score'],
+            'away_team_score': game['away_team_score'],
+            'completed': game['completed'],
+            'season': game['season'],
+            'home_team_id': game['home_team_id'],
+            'away_team_id': game['away_team_id']
         }
     return None
 
-# Function to update game results
+# Kickoff table: game_id -> kickoff as epoch seconds, kept in memory so lock checks are O(1)
+_kickoffs = {}
+_locked_games = set()
+_kickoffs_lock = threading.Lock()
+_current_season = None
+
+def current_season():
+    """The season of the next game to kick off, or of the latest game once every season is over"""
+    return _current_season
+
+def kickoff_epoch(game_datetime):
+    return int(to_est(game_datetime).timestamp())
+
+# The schedule's datetime format: naive Eastern time
+def schedule_datetime(game_datetime):
+    return to_est(game_datetime).strftime('%Y-%m-%dT%H:%M:%S')
+
+@serialized_write
+def _update_schedule_rows(changed):
+    for params in changed:
+        db.execute('UPDATE schedule SET datetime = ?, kickoff = ?, locked = ?, week = ?, season = ? WHERE game_id = ?', params)
+
+def refresh_kickoffs():
+    """Recompute kickoff epochs, weeks and seasons from the schedule (startup and after time changes)"""
+    global _current_season
+    now = time.time()
+    rows = db.execute('SELECT game_id, datetime, kickoff, locked, week, season FROM schedule').fetchall()
+    kickoffs = {}
+    seasons = {}
+    locked_games = set()
+    changed = []
+    for game_id, game_datetime, kickoff, locked, week, season in rows:
+        # Datetimes are naive Eastern; rows written with a feed's UTC timestamp are converted back
+        new_datetime = schedule_datetime(game_datetime)
+        new_kickoff = kickoff_epoch(game_datetime)
+        # Locking at kickoff is lock_started_games' job (it publishes the lock); a game flexed
+        # to a later kickoff is unlocked here
+        new_locked = bool(locked) and new_kickoff <= now
+        new_week = get_game_week(game_datetime)
+        new_season = get_season_year(to_est(game_datetime))
+        kickoffs[game_id] = new_kickoff
+        seasons[game_id] = new_season
+        if new_locked:
+            locked_games.add(game_id)
+        if new_datetime != game_datetime or new_kickoff != kickoff or bool(locked) != new_locked or new_week != week or new_season != season:
+            changed.append((new_datetime, new_kickoff, new_locked, new_week, new_season, game_id))
+    if changed:
+        _update_schedule_rows(changed)
+    upcoming = [seasons[game_id] for game_id, kickoff in kickoffs.items() if kickoff > now]
+    _current_season = min(upcoming) if upcoming else max(seasons.values(), default=None)
+    with _kickoffs_lock:
+        _kickoffs.clear()
+        _kickoffs.update(kickoffs)
+        _locked_games.clear()
+        _locked_games.update(locked_games)
+    logger.info(f"Loaded {len(kickoffs)} kickoffs, updated {len(changed)} schedule rows")
+
+def is_game_locked(game_id: int, now: float = None):
+    kickoff = _kickoffs.get(game_id)
+    return kickoff is not None and (now or time.time()) >= kickoff
+
+def next_kickoff(now: float = None):
+    now = now or time.time()
+    return min((k for k in _kickoffs.values() if k > now), default=None)
+
+@serialized_write
+def lock_started_games(now: float = None):
+    """Flip the locked flag for games that have kicked off; returns the newly locked game ids"""
+    now = now or time.time()
+    with _kickoffs_lock:
+        due = [game_id for game_id, kickoff in _kickoffs.items() if kickoff <= now and game_id not in _locked_games]
+        _locked_games.update(due)
+    if due:
+        db.execute(f"UPDATE schedule SET locked = 1 WHERE game_id IN ({','.join('?' * len(due))})", due)
+        logger.info(f"Locked games at kickoff: {due}")
+    return due
+
+refresh_kickoffs()
+
+# PRAGMA data_version is per connection and only moves when some other connection commits. Every
+# write in this process commits on the writer's connection, so read there it only moves for writes
+# from other processes (the schedule ingest CLI)
+_data_version = None
+
+@serialized_write
+def _external_data_version():
+    return db.execute('PRAGMA data_version').fetchone()[0]
+
+def refresh_kickoffs_if_changed():
+    """Reload kickoffs when another process has written to the database since the last check"""
+    global _data_version
+    data_version = _external_data_version()
+    if data_version != _data_version:
+        _data_version = data_version
+        refresh_kickoffs()
+        return True
+    return False
+
+# Ingest freshness from the data itself: games that should have a final score by now but don't,
+# and how old the newest spread poll is while the season still has games to line
+def get_ingest_status(now: float = None, final_after_hours: float = 6):
+    now = now or time.time()
+    overdue = db.execute('''SELECT COUNT(*) FROM schedule
+                            WHERE season = ? AND kickoff < ? AND NOT COALESCE(completed, 0)''',
+                         [current_season(), now - final_after_hours * 3600]).fetchone()[0]
+    upcoming = db.execute('SELECT COUNT(*) FROM schedule WHERE kickoff BETWEEN ? AND ?', [now, now + 7 * 86400]).fetchone()[0]
+    latest = db.execute('SELECT timestamp FROM spreads WHERE id = (SELECT MAX(id) FROM spreads)').fetchone()
+    return dict(overdue_results=overdue, upcoming_games=upcoming,
+                spreads_age_seconds=now - datetime.fromisoformat(latest[0]).timestamp() if latest else None)
+
+# The schedule as a DataFrame, for matching odds-feed games to game ids
+def get_schedule_frame(season: int = None):
+    return pd.DataFrame(db.q("SELECT game_id, datetime, home_team, away_team FROM schedule WHERE season = ?",
+                             [season or current_season()]),
+                        columns=['game_id', 'datetime', 'home_team', 'away_team'])
+
+# Function to update game results; returns the ids of the games whose score or completed flag changed
+@serialized_write
 def update_game_results(results_df):
+    updated_ids, changed_ids = [], []
+    game_ids = [int(game_id) for game_id in results_df['game_id'].dropna()]
+    before = {row['game_id']: row for row in db.q(f"""SELECT game_id, home_team_score, away_team_score, completed FROM schedule
+                                                      WHERE game_id IN ({','.join('?' * len(game_ids))})""", game_ids)} if game_ids else {}
     for _, row in results_df.iterrows():
         try:
             if pd.notna(row['game_id']):
@@ -293,7 +857,9 @@ def update_game_results(results_df):
                     'game_id': game_id,
                     'home_team': row['home_team'],
                     'away_team': row['away_team'],
-                    'datetime': row['commence_time']
+                    'home_team_id': get_team_id(row['home_team']),
+                    'away_team_id': get_team_id(row['away_team']),
+                    'datetime': schedule_datetime(row['commence_time'])
                 }
                 if pd.notna(row['home_team_score']):
                     update_dict['home_team_score'] = int(row['home_team_score'])
@@ -304,11 +870,28 @@ def update_game_results(results_df):
                 
                 logger.info(f"Upserting game {game_id} with data: {update_dict}")
                 schedule.upsert(update_dict, pk='game_id')
+                updated_ids.append(game_id)
+                # The feed repeats finals for days; only a new score or final flag is a new result
+                old = before.get(game_id, {})
+                if any(update_dict[key] != (bool(old[key]) if key == 'completed' and old.get(key) is not None else old.get(key))
+                       for key in ('home_team_score', 'away_team_score', 'completed') if key in update_dict):
+                    changed_ids.append(game_id)
         except Exception as e:
             logger.error(f"Error updating game {row.get('game_id', 'unknown')}: {str(e)}")
             logger.error(f"Row data: {row.to_dict()}")
 
+    # Kickoff times may have moved (flexed games)
+    refresh_kickoffs()
+    if changed_ids:
+        after_commit(bump, 'results')
+
+    # Push the new scores and any kickoffs to connected clients
+    updated_games = [get_game(game_id) for game_id in updated_ids]
+    after_commit(publish_game_updates, updated_games, [game_id for game_id in updated_ids if is_game_locked(game_id)])
+    return changed_ids
+
 # Function to update pick correctness
+@serialized_write
 def update_pick_correctness(game_result):
     game_id = int(game_result['game_id'])
     game = get_game(game_id)
@@ -316,7 +899,7 @@ def update_pick_correctness(game_result):
         logger.error(f"Game with ID {game_id} not found")
         return
     
-    game_picks = picks.rows_where("game_id = ?", [game_id])
+    game_picks = list(picks.rows_where("game_id = ?", [game_id]))
     
     home_score = game['home_team_score']
     away_score = game['away_team_score']
@@ -324,31 +907,58 @@ def update_pick_correctness(game_result):
     logger.info(f"Updating pick correctness for game {game_id}: {game['home_team']} {home_score} - {game['away_team']} {away_score}")
     
     if game['completed'] and home_score is not None and away_score is not None:
-        winner = game['home_team'] if home_score > away_score else game['away_team'] if away_score > home_score else None
+        winner = game['home_team_id'] if home_score > away_score else game['away_team_id'] if away_score > home_score else None
         
-        for pick in game_picks:
-            correct = pick['pick'] == winner if winner else None
-            picks.upsert({
-                "id": pick['id'],
-                "user_id": pick['user_id'],
-                "game_id": pick['game_id'],
-                "pick": pick['pick'],
-                "timestamp": pick['timestamp'],
-                "correct": correct,
-                "pick_type": pick['pick_type'],
-                "points": pick['points']
-            }, pk='id')
+        graded = []
+        with db.conn:
+            for pick in game_picks:
+                if pick['team_id'] is None:
+                    # A team name that never matched a team can't be graded; it stays ungraded until fixed
+                    logger.warning(f"Pick {pick['id']} by {pick['user_id']} on game {game_id} has no team_id ({pick['pick']}), leaving it ungraded")
+                    correct = None
+                else:
+                    correct = pick['team_id'] == winner if winner else None
+                # Re-grading the same result (the feed reports finals for days) changes nothing
+                if (None if pick['correct'] is None else bool(pick['correct'])) == correct:
+                    continue
+                graded.append(pick)
+                picks.upsert({
+                    "id": pick['id'],
+                    "user_id": pick['user_id'],
+                    "game_id": pick['game_id'],
+                    "pick": pick['pick'],
+                    "timestamp": pick['timestamp'],
+                    "correct": correct,
+                    "pick_type": pick['pick_type'],
+                    "points": pick['points']
+                }, pk='id')
+                log_pick_event('graded', pick['league_id'], pick['user_id'], game_id, pick['pick'], pick['pick_type'],
+                               pick['points'], correct)
+        # Only the leagues whose picks on this game changed grade see their results change
+        after_commit(bump, *{f"results:{pick['league_id']}" for pick in graded})
+        # Let the caller know whose scores changed, as (league_id, user_id)
+        return [(pick['league_id'], pick['user_id']) for pick in graded]
     else:
         logger.info(f"Game {game_id} is not completed or scores are not available. Skipping pick correctness update.")
+    return []
 
-def get_user_picks(user_id: str):
-    return [Pick(**p) for p in picks.rows_where("user_id = ?", [user_id])]
+# A user's picks in a league for one season (default: the current one)
+def get_user_picks(user_id: str, season: int = None, league_id: int = DEFAULT_LEAGUE_ID):
+    return [Pick(**p) for p in picks.rows_where("league_id = ? AND season = ? AND user_id = ?",
+                                                [league_id, season or current_season(), user_id])]
 
 # Add a new function to update user's display name
+@serialized_write
 def update_user_dname(user_id: str, new_dname: str):
     users.upsert({"user_id": user_id, "dname": new_dname}, pk='user_id')
     logger.info(f"Updated display name for user {user_id} to {new_dname}")
 
+# Record a user on login (name and username come from the OAuth profile) and make sure they're in the default league
+@serialized_write
+def upsert_user(user_id: str, name: str, username: str):
+    users.upsert(dict(user_id=user_id, name=name, username=username), pk='user_id')
+    join_league(DEFAULT_LEAGUE_ID, user_id)
+
 # Modify the existing function to include dname
 def get_user_info(user_id: str):
     user = users.get(user_id)
@@ -383,10 +993,102 @@ if spreads not in db.t:
         team=str,
         point=float,
         price=int,
-        timestamp=str
+        timestamp=str,
+        season=int,
+        team_id=int
     ), pk='id')
+else:
+    try:
+        db.execute('SELECT season FROM spreads LIMIT 1')
+    except Exception:
+        db.execute('ALTER TABLE spreads ADD COLUMN season INTEGER')
+    try:
+        db.execute('SELECT team_id FROM spreads LIMIT 1')
+    except Exception:
+        db.execute('ALTER TABLE spreads ADD COLUMN team_id INTEGER')
+
+# Rows written before seasons existed take the season of their game
+with db.conn:
+    db.execute('UPDATE picks SET season = (SELECT season FROM schedule s WHERE s.game_id = picks.game_id) WHERE season IS NULL')
+    db.execute(f'UPDATE picks SET league_id = {DEFAULT_LEAGUE_ID} WHERE league_id IS NULL')
+    db.execute('UPDATE spreads SET season = (SELECT season FROM schedule s WHERE s.game_id = spreads.game_id) WHERE season IS NULL')
+
+# Rows written before the team dimension existed get their team ids from the names
+with db.conn:
+    db.execute("""UPDATE schedule SET home_team_id = (SELECT team_id FROM team_aliases WHERE alias = schedule.home_team),
+                                      away_team_id = (SELECT team_id FROM team_aliases WHERE alias = schedule.away_team)
+                  WHERE home_team_id IS NULL OR away_team_id IS NULL""")
+    db.execute('UPDATE picks SET team_id = (SELECT team_id FROM team_aliases WHERE alias = picks.pick) WHERE team_id IS NULL')
+    db.execute('UPDATE spreads SET team_id = (SELECT team_id FROM team_aliases WHERE alias = spreads.team) WHERE team_id IS NULL')
+
+# Indexes for the hot lookups, led by league and season so other pools and past seasons stay out of
+# the current league's ranges: a week's games, a user's picks, the latest lines of a game
+db.execute('DROP INDEX IF EXISTS idx_schedule_week')
+db.execute('DROP INDEX IF EXISTS idx_picks_user')
+db.execute('DROP INDEX IF EXISTS idx_picks_season_user')
+db.execute('CREATE INDEX IF NOT EXISTS idx_schedule_season_week ON schedule(season, week, game_id)')
+db.execute('CREATE INDEX IF NOT EXISTS idx_picks_league_season_user ON picks(league_id, season, user_id, game_id)')
+db.execute('CREATE INDEX IF NOT EXISTS idx_picks_game ON picks(game_id)')
+db.execute('CREATE INDEX IF NOT EXISTS idx_picks_user_game ON picks(user_id, game_id)')
+db.execute('CREATE INDEX IF NOT EXISTS idx_spreads_season_game ON spreads(season, game_id)')
+db.execute('DROP INDEX IF EXISTS idx_spreads_game')
+db.execute('CREATE INDEX IF NOT EXISTS idx_spreads_game_team ON spreads(game_id, team_id, bookmaker)')
+db.execute('CREATE INDEX IF NOT EXISTS idx_spreads_game_time ON spreads(game_id, timestamp)')
+
+# Seed an empty event log from the picks as they stand: a placement per pick at its timestamp and,
+# for graded picks, a grading four hours after kickoff
+def backfill_pick_events():
+    if db.execute('SELECT 1 FROM pick_events LIMIT 1').fetchone():
+        return 0
+    with db.conn:
+        db.execute(f"""INSERT INTO pick_events (ts, kind, league_id, user_id, game_id, team_id, pick_type, points, correct)
+                       SELECT CAST(strftime('%s', p.timestamp) AS REAL), {PICK_EVENT_KINDS['placed']}, p.league_id, p.user_id,
+                              p.game_id, p.team_id, CASE p.pick_type WHEN 'upset' THEN 2 ELSE 1 END, p.points, NULL
+                       FROM picks p ORDER BY p.timestamp, p.id""")
+        db.execute(f"""INSERT INTO pick_events (ts, kind, league_id, user_id, game_id, team_id, pick_type, points, correct)
+                       SELECT COALESCE(s.kickoff + 4 * 3600, CAST(strftime('%s', p.timestamp) AS REAL)), {PICK_EVENT_KINDS['graded']},
+                              p.league_id, p.user_id, p.game_id, p.team_id, CASE p.pick_type WHEN 'upset' THEN 2 ELSE 1 END,
+                              p.points, CASE WHEN p.correct THEN 1 ELSE 0 END
+                       FROM picks p LEFT JOIN schedule s ON s.game_id = p.game_id
+                       WHERE p.correct IS NOT NULL ORDER BY s.kickoff, p.id""")
+        count = db.execute('SELECT COUNT(*) FROM pick_events').fetchone()[0]
+    logger.info(f"Seeded the pick event log with {count} events from the picks table")
+    return count
+
+if build_pick_events:
+    backfill_pick_events()
+
+# Schema version, stamped once the migrations above have run; bump it with every new migration.
+# /readyz reports an instance whose database is behind (a failed migration) as not ready.
+SCHEMA_VERSION = 2
+db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def get_schema_version():
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def get_seasons():
+    return [row[0] for row in db.execute('SELECT DISTINCT season FROM schedule WHERE season IS NOT NULL ORDER BY season DESC')]
+
+# Line movement of compacted games: one row per game, bookmaker and team
+spread_summaries = db.t.spread_summaries
+if spread_summaries not in db.t:
+    spread_summaries.create(dict(
+        game_id=int,
+        bookmaker=str,
+        team=str,
+        open_point=float,
+        close_point=float,
+        min_point=float,
+        max_point=float,
+        open_price=int,
+        close_price=int,
+        polls=int,
+        first_seen=str,
+        last_seen=str
+    ), pk=('game_id', 'bookmaker', 'team'))
 
 # Add this new function at the end of the file
+@serialized_write
 def update_spreads_in_database(spreads_df):
     est = pytz.timezone('US/Eastern')
     current_time = datetime.now(est).isoformat()
@@ -404,10 +1106,16 @@ def update_spreads_in_database(spreads_df):
             team=str,
             point=float,
             price=int,
-            timestamp=str
+            timestamp=str,
+            season=int,
+            team_id=int
         ), pk='id')
         logger.info("Spreads table created successfully.")
 
+    game_ids = [int(game_id) for game_id in set(spreads_df['game_id'])]
+    seasons = dict(db.execute(f"SELECT game_id, season FROM schedule WHERE game_id IN ({','.join('?' * len(game_ids))})",
+                              game_ids).fetchall()) if game_ids else {}
+
     inserted_count = 0
     for _, row in spreads_df.iterrows():
         try:
@@ -417,7 +1125,9 @@ def update_spreads_in_database(spreads_df):
                 'team': row['team'],
                 'point': row['point'],
                 'price': row['price'],
-                'timestamp': current_time
+                'timestamp': current_time,
+                'season': seasons.get(int(row['game_id'])),
+                'team_id': get_team_id(row['team'])
             }
             spreads.insert(spread_data)
             inserted_count += 1
@@ -427,13 +1137,35 @@ def update_spreads_in_database(spreads_df):
 
     logger.info(f"Successfully inserted {inserted_count} spread records in the database.")
 
+    # Invalidate cached line movement of the games that got new lines
+    after_commit(bump, 'spreads', *{f"spreads:{int(game_id)}" for game_id in spreads_df['game_id']})
+    return inserted_count
+
 # Add this new function to retrieve spreads for a specific game
 def get_game_spreads(game_id: int):
     return [dict(s) for s in spreads.rows_where("game_id = ?", [game_id])]
 
+# Each team's most recent spread in the given games, as {game_id: {team_id: spread}}
+def get_latest_spreads(game_ids):
+    game_ids = list(game_ids)
+    if not game_ids:
+        return {}
+    latest = {}
+    for spread in db.q(f"""SELECT * FROM (
+                               SELECT *, ROW_NUMBER() OVER (PARTITION BY game_id, team_id ORDER BY timestamp DESC, id) AS n
+                               FROM spreads WHERE game_id IN ({','.join('?' * len(game_ids))}))
+                           WHERE n = 1""", game_ids):
+        latest.setdefault(spread['game_id'], {})[spread['team_id']] = spread
+    return latest
+
+def get_latest_spread_point(game_id: int, team: str):
+    row = db.execute("SELECT point FROM spreads WHERE game_id = ? AND team_id = ? ORDER BY timestamp DESC LIMIT 1",
+                     [game_id, get_team_id(team)]).fetchone()
+    return row[0] if row else None
+
 # Add a new function to calculate user scores
-def calculate_user_score(user_id: str):
-    user_picks = get_user_picks(user_id)
+def calculate_user_score(user_id: str, season: int = None, league_id: int = DEFAULT_LEAGUE_ID):
+    user_picks = get_user_picks(user_id, season, league_id)
     total_score = 0
     for pick in user_picks:
         if pick.correct:
@@ -441,52 +1173,155 @@ def calculate_user_score(user_id: str):
     return total_score
 
 # Add this new function to get leaderboard data
-def get_leaderboard():
-    users_list = users.rows
-    leaderboard = []
-    for user in users_list:
-        score = calculate_user_score(user['user_id'])
-        leaderboard.append({
-            'user_id': user['user_id'],
-            'name': user['dname'] or user['name'] or user['username'],
-            'username': user['username'],
-            'score': score
-        })
-    return sorted(leaderboard, key=lambda x: x['score'], reverse=True)
+def get_leaderboard(season: int = None, league_id: int = DEFAULT_LEAGUE_ID):
+    # One aggregate query over the league's members instead of a score query per user
+    return db.q(f"""SELECT u.user_id, {USER_NAME_SQL} AS name, u.username,
+                           COALESCE(SUM(CASE WHEN p.correct THEN p.points END), 0) AS score
+                    FROM league_members m JOIN users u ON u.user_id = m.user_id
+                    LEFT JOIN picks p ON p.league_id = m.league_id AND p.season = ? AND p.user_id = m.user_id
+                    WHERE m.league_id = ?
+                    GROUP BY u.user_id
+                    ORDER BY score DESC, u.rowid""", [season or current_season(), league_id])
+
+# Standings at the end of each fully graded week, per league
+rank_history = db.t.rank_history
+if rank_history in db.t and 'league_id' not in rank_history.columns_dict:
+    # Derived data: recreate per league and recompute below
+    rank_history.drop()
+build_rank_history = rank_history not in db.t
+if build_rank_history:
+    rank_history.create(dict(
+        league_id=int,
+        season=int,
+        week=int,
+        user_id=str,
+        points=float,
+        total=float,
+        rank=int
+    ), pk=('league_id', 'season', 'week', 'user_id'))
+
+def completed_weeks(season: int = None):
+    return [row[0] for row in db.execute("""SELECT week FROM schedule WHERE season = ? AND week IS NOT NULL
+                                             GROUP BY week HAVING MIN(COALESCE(completed, 0)) = 1 ORDER BY week""",
+                                          [season or current_season()])]
+
+@serialized_write
+def record_rank_history(season: int = None, league_ids=None, game_ids=None):
+    """Write every member's week points, running total and rank for each week of a season whose games are all final.
 
-def get_user_lock_picks(user_id: str):
-    user_picks = get_user_picks(user_id)
+    Only the given leagues are recomputed (default: all), so grading one league's picks leaves the others alone.
+    With `game_ids` (results that just changed) only the final weeks from the earliest of their weeks on are
+    rewritten: the week they close out, and the later running totals a regrade moves.
+    """
+    season = season or current_season()
+    if season is None:
+        return 0
+    from_week = 0
+    if game_ids is not None:
+        game_ids = list(game_ids)
+        from_week = db.execute(f"SELECT MIN(week) FROM schedule WHERE season = ? AND game_id IN ({','.join('?' * len(game_ids))})",
+                               [season, *game_ids]).fetchone()[0] if game_ids else None
+        if from_week is None:
+            return 0
+    if league_ids is None:
+        league_ids = [row[0] for row in db.execute('SELECT league_id FROM leagues')]
+    written = 0
+    for league_id in league_ids:
+        written += _record_league_rank_history(season, league_id, from_week)
+    logger.info(f"Recorded rank history for season {season}, leagues {list(league_ids)}, weeks {from_week or 1}+ ({written} rows)")
+    return written
+
+def _record_league_rank_history(season: int, league_id: int, from_week: int = 0):
+    with db.conn:
+        db.execute("""WITH weekly AS (
+                          SELECT w.week, u.user_id, COALESCE(SUM(CASE WHEN p.correct THEN p.points END), 0) AS points,
+                                 MIN(COALESCE(s.completed, 0)) AS final
+                          FROM (SELECT DISTINCT week FROM schedule WHERE season = :season AND week IS NOT NULL) w
+                          CROSS JOIN (SELECT user_id FROM league_members WHERE league_id = :league) u
+                          JOIN schedule s ON s.season = :season AND s.week = w.week
+                          LEFT JOIN picks p ON p.league_id = :league AND p.season = :season AND p.user_id = u.user_id AND p.game_id = s.game_id
+                          GROUP BY w.week, u.user_id),
+                      totals AS (
+                          SELECT week, user_id, points, final,
+                                 SUM(points) OVER (PARTITION BY user_id ORDER BY week) AS total
+                          FROM weekly)
+                      INSERT OR REPLACE INTO rank_history (league_id, season, week, user_id, points, total, rank)
+                      SELECT :league, :season, week, user_id, points, total, RANK() OVER (PARTITION BY week ORDER BY total DESC)
+                      FROM totals WHERE final = 1 AND week >= :from_week""", dict(season=season, league=league_id, from_week=from_week))
+        return db.execute('SELECT changes()').fetchone()[0]
+
+if build_rank_history:
+    record_rank_history()
+
+def get_rank_history(season: int = None, league_id: int = DEFAULT_LEAGUE_ID):
+    """{user_id: [{week, points, total, rank}, ...]} in week order, for one league and season (default: current)"""
+    history = {}
+    for row in db.q("""SELECT user_id, week, points, total, rank FROM rank_history
+                        WHERE league_id = ? AND season = ? ORDER BY user_id, week""", [league_id, season or current_season()]):
+        history.setdefault(row.pop('user_id'), []).append(row)
+    return history
+
+def get_user_lock_picks(user_id: str, season: int = None, league_id: int = DEFAULT_LEAGUE_ID):
+    user_picks = get_user_picks(user_id, season, league_id)
     return set(pick.pick for pick in user_picks if pick.pick_type == 'lock')
 
-# Add this new function at the end of the file
-def delete_picks_before_date(target_date=datetime(2024, 9, 16, tzinfo=pytz.UTC)):
-    eastern = pytz.timezone('US/Eastern')
-    target_date_est = target_date.astimezone(eastern)
-    
-    # Format the target date as ISO8601 string
-    target_date_str = target_date_est.isoformat()
-    
-    logger.info(f"Attempting to delete picks before {target_date_str}")
-    
-    try:
-        # Use the date() function in SQLite for comparison
-        deleted_picks = picks.delete_where("date(timestamp) < date(?)", [target_date_str])
-        logger.info(f"Deleted picks using custom wrapper: {deleted_picks}")
-    except Exception as e:
-        logger.error(f"Error deleting picks with custom wrapper: {str(e)}")
-        raise
-
-    # Check remaining picks
-    remaining_picks = picks.rows_where("date(timestamp) < date(?)", [target_date_str])
-    remaining_count = len(list(remaining_picks))
-    logger.info(f"Remaining picks before {target_date_str}: {remaining_count}")
-
-    if remaining_count > 0:
-        logger.warning(f"There are still {remaining_count} picks before the target date that were not deleted.")
-        # Log a few remaining picks for debugging
-        for pick in list(remaining_picks)[:5]:
-            logger.warning(f"Remaining pick: {pick}")
-    else:
-        logger.info("All picks before the target date were successfully deleted.")
+# Keyset-paginated reads for the JSON API; each returns (rows, last_key) where rows has at most `limit` items
+def _keyset_page(sql, params, limit, key):
+    rows = db.q(sql, params + [limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (key(rows[-1]) if has_more else None)
+
+def get_schedule_page(week: int = None, after: int = None, limit: int = 50, season: int = None):
+    where, params = ["season = ?", "game_id > ?"], [season or current_season(), -1 if after is None else after]
+    if week is not None:
+        where.append("week = ?")
+        params.append(week)
+    sql = f"""SELECT game_id, season, week, datetime, kickoff, locked, home_team, away_team,
+                     home_team_score, away_team_score, completed
+              FROM schedule WHERE {' AND '.join(where)} ORDER BY game_id LIMIT ?"""
+    return _keyset_page(sql, params, limit, lambda r: r['game_id'])
+
+def get_user_picks_page(user_id: str, week: int = None, after: int = None, limit: int = 50, season: int = None,
+                        league_id: int = DEFAULT_LEAGUE_ID):
+    where, params = ["p.league_id = ?", "p.season = ?", "p.user_id = ?", "p.id > ?"], [league_id, season or current_season(), user_id, -1 if after is None else after]
+    if week is not None:
+        where.append("s.week = ?")
+        params.append(week)
+    sql = f"""SELECT p.id, p.game_id, p.season, s.week, p.pick, p.pick_type, p.points, p.correct, p.timestamp
+              FROM picks p JOIN schedule s ON s.game_id = p.game_id
+              WHERE {' AND '.join(where)} ORDER BY p.id LIMIT ?"""
+    return _keyset_page(sql, params, limit, lambda r: r['id'])
+
+def get_standings_page(after=None, limit: int = 50, season: int = None, league_id: int = DEFAULT_LEAGUE_ID):
+    """Standings ordered by score, then user_id; `after` is the (score, user_id) of the last row seen"""
+    where, params = "", [season or current_season(), league_id]
+    if after is not None:
+        where = "WHERE score < ? OR (score = ? AND user_id > ?)"
+        params += [after[0], after[0], after[1]]
+    sql = f"""SELECT * FROM (
+                  SELECT u.user_id, u.username, {USER_NAME_SQL} AS name,
+                         COALESCE(SUM(CASE WHEN p.correct THEN p.points END), 0) AS score,
+                         RANK() OVER (ORDER BY COALESCE(SUM(CASE WHEN p.correct THEN p.points END), 0) DESC) AS rank
+                  FROM league_members m JOIN users u ON u.user_id = m.user_id
+                  LEFT JOIN picks p ON p.league_id = m.league_id AND p.season = ? AND p.user_id = m.user_id
+                  WHERE m.league_id = ?
+                  GROUP BY u.user_id)
+              {where} ORDER BY score DESC, user_id LIMIT ?"""
+    return _keyset_page(sql, params, limit, lambda r: [r['score'], r['user_id']])
+
+def get_latest_lines_page(week: int = None, after: int = None, limit: int = 50, season: int = None):
+    """Most recent spread per game, bookmaker and team"""
+    games_filter, params = "WHERE season = ?", [season or current_season()]
+    if week is not None:
+        games_filter += " AND game_id IN (SELECT game_id FROM schedule WHERE season = ? AND week = ?)"
+        params += [params[0], week]
+    params.append(-1 if after is None else after)
+    sql = f"""SELECT id, game_id, bookmaker, team, point, price, timestamp FROM spreads
+              WHERE id IN (SELECT MAX(id) FROM spreads {games_filter} GROUP BY game_id, team_id, bookmaker)
+                AND id > ?
+              ORDER BY id LIMIT ?"""
+    return _keyset_page(sql, params, limit, lambda r: r['id'])
 
-    return remaining_count
\ No newline at end of file
+# Writes made from here on go through the single writer thread (writer.py); the migrations above ran inline
+writer.attach(db)
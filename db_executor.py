@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+from writer import writer
+import asyncio
+import contextvars
+import functools
+import os
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Off-loop database access for async routes: blocking queries (and the pandas/FT work around them)
+# run on a dedicated, sized pool instead of the shared AnyIO threadpool, so the event loop stays
+# free for idle htmx and SSE connections. Each pool thread reads through its own connection
+# (connections.py). Writes are awaited on the single writer's Future and hold no thread while they
+# wait for their batch to commit.
+
+DB_EXECUTOR_WORKERS = int(os.environ.get('DB_EXECUTOR_WORKERS', 8))
+
+executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db-executor')
+
+async def run_db(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) run on the database executor, in the caller's context (request id, query stats)"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, fn, *args, **kwargs))
+
+async def run_write(fn, *args, **kwargs):
+    """Await a @serialized_write function through the writer queue"""
+    return await asyncio.wrap_future(writer.submit(fn.__wrapped__, *args, **kwargs))
@@ -0,0 +1,48 @@
+from database import db, db_path, SCHEMA_VERSION, get_schema_version, get_ingest_status
+import os
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Probes for the platform: /healthz says the process is serving, /readyz that it can do its job.
+# Neither renders a page or touches a session. Stale feeds are reported but don't fail readiness
+# (restarting the app can't fix an upstream outage); an unusable database does.
+
+READY_DB_LATENCY_MS = float(os.environ.get('READY_DB_LATENCY_MS', 500))
+SPREADS_STALE_HOURS = float(os.environ.get('SPREADS_STALE_HOURS', 24))
+_started = time.time()
+
+def liveness():
+    return {"status": "ok", "uptime_seconds": round(time.time() - _started)}
+
+def readiness():
+    """(ready, report): a timed query, the database file, the schema version and ingest freshness"""
+    checks, stale = {}, []
+    try:
+        started = time.perf_counter()
+        db.execute('SELECT 1').fetchone()
+        latency_ms = (time.perf_counter() - started) * 1000
+        checks['database'] = dict(ok=latency_ms <= READY_DB_LATENCY_MS, latency_ms=round(latency_ms, 2))
+    except Exception as e:
+        checks['database'] = dict(ok=False, error=str(e))
+    # A lost volume leaves the open connection working from its cache; the file itself must still be there
+    checks['volume'] = dict(ok=os.path.exists(db_path) and os.access(os.path.dirname(os.path.abspath(db_path)), os.W_OK))
+    try:
+        version = get_schema_version()
+        checks['schema'] = dict(ok=version >= SCHEMA_VERSION, version=version, expected=SCHEMA_VERSION)
+        ingest = get_ingest_status()
+        if ingest['overdue_results']:
+            stale.append(f"{ingest['overdue_results']} games past kickoff without a final score")
+        if ingest['upcoming_games'] and (ingest['spreads_age_seconds'] is None or ingest['spreads_age_seconds'] > SPREADS_STALE_HOURS * 3600):
+            stale.append(f"no spreads poll in {SPREADS_STALE_HOURS:g} hours with {ingest['upcoming_games']} games this week")
+        checks['ingest'] = dict(ok=True, stale=stale, **ingest)
+    except Exception as e:
+        checks['schema'] = checks.get('schema') or dict(ok=False, error=str(e))
+        checks['ingest'] = dict(ok=False, error=str(e))
+    ready = all(check['ok'] for check in checks.values())
+    if not ready:
+        logger.warning(f"Not ready: {[name for name, check in checks.items() if not check['ok']]}")
+    return ready, {"status": "ready" if ready else "unavailable", "checks": checks}
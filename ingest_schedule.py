@@ -0,0 +1,151 @@
+from database import db, schedule, TEAM_ABBREVIATIONS, get_team_id, canonical_team_names, get_game_week, get_season_year, refresh_kickoffs
+from datetime import datetime
+import pandas as pd
+import numpy as np
+import argparse
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Schedule ingest: fftoday CSV export (https://fftoday.com/nfl/schedule.php) -> schedule table.
+# Games are matched to existing rows by (season, away_team, home_team), which is unique in a
+# regular season, so re-running after flexes or time changes updates game_ids in place.
+
+CSV_COLUMNS = ['date', 'time', 'away_team', 'home_team']
+# Footnote markers fftoday appends to team names (international games, tentative flex games)
+TEAM_MARKERS = r'[ ¹²*]+$'
+
+def parse_schedule_csv(path, season: int):
+    """Parse an fftoday schedule export into datetime (naive ET), kickoff epoch, week and teams"""
+    raw = pd.read_csv(path, header=None, names=CSV_COLUMNS, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    raw['line'] = raw.index + 1
+    raw['source_week'] = pd.to_numeric(raw['date'].str.extract(r'^Week (\d+)$', expand=False)).ffill()
+
+    # Game rows are the ones with a kickoff time; week banners, column headers and footnotes are not
+    games = raw[raw['time'].str.match(r'^\d{1,2}:\d{2} [ap]m$', case=False)].copy()
+    games['date'] = games['date'].replace('', np.nan).ffill()
+    for column in ('away_team', 'home_team'):
+        games[column] = canonical_team_names(games[column].str.replace(TEAM_MARKERS, '', regex=True).str.strip())
+
+    # January/February games belong to the season that started the previous September
+    year = np.where(games['date'].str.split().str[1].isin(['Jan', 'Feb']), season + 1, season)
+    kickoff = pd.to_datetime(pd.Series(year, index=games.index).astype(str) + ' ' + games['date'] + ' ' + games['time'].str.upper(),
+                             format='%Y %a %b %d %I:%M %p', errors='coerce')
+
+    errors = [f"line {line}: unparseable date '{date} {time_}'"
+              for line, date, time_ in games.loc[kickoff.isna(), ['line', 'date', 'time']].itertuples(index=False)]
+    # The export has no year, so a weekday that disagrees with the date means the wrong --season
+    wrong_day = kickoff.notna() & (kickoff.dt.strftime('%a') != games['date'].str.split().str[0])
+    errors += [f"line {line}: '{date}' is not a {date.split()[0]} in {season}"
+               for line, date in games.loc[wrong_day, ['line', 'date']].itertuples(index=False)][:5]
+    for column in ('away_team', 'home_team'):
+        unknown = games[~games[column].isin(TEAM_ABBREVIATIONS.keys())]
+        errors += [f"line {line}: unknown team '{team}'" for line, team in unknown[['line', column]].itertuples(index=False)]
+    duplicates = games[games.duplicated(['away_team', 'home_team'], keep=False)]
+    errors += [f"line {line}: {away} @ {home} appears more than once"
+               for line, away, home in duplicates[['line', 'away_team', 'home_team']].itertuples(index=False)]
+    if errors:
+        raise ValueError("Invalid schedule:\n" + "\n".join(errors))
+
+    frame = pd.DataFrame({
+        'datetime': kickoff.dt.strftime('%Y-%m-%dT%H:%M:%S'),
+        'away_team': games['away_team'],
+        'home_team': games['home_team'],
+        'kickoff': (kickoff.dt.tz_localize('US/Eastern') - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1),
+        'source_week': games['source_week'],
+        'line': games['line']
+    }).reset_index(drop=True)
+    frame['week'] = frame['datetime'].map(get_game_week)
+    seasons = {get_season_year(d) for d in kickoff.dt.to_pydatetime()}
+    if seasons != {season}:
+        raise ValueError(f"Schedule dates fall in seasons {sorted(seasons)}, expected {season}")
+    return frame
+
+def diff_schedule(incoming, season: int):
+    """Match incoming games to the season's existing rows; returns (report, removed game ids, rows to upsert)"""
+    existing = pd.DataFrame(db.q("SELECT game_id, datetime, away_team, home_team FROM schedule WHERE season = ?", [season]),
+                            columns=['game_id', 'datetime', 'away_team', 'home_team'])
+    merged = incoming.merge(existing, on=['away_team', 'home_team'], how='outer', suffixes=('', '_old'), indicator=True)
+
+    added = merged[merged['_merge'] == 'left_only'].copy()
+    next_id = (db.execute('SELECT MAX(game_id) FROM schedule').fetchone()[0] or -1) + 1
+    added['game_id'] = np.arange(next_id, next_id + len(added))
+    matched = merged[merged['_merge'] == 'both']
+    changed = matched[matched['datetime'] != matched['datetime_old']]
+    removed = merged[merged['_merge'] == 'right_only']
+
+    report = dict(
+        season=season,
+        added=[dict(game_id=int(r.game_id), matchup=f"{r.away_team} @ {r.home_team}", datetime=r.datetime)
+               for r in added.itertuples()],
+        changed=[dict(game_id=int(r.game_id), matchup=f"{r.away_team} @ {r.home_team}", old=r.datetime_old, new=r.datetime,
+                      kind='time change' if r.datetime[:10] == r.datetime_old[:10] else 'moved')
+                 for r in changed.itertuples()],
+        removed=[dict(game_id=int(r.game_id), matchup=f"{r.away_team} @ {r.home_team}", datetime=r.datetime_old)
+                 for r in removed.itertuples()],
+        unchanged=len(matched) - len(changed),
+        week_mismatches=[dict(line=int(r.line), matchup=f"{r.away_team} @ {r.home_team}", source_week=int(r.source_week), week=int(r.week))
+                         for r in incoming.itertuples() if not pd.isna(r.source_week) and r.source_week != r.week]
+    )
+
+    now = time.time()
+    rows = [dict(game_id=int(r.game_id), datetime=r.datetime, away_team=r.away_team, home_team=r.home_team,
+                 away_team_id=get_team_id(r.away_team), home_team_id=get_team_id(r.home_team),
+                 kickoff=int(r.kickoff), week=int(r.week), season=season, locked=bool(r.kickoff <= now))
+            for r in pd.concat([added, changed]).itertuples()]
+    for row in rows[:len(added)]:
+        row.update(home_team_score=None, away_team_score=None, completed=False)
+    return report, [int(r.game_id) for r in removed.itertuples()], rows
+
+def ingest_schedule(path, season: int, dry_run: bool = False, prune: bool = False):
+    """Parse, validate and upsert a season's schedule into the live database; returns the diff report"""
+    incoming = parse_schedule_csv(path, season)
+    report, removed_ids, rows = diff_schedule(incoming, season)
+    report['pruned'] = []
+    if dry_run:
+        return report
+
+    with db.conn:
+        if rows:
+            schedule.upsert_all(rows, pk='game_id')
+        if prune and removed_ids:
+            # Only games nobody has picked can go; the rest are kept and left in the report
+            placeholders = ','.join('?' * len(removed_ids))
+            picked = {row[0] for row in db.execute(f"SELECT DISTINCT game_id FROM picks WHERE game_id IN ({placeholders})", removed_ids)}
+            report['pruned'] = [game_id for game_id in removed_ids if game_id not in picked]
+            if report['pruned']:
+                db.execute(f"DELETE FROM schedule WHERE game_id IN ({','.join('?' * len(report['pruned']))})", report['pruned'])
+    # Running web processes reload their kickoffs from the lock sweeper when they see the write
+    refresh_kickoffs()
+    logger.info(f"Ingested season {season}: {len(report['added'])} added, {len(report['changed'])} changed, "
+                f"{len(report['removed'])} missing from the file, {len(report['pruned'])} pruned")
+    return report
+
+def format_report(report, dry_run: bool = False):
+    lines = [f"Season {report['season']}{' (dry run, nothing written)' if dry_run else ''}: "
+             f"{len(report['added'])} added, {len(report['changed'])} changed, {report['unchanged']} unchanged, "
+             f"{len(report['removed'])} not in file"]
+    lines += [f"  + [{g['game_id']}] {g['matchup']} {g['datetime']}" for g in report['added']]
+    lines += [f"  ~ [{g['game_id']}] {g['matchup']} {g['old']} -> {g['new']} ({g['kind']})" for g in report['changed']]
+    lines += [f"  - [{g['game_id']}] {g['matchup']} {g['datetime']}{' (pruned)' if g['game_id'] in report['pruned'] else ''}"
+              for g in report['removed']]
+    lines += [f"  ! line {m['line']}: {m['matchup']} is week {m['source_week']} in the file but week {m['week']} by date"
+              for m in report['week_mismatches']]
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load an fftoday schedule CSV into the schedule table")
+    parser.add_argument('csv', help="fftoday schedule export, e.g. schedule25.csv")
+    parser.add_argument('--season', type=int, default=get_season_year(datetime.now()),
+                        help="Season year (the September the season starts in)")
+    parser.add_argument('--dry-run', action='store_true', help="Report the changes without writing them")
+    parser.add_argument('--prune', action='store_true', help="Delete this season's games missing from the file, unless picked")
+    args = parser.parse_args()
+    try:
+        report = ingest_schedule(args.csv, args.season, args.dry_run, args.prune)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(format_report(report, args.dry_run))
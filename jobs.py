@@ -0,0 +1,34 @@
+import threading
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_jobs = {}
+
+def start_periodic_job(name: str, interval_seconds: float, fn, initial_delay: float = None):
+    """Run `fn` every `interval_seconds` on a daemon thread; starting the same job twice is a no-op"""
+    if name in _jobs and _jobs[name].is_alive():
+        return _jobs[name]
+    stop = threading.Event()
+
+    def run():
+        delay = interval_seconds if initial_delay is None else initial_delay
+        while not stop.wait(delay):
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Job {name} failed: {e}")
+            delay = interval_seconds
+
+    thread = threading.Thread(target=run, name=f"job-{name}", daemon=True)
+    thread.stop = stop
+    thread.start()
+    _jobs[name] = thread
+    logger.info(f"Started periodic job {name} every {interval_seconds}s")
+    return thread
+
+def stop_periodic_job(name: str):
+    if name in _jobs:
+        _jobs.pop(name).stop.set()
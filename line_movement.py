@@ -0,0 +1,70 @@
+from database import db
+from retention import read_archived_spreads
+from cache import VersionedCache
+import numpy as np
+import pandas as pd
+
+# Line-movement engine: a game's spread polls as columnar NumPy arrays
+# (hot table + Parquet archive), summarized per bookmaker with vectorized ops.
+line_cache = VersionedCache('line_movement', lambda game_id: (f"spreads:{game_id}",), maxsize=512)
+
+def load_line_series(game_id: int, home_team: str):
+    """Columns for every poll of a game's home-team line, sorted by bookmaker then time"""
+    hot = pd.DataFrame(db.q("SELECT id, bookmaker, team, point, price, timestamp FROM spreads WHERE game_id = ?", [game_id]),
+                       columns=['id', 'bookmaker', 'team', 'point', 'price', 'timestamp'])
+    archived = read_archived_spreads(game_id=game_id)
+    df = pd.concat([hot, archived[hot.columns]], ignore_index=True) if len(archived) else hot
+    df = df[df['team'] == home_team].drop_duplicates('id')
+    books, book_codes = np.unique(df['bookmaker'].to_numpy(dtype=str), return_inverse=True)
+    ts = pd.to_datetime(df['timestamp'], utc=True, format='ISO8601').to_numpy(dtype='datetime64[s]').astype(np.int64)
+    point = df['point'].to_numpy(dtype=np.float32)
+    order = np.lexsort((ts, book_codes))
+    return books, book_codes[order], ts[order], point[order]
+
+def summarize_lines(books, book_codes, ts, point):
+    if len(point) == 0:
+        return {'bookmakers': [], 'consensus': None}
+    starts = np.flatnonzero(np.r_[True, book_codes[1:] != book_codes[:-1]])
+    ends = np.r_[starts[1:], len(point)] - 1
+
+    # Largest single move per bookmaker: abs diff within a segment, zeroed at segment starts
+    moves = np.abs(np.diff(point, prepend=point[0]))
+    moves[starts] = 0
+    largest = np.maximum.reduceat(moves, starts)
+    largest_at = np.array([s + np.argmax(moves[s:e + 1]) for s, e in zip(starts, ends)])
+
+    bookmakers = [dict(
+        bookmaker=books[book_codes[s]],
+        open=float(point[s]), close=float(point[e]), move=float(point[e] - point[s]),
+        largest_move=float(largest[i]), largest_move_at=int(ts[largest_at[i]]) if largest[i] else None,
+        polls=int(e - s + 1), first_seen=int(ts[s]), last_seen=int(ts[e])
+    ) for i, (s, e) in enumerate(zip(starts, ends))]
+
+    # Consensus: at each poll time, the median of every bookmaker's latest line so far
+    times = np.unique(ts)
+    latest = np.full((len(starts), len(times)), np.nan, dtype=np.float32)
+    for i, (s, e) in enumerate(zip(starts, ends)):
+        idx = np.searchsorted(ts[s:e + 1], times, side='right') - 1
+        seen = idx >= 0
+        latest[i, seen] = point[s:e + 1][idx[seen]]
+    consensus = np.nanmedian(latest, axis=0)
+    steps = np.abs(np.diff(consensus, prepend=consensus[0]))
+    biggest = int(np.argmax(steps))
+    return {
+        'bookmakers': bookmakers,
+        'consensus': dict(
+            open=float(consensus[0]), close=float(consensus[-1]), move=float(consensus[-1] - consensus[0]),
+            largest_move=float(steps[biggest]), largest_move_at=int(times[biggest]) if steps[biggest] else None,
+            series=[[int(t), float(p)] for t, p in zip(times, consensus)]
+        )
+    }
+
+def get_line_movement(game_id: int):
+    """Open/close/consensus and largest moves of the home-team spread, cached until new lines arrive"""
+    def compute():
+        game = next(iter(db.q("SELECT home_team, away_team FROM schedule WHERE game_id = ?", [game_id])), None)
+        if game is None:
+            return None
+        summary = summarize_lines(*load_line_series(game_id, game['home_team']))
+        return dict(game_id=game_id, home_team=game['home_team'], away_team=game['away_team'], **summary)
+    return line_cache.get_or_compute(game_id, compute)
@@ -0,0 +1,132 @@
+from fasthtml.common import *
+import asyncio
+import threading
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Messages waiting for a slow client before it gets disconnected
+MAX_QUEUED_MESSAGES = 100
+# Seconds between keep-alive comments so proxies don't close idle streams
+HEARTBEAT_SECONDS = 15
+
+class LiveBroker:
+    """In-process fan-out of server-sent events to connected clients.
+
+    Each client follows one league, so league fragments (leaderboard totals) only go to
+    that league's clients; game fragments go to everyone. Publishers (ingest, grading, the lock sweeper) usually run in worker threads,
+    so each message is encoded once and handed to the subscribers' event loops
+    with `call_soon_threadsafe`. No client ever touches the database.
+    """
+    def __init__(self, max_queued=MAX_QUEUED_MESSAGES):
+        self.max_queued = max_queued
+        # league_id -> subscriptions of the clients following that league
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client_count(self):
+        return sum(len(subs) for subs in self._subscribers.values())
+
+    def subscribe(self, league_id=None):
+        queue = asyncio.Queue(maxsize=self.max_queued)
+        sub = (asyncio.get_running_loop(), queue, league_id)
+        with self._lock:
+            self._subscribers.setdefault(league_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub[2])
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub[2]]
+
+    def publish(self, *fragments, event='message', league_id=None):
+        """Send out-of-band htmx fragments to every connected client, or only to those following `league_id`"""
+        fragments = [f for f in fragments if f is not None]
+        if not fragments:
+            return
+        message = sse_message(tuple(fragments), event=event)
+        with self._lock:
+            if league_id is None:
+                subscribers = [sub for subs in self._subscribers.values() for sub in subs]
+            else:
+                subscribers = list(self._subscribers.get(league_id, ()))
+        for sub in subscribers:
+            loop, queue, _ = sub
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # The client's event loop is gone; drop the subscription
+                self.unsubscribe(sub)
+
+    @staticmethod
+    def _deliver(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow client: signal the stream to close, it will reconnect and reload
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    async def stream(self, league_id=None):
+        """Async generator of SSE messages for one client following `league_id`"""
+        sub = self.subscribe(league_id)
+        queue = sub[1]
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(sub)
+
+broker = LiveBroker()
+
+# Fragment builders; ids match the elements rendered in main.py
+def score_span(game_id, away_short, away_score, home_short, home_score, **attrs):
+    """A final score with the winner marked; the row's data-pick colours the user's side (styles.css),
+    so main.py's rows and the broadcast fragment render the same cell"""
+    def side(name, short, score, other):
+        return Span(f"{short} {score}", cls=f"score-{name} {'winner' if score > other else 'loser' if score < other else 'tied'}")
+    return Span(side('away', away_short, away_score, home_score), " - ", side('home', home_short, home_score, away_score),
+                id=f"score-{game_id}", **attrs)
+
+def score_fragment(game):
+    """Score cell for a game row"""
+    if not game['completed'] or game['home_team_score'] is None or game['away_team_score'] is None:
+        return None
+    return score_span(game['game_id'], game['away_team_short'], game['away_team_score'],
+                      game['home_team_short'], game['home_team_score'], hx_swap_oob="true")
+
+def lock_fragment(game_id):
+    """Marker that disables pick links on a started game's row"""
+    return Span(id=f"lock-{game_id}", cls="game-locked", hx_swap_oob="true")
+
+def leaderboard_score_fragment(league_id, user_id, score):
+    return Span(score, id=f"lb-score-{league_id}-{user_id}", hx_swap_oob="true")
+
+def publish_game_updates(games, locked_game_ids=()):
+    """Push scores for completed games and lock markers for started ones"""
+    fragments = [score_fragment(game) for game in games]
+    fragments += [lock_fragment(game_id) for game_id in locked_game_ids]
+    broker.publish(*fragments)
+
+def publish_leaderboard_deltas(scores):
+    """Push changed totals to each league's clients, `scores` maps (league_id, user_id) to the new score"""
+    by_league = {}
+    for (league_id, user_id), score in scores.items():
+        by_league.setdefault(league_id, []).append(leaderboard_score_fragment(league_id, user_id, score))
+    for league_id, fragments in by_league.items():
+        broker.publish(*fragments, league_id=league_id)
@@ -0,0 +1,49 @@
+from database import lock_started_games, next_kickoff, refresh_kickoffs_if_changed
+from live import broker, lock_fragment
+import threading
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upper bound on a single sleep so schedule changes are noticed
+MAX_SLEEP_SECONDS = 60
+
+_stop = threading.Event()
+_thread = None
+
+def sweep_once():
+    """Lock every game that has kicked off and push the lock state to open pages"""
+    # Pick up schedule changes written by other processes (schedule ingest)
+    refresh_kickoffs_if_changed()
+    locked = lock_started_games()
+    if locked:
+        broker.publish(*[lock_fragment(game_id) for game_id in locked])
+    return locked
+
+def _run():
+    while not _stop.is_set():
+        try:
+            sweep_once()
+        except Exception as e:
+            logger.error(f"Lock sweep failed: {e}")
+        # Sleep until the next kickoff, never longer than MAX_SLEEP_SECONDS
+        upcoming = next_kickoff()
+        delay = MAX_SLEEP_SECONDS if upcoming is None else min(max(upcoming - time.time(), 0.5), MAX_SLEEP_SECONDS)
+        _stop.wait(delay)
+
+def start_lock_sweeper():
+    """Start the background sweeper once per process"""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return _thread
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="lock-sweeper", daemon=True)
+    _thread.start()
+    logger.info("Kickoff lock sweeper started")
+    return _thread
+
+def stop_lock_sweeper():
+    _stop.set()
@@ -0,0 +1,149 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from query_stats import route_template
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+
+# Structured logging for the web process: records are stamped with the request id and sampled on
+# the calling thread, then handed to a queue; a listener thread formats them as JSON lines and does
+# the stdout write, so request threads never block on it. Records tagged with an `event` listed in
+# LOG_SAMPLE (event=rate,...) are kept at that rate and carry `sample_every` so counts can be scaled
+# back up; untagged records (errors, pick audit lines) are always kept.
+
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'text' for plain lines when developing locally
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_SAMPLE = os.environ.get('LOG_SAMPLE', 'access=0.1,n_plus_one=0.1')
+# Requests slower than this are logged even when access lines are sampled
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+
+request_id = ContextVar('request_id', default=None)
+_listener = None
+
+# Attributes every LogRecord has; anything else on a record came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id', 'sample_every'}
+
+def parse_sample_rates(spec: str):
+    """'access=0.1,n_plus_one=0.05' -> {'access': 10, 'n_plus_one': 20} (keep one record in N)"""
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        event, _, rate = part.partition('=')
+        rates[event.strip()] = max(1, round(1 / float(rate))) if float(rate) > 0 else 0
+    return rates
+
+class ContextFilter(logging.Filter):
+    """Stamps the current request id on each record (runs on the emitting thread, where the ContextVar is set)"""
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps every Nth record of each sampled event; a rate of 0 drops the event entirely"""
+    def __init__(self, rates):
+        super().__init__()
+        self.rates, self.counts, self.lock = rates, {}, threading.Lock()
+
+    def filter(self, record):
+        every = self.rates.get(getattr(record, 'event', None))
+        if every is None or every == 1:
+            return True
+        if every == 0:
+            return False
+        with self.lock:
+            count = self.counts[record.event] = self.counts.get(record.event, 0) + 1
+        record.sample_every = every
+        return count % every == 1
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Queues the record with its message and traceback rendered but its extra fields kept as fields"""
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = dict(ts=datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+                     level=record.levelname, logger=record.name, msg=record.getMessage())
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if getattr(record, 'sample_every', None):
+            entry['sample_every'] = record.sample_every
+        entry.update((key, value) for key, value in vars(record).items() if key not in _STANDARD_ATTRS and not key.startswith('_'))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def configure_logging():
+    """Route the root logger (and uvicorn's) through the queue; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else
+                        logging.Formatter('%(levelname)s:%(name)s:%(request_id)s: %(message)s'))
+    log_queue = queue.Queue(-1)
+    handler = StructuredQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE)))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    # uvicorn's own handlers write to stdout directly; send its logs through the queue instead and
+    # leave access lines to RequestLogMiddleware, which knows the route and request id
+    for name in ('uvicorn', 'uvicorn.error'):
+        logging.getLogger(name).handlers.clear()
+        logging.getLogger(name).propagate = True
+    logging.getLogger('uvicorn.access').handlers.clear()
+    logging.getLogger('uvicorn.access').propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+access_logger = logging.getLogger('access')
+
+class RequestLogMiddleware:
+    """Gives each request an id (X-Request-ID, echoed back) and writes one access line when it finishes"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        incoming = dict(scope.get('headers') or []).get(b'x-request-id', b'').decode('latin-1')
+        rid = incoming if re.fullmatch(r'[\w.-]{1,64}', incoming) else uuid.uuid4().hex[:16]
+        token = request_id.set(rid)
+        started, status = time.perf_counter(), 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message['headers'] = list(message.get('headers', [])) + [(b'x-request-id', rid.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            fields = dict(route=route_template(scope), method=scope['method'], status=status, ms=round(ms, 1))
+            if status < 400 and ms < SLOW_REQUEST_MS:
+                fields['event'] = 'access'
+            access_logger.log(logging.WARNING if status >= 500 else logging.INFO,
+                              f"{scope['method']} {scope['path']} {status} {ms:.0f}ms", extra=fields)
+            request_id.reset(token)
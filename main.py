@@ -1,8 +1,27 @@
 from fasthtml.common import *
+from fasthtml.svg import Polyline
 from auth import bware, login, logout, auth_redirect, set_google_secret, get_google_client
-from database import db, ScheduleGame, Pick, add_pick, get_user_picks, get_all_games, get_game, update_game_results, update_pick_correctness, update_user_dname, get_user_info, get_game_spreads, calculate_user_score, get_leaderboard, get_user_info_by_username, get_user_lock_picks
+from database import db, db_path, to_est, upsert_user, ScheduleGame, Pick, add_pick, get_user_picks, get_all_games, get_game, update_game_results, update_pick_correctness, update_user_dname, get_user_info, get_game_spreads, get_latest_spreads, calculate_user_score, get_leaderboard, get_user_info_by_username, is_game_locked, set_week_picks, remove_pick, get_game_week, get_schedule_page, get_user_picks_page, get_standings_page, get_latest_lines_page, get_pick_counts, rebuild_pick_counts, get_rank_history, current_season, get_seasons, DEFAULT_LEAGUE_ID, get_league, get_league_by_slug, get_user_leagues, get_league_members, get_league_role, is_league_admin, join_league, create_league
 from update_results import fetch_and_process_results
 from update_spreads import fetch_and_process_spreads
+from live import broker, score_span
+from admin_db import table_names, table_schema, browse_table, parse_filters, export_ndjson, export_csv
+from backups import create_snapshot, iter_file, snapshot_filename, run_scheduled_backup, next_backup_delay, BACKUP_INTERVAL_HOURS
+from jobs import start_periodic_job
+from retention import run_retention, RETENTION_INTERVAL_HOURS
+from line_movement import get_line_movement
+from projections import project_standings
+from api import api_response, api_error, decode_cursor, score_cursor, page_size
+from lock_sweeper import start_lock_sweeper
+from query_stats import QueryStatsMiddleware
+import query_stats
+from metrics import MetricsMiddleware, render_metrics
+from health import liveness, readiness
+from profiler import ProfilerMiddleware, get_profile, collapsed, top_functions
+import profiler
+from pick_events import standings_as_of, recent_events
+from log_config import configure_logging, RequestLogMiddleware
+from db_executor import run_db, run_write
 from datetime import datetime, timedelta
 from itertools import groupby
 import os
@@ -13,8 +32,9 @@ import pytz
 import logging
 from pathlib import Path
 
-# Set up logging
+# Set up logging: JSON lines through a background queue listener (log_config.py)
 logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 js_code = """
@@ -42,10 +62,34 @@ app = FastHTML(before=bware,
                hdrs=(picolink,
                      Style(css_content),
                      SortableJS('.sortable'),
+                     Script(src="https://cdn.jsdelivr.net/npm/htmx-ext-sse@2.2.2/sse.js"),
                      Script(js_code))
                 )
 rt = app.route
 
+# Per-request query counts and timings (Server-Timing header, /admin/queries)
+app.add_middleware(QueryStatsMiddleware)
+# Route latency, status and job counters for /metrics
+app.add_middleware(MetricsMiddleware)
+# ?profile=1 on any page samples it for /admin/profiles (admins only); appended so it runs inside the session middleware
+app.user_middleware.append(Middleware(ProfilerMiddleware, allowed=lambda session: is_admin_user(session.get('user_id'))))
+# Outermost: request ids for every log line and one (sampled) access line per request
+app.add_middleware(RequestLogMiddleware)
+
+# Lock games at kickoff in the background
+start_lock_sweeper()
+
+# Local snapshots of the database with rotation; the first is due from the newest file on disk,
+# so frequent redeploys don't keep pushing it back a full interval
+start_periodic_job('backup', BACKUP_INTERVAL_HOURS * 3600, run_scheduled_backup, initial_delay=next_backup_delay())
+
+# Compact old spread polls into summaries + Parquet archive, then ANALYZE/VACUUM
+start_periodic_job('retention', RETENTION_INTERVAL_HOURS * 3600, run_retention)
+
+# Hidden element that holds the live-update stream; fragments arrive as out-of-band swaps
+def live_updates():
+    return Div(hx_ext="sse", sse_connect="/live", sse_swap="message", hx_swap="none", style="display: none;")
+
 # Helper function to get the current time in EST
 def get_current_est_time():
     return datetime.now(pytz.timezone('US/Eastern'))
@@ -70,35 +114,6 @@ def format_est_time(dt):
     est_time = dt.astimezone(eastern)
     return est_time.strftime("%a, %b %d, %Y at %I:%M %p")
 
-# Helper function to get the week number of a game
-def get_game_week(game_datetime):
-    eastern = pytz.timezone('US/Eastern')
-    game_date = datetime.fromisoformat(game_datetime)
-    if game_date.tzinfo is None:
-        game_date = eastern.localize(game_date)
-    else:
-        game_date = game_date.astimezone(eastern)
-    
-    # Determine the year of the season based on the game date
-    if game_date.month < 3:  # If the game is in January or February, it's part of the previous year's season
-        season_year = game_date.year - 1
-    else:
-        season_year = game_date.year
-
-    # Set the season start to the first Thursday of September
-    season_start = eastern.localize(datetime(season_year, 9, 1))
-    while season_start.weekday() != 3:  # 3 represents Thursday
-        season_start += timedelta(days=1)
-
-    # Calculate the week number
-    week = (game_date - season_start).days // 7 + 1
-
-    # Handle the case for week 18 (which occurs in the next calendar year)
-    if week <= 0:
-        week = 18
-
-    return week
-
 # Add this function near the other helper functions
 def get_current_week():
     current_time = get_current_est_time()
@@ -109,14 +124,37 @@ def get_current_week():
     return 18  # Return the last week if all games have passed
 
 # Add this new function near the other helper functions
-def get_games_for_week(week):
-    all_games = get_all_games()
+def get_games_for_week(week, season=None):
+    all_games = get_all_games(season)
     return [game for game in all_games if get_game_week(game.datetime) == week]
 
+# Season switcher for the sidebar; hidden until there is more than one season
+def season_links(path, season):
+    seasons = get_seasons()
+    if len(seasons) < 2:
+        return ""
+    season = season or current_season()
+    return Div(
+        H3("Seasons", cls="nav-title"),
+        *[A(str(s), href=f"{path}?season={s}", cls="nav-link active" if s == season else "nav-link") for s in seasons]
+    )
+
+# The league the user is looking at: the one picked on /leagues, if they are still a member of it
+def current_league(auth, session):
+    league_id = session.get('league_id', DEFAULT_LEAGUE_ID)
+    if league_id != DEFAULT_LEAGUE_ID and get_league_role(league_id, auth) is None:
+        session.pop('league_id', None)
+        league_id = DEFAULT_LEAGUE_ID
+    return league_id
+
 # Homepage (only visible if logged in)
 @rt('/')
-def home(auth, session):
-    games = get_all_games()
+async def home(auth, session, season: int = None):
+    return await run_db(render_home, auth, session, season)
+
+def render_home(auth, session, season: int = None):
+    league_id = current_league(auth, session)
+    games = get_all_games(season)
     try:
         user = db.t.users.get(auth)
         user_name = user.dname or user.name or auth
@@ -137,20 +175,26 @@ def home(auth, session):
     grouped_games = groupby(sorted_games, key=lambda g: get_game_week(g.datetime))
 
     # Get user's picks, and create a dictionary with game_id as key and Pick object as value
-    user_picks = {p.game_id: p for p in get_user_picks(auth) or []}
+    user_picks = {p.game_id: p for p in get_user_picks(auth, season, league_id) or []}
+
+    # Pick shares and latest spreads for every game of the season in one read each
+    pick_counts = get_pick_counts((g.game_id for g in games), league_id)
+    spreads = get_latest_spreads(g.game_id for g in games)
 
     # Get current week for mobile display
     current_week = get_current_week()
     
     # Create sidebar with leaderboard link and links to each week
-    sidebar_links = [A("Leaderboard", href="/leaderboard", cls="nav-link")]
+    sidebar_links = [A("Leaderboard", href="/leaderboard", cls="nav-link"),
+                     A("Leagues", href="/leagues", cls="nav-link")]
     
-    # Add admin link if user is gregsharvey
-    if is_admin_user(auth):
+    # Add admin link for the league's admins
+    if is_admin_user(auth, league_id):
         sidebar_links.append(A("Admin", href="/admin", cls="nav-link"))
     
     sidebar = Div(
         *sidebar_links,
+        season_links("/", season),
         H3("Weeks", cls="nav-title"),
         # Desktop: show all weeks
         Div(
@@ -171,7 +215,7 @@ def home(auth, session):
         user_week_picks = sum(1 for game in week_games if game.game_id in user_picks)
         week_header = H2(f"Week {week} - {user_week_picks}/3 picks made", id=f"week-{week}")
         
-        table = create_week_table(week_games, user_picks, auth)
+        table = create_week_table(week_games, user_picks, pick_counts, league_id, spreads)
         week_tables.extend([week_header, Br(), table, Br()])
 
     # Adjust main content to make room for sidebar
@@ -207,6 +251,7 @@ def home(auth, session):
         main_content,
         error_modal,
         Div(id="dname-form"),
+        live_updates(),
         Script(js_code)
     )
 
@@ -214,7 +259,7 @@ def home(auth, session):
 def close_modal():
     return Dialog(id="error-modal")
 
-def error_response(message, game_id, auth):
+def error_response(message, game_id, auth, league_id=DEFAULT_LEAGUE_ID):
     error_modal = Dialog(
         Article(
             Header(
@@ -234,11 +279,11 @@ def error_response(message, game_id, auth):
     game = get_game(game_id)
     week = get_game_week(game['datetime'])
     week_games = [g for g in get_all_games() if get_game_week(g.datetime) == week]
-    user_picks = get_user_picks(auth)
+    user_picks = get_user_picks(auth, league_id=league_id)
     user_picks_dict = {p.game_id: p for p in user_picks}
     
     # Create the updated week table
-    updated_table = create_week_table(week_games, user_picks_dict, auth)
+    updated_table = create_week_table(week_games, user_picks_dict, league_id=league_id)
     
     # Set the hx-swap-oob attribute on the table
     updated_table.attrs['hx_swap_oob'] = "true"
@@ -246,7 +291,15 @@ def error_response(message, game_id, auth):
     # Return both the error modal and the updated table
     return error_modal, updated_table
 
-def create_week_table(games, user_picks, auth):
+def create_week_table(games, user_picks, pick_counts=None, league_id=DEFAULT_LEAGUE_ID, spreads=None):
+    # What every row needs is loaded once for the table: pick shares, latest spreads, the week,
+    # and the teams the user has already used a lock on this season (user_picks covers the season)
+    if pick_counts is None:
+        pick_counts = get_pick_counts((g.game_id for g in games), league_id)
+    if spreads is None:
+        spreads = get_latest_spreads(g.game_id for g in games)
+    week = get_game_week(games[0].datetime)
+    lock_picks = {p.pick for p in user_picks.values() if p.pick_type == 'lock'}
     return Table(
         Tr(
             Th("Away Team"),
@@ -255,14 +308,14 @@ def create_week_table(games, user_picks, auth):
             Th("Your Pick"),
             Th("Result")
         ),
-        *[create_game_row(game, user_picks.get(game.game_id), auth) for game in games],
-        id=f"week-{get_game_week(games[0].datetime)}-table"
+        *[create_game_row(game, user_picks.get(game.game_id), week, lock_picks, spreads.get(game.game_id), pick_counts.get(game.game_id))
+          for game in games],
+        id=f"week-{week}-table"
     )
 
-def create_game_row(game, pick, auth):
+def create_game_row(game, pick, week, lock_picks, spreads=None, counts=None):
     game_time = to_est(datetime.fromisoformat(game.datetime))
-    current_time = get_current_est_time()
-    game_started = game_time < current_time
+    game_started = is_game_locked(game.game_id)
 
     away_team_full = game.away_team
     home_team_full = game.home_team
@@ -274,24 +327,27 @@ def create_game_row(game, pick, auth):
     full_date = day_time
     short_date = game_time.strftime("%a")
 
-    pick_short = get_game(pick.game_id)['away_team_short'] if pick and pick.pick == away_team_full else get_game(pick.game_id)['home_team_short'] if pick else ""
-
-    # Get the spreads for this game
-    spreads = get_game_spreads(game.game_id)
-    
-    # Find the most recent spread for each team
-    away_spread = None
-    home_spread = None
-    for spread in sorted(spreads, key=lambda s: s['timestamp'], reverse=True):
-        if spread['team'] == away_team_full and away_spread is None:
-            away_spread = spread
-        elif spread['team'] == home_team_full and home_spread is None:
-            home_spread = spread
-        if away_spread and home_spread:
-            break
-
-    # Get all lock picks for the user
-    user_lock_picks = get_user_lock_picks(auth)
+    pick_short = "" if not pick else away_team_short if pick.team_id == game.away_team_id else home_team_short
+
+    # The most recent spread for each team
+    spreads = spreads or {}
+    away_spread = spreads.get(game.away_team_id)
+    home_spread = spreads.get(game.home_team_id)
+
+    # Share of this game's pickers on each side, split by lock and upset
+    counts = counts or {}
+    total_picks = sum(counts.values())
+
+    def create_share(team_full):
+        locks = counts.get((team_full, 'lock'), 0)
+        upsets = counts.get((team_full, 'upset'), 0)
+        if not total_picks:
+            return ""
+        return Small(
+            f" {(locks + upsets) / total_picks:.0%}",
+            title=f"{locks} lock, {upsets} upset of {total_picks} picks",
+            cls="pick-share"
+        )
 
     def create_team_cell(team_full, team_short, spread, is_lock_pick):
         team_style = "color: purple;" if is_lock_pick else ""
@@ -299,7 +355,7 @@ def create_game_row(game, pick, auth):
             team_short,
             style=team_style,
             hx_post=f"/pick/{game.game_id}/{team_full}/lock",
-            hx_target=f"#week-{get_game_week(game.datetime)}-table",
+            hx_target=f"#week-{week}-table",
             hx_swap="outerHTML",
             cls="team-pick"
         ) if not game_started else Span(
@@ -311,20 +367,21 @@ def create_game_row(game, pick, auth):
         if spread and spread['point'] > 0:
             spread_element = A(
                 f" (+{spread['point']})",
-                hx_post=f"/pick/{game.game_id}/{team_full}/upset/{spread['point']}",
-                hx_target=f"#week-{get_game_week(game.datetime)}-table",
+                hx_post=f"/pick/{game.game_id}/{team_full}/upset",
+                hx_target=f"#week-{week}-table",
                 hx_swap="outerHTML",
                 cls="upset-pick"
             ) if not game_started else f" (+{spread['point']})"
 
-        return Td(team_element, spread_element)
+        return Td(team_element, spread_element, create_share(team_full))
 
     return Tr(
-        create_team_cell(away_team_full, away_team_short, away_spread, away_team_full in user_lock_picks),
-        create_team_cell(home_team_full, home_team_short, home_spread, home_team_full in user_lock_picks),
+        create_team_cell(away_team_full, away_team_short, away_spread, away_team_full in lock_picks),
+        create_team_cell(home_team_full, home_team_short, home_spread, home_team_full in lock_picks),
         Td(
             Span(full_date, cls="date-full"),
-            Span(short_date, cls="date-short")
+            Span(short_date, cls="date-short"),
+            Span(id=f"lock-{game.game_id}", cls="game-locked" if game_started else None)
         ),
         Td(
             pick_short if pick else "",
@@ -334,95 +391,128 @@ def create_game_row(game, pick, auth):
             " ",
             A("×", 
               hx_post=f"/remove_pick/{game.game_id}",
-              hx_target=f"#week-{get_game_week(game.datetime)}-table",
+              hx_target=f"#week-{week}-table",
               hx_swap="outerHTML",
               hx_indicator="#error-message"
             ) if pick and not game_started else "",
             id=f"pick-{game.game_id}"
         ),
-        Td(
-            (Span(
-                f"{away_team_short} {game.away_team_score}",
-                style=f"font-weight: {'bold' if game.away_team_score > game.home_team_score else 'normal'}; "
-                      f"color: {'green' if game.completed and pick and pick.pick == game.away_team and game.away_team_score > game.home_team_score else 'red' if game.completed and pick and pick.pick == game.away_team and game.away_team_score < game.home_team_score else 'inherit'};"
-            ),
-            " - ",
-            Span(
-                f"{home_team_short} {game.home_team_score}",
-                style=f"font-weight: {'bold' if game.home_team_score > game.away_team_score else 'normal'}; "
-                      f"color: {'green' if game.completed and pick and pick.pick == game.home_team and game.home_team_score > game.away_team_score else 'red' if game.completed and pick and pick.pick == game.home_team and game.home_team_score < game.away_team_score else 'inherit'};"
-            )) if game.completed else ""
-        ),
-        id=f"game-{game.game_id}"
+        Td(score_span(game.game_id, away_team_short, game.away_team_score, home_team_short, game.home_team_score)
+           if game.completed and game.away_team_score is not None and game.home_team_score is not None
+           else Span(id=f"score-{game.game_id}")),
+        id=f"game-{game.game_id}",
+        # Which side the user picked, for the score colours (also on scores pushed live)
+        data_pick=None if not pick else "away" if pick.pick == game.away_team else "home"
     )
 
 @rt('/pick/{game_id:int}/{team}/lock')
-def post(game_id: int, team: str, auth):
+async def post(game_id: int, team: str, auth, session):
+    league_id = await run_db(current_league, auth, session)
     try:
-        add_pick(auth, game_id, team, pick_type='lock', points=3.0)
-        game = get_game(game_id)
-        week = get_game_week(game['datetime'])
-        week_games = get_games_for_week(week)
-        user_picks = get_user_picks(auth)
-        user_picks_dict = {p.game_id: p for p in user_picks}
-        return create_week_table(week_games, user_picks_dict, auth)
+        await run_write(add_pick, auth, game_id, team, pick_type='lock', points=3.0, league_id=league_id)
+        return await run_db(pick_week_table, game_id, auth, league_id)
     except ValueError as e:
-        return error_response(str(e), game_id, auth)
+        return await run_db(error_response, str(e), game_id, auth, league_id)
 
-@rt('/pick/{game_id:int}/{team}/upset/{points:float}')
-def post(game_id: int, team: str, points: float, auth):
+@rt('/pick/{game_id:int}/{team}/upset')
+async def post(game_id: int, team: str, auth, session):
+    league_id = await run_db(current_league, auth, session)
     try:
-        add_pick(auth, game_id, team, pick_type='upset', points=points)
-        game = get_game(game_id)
-        week = get_game_week(game['datetime'])
-        week_games = get_games_for_week(week)
-        user_picks = get_user_picks(auth)
-        user_picks_dict = {p.game_id: p for p in user_picks}
-        return create_week_table(week_games, user_picks_dict, auth)
+        await run_write(add_pick, auth, game_id, team, pick_type='upset', league_id=league_id)
+        return await run_db(pick_week_table, game_id, auth, league_id)
+    except ValueError as e:
+        return await run_db(error_response, str(e), game_id, auth, league_id)
+
+# The week table of a game, with the user's picks, after a pick change
+def pick_week_table(game_id: int, auth, league_id: int):
+    game = get_game(game_id)
+    week = get_game_week(game['datetime'])
+    week_games = get_games_for_week(week)
+    user_picks = get_user_picks(auth, league_id=league_id)
+    user_picks_dict = {p.game_id: p for p in user_picks}
+    return create_week_table(week_games, user_picks_dict, league_id=league_id)
+
+# Parse "game_id:team" slate entries from the batch pick form
+def parse_slate_entry(entry):
+    game_id, _, team = entry.partition(':')
+    if not game_id.isdigit() or not team:
+        raise ValueError(f"Invalid pick '{entry}', expected game_id:team")
+    return int(game_id), team
+
+# Set a whole week (2 locks + 1 upset) in one request
+@rt('/picks/week/{week:int}')
+async def post(week: int, auth, session, lock: list[str] = None, upset: str = None):
+    league_id = await run_db(current_league, auth, session)
+    week_games = await run_db(get_games_for_week, week)
+    if not week_games:
+        return P(f"No games found for week {week}")
+    try:
+        locks = [parse_slate_entry(entry) for entry in lock or []]
+        user_picks = await run_write(set_week_picks, auth, week_games, locks, parse_slate_entry(upset) if upset else None,
+                                     league_id=league_id)
+        return await run_db(create_week_table, week_games, {p.game_id: p for p in user_picks}, league_id=league_id)
     except ValueError as e:
-        return error_response(str(e), game_id, auth)
+        return await run_db(error_response, str(e), week_games[0].game_id, auth, league_id)
 
 @rt('/remove_pick/{game_id:int}')
-def post(game_id: int, auth):
+async def post(game_id: int, auth, session):
+    league_id = await run_db(current_league, auth, session)
     try:
-        game = get_game(game_id)
+        if await run_db(is_game_locked, game_id):
+            return await run_db(error_response, "You cannot remove a pick after the game has started.", game_id, auth, league_id)
         
-        if to_est(datetime.fromisoformat(game['datetime'])) < get_current_est_time():
-            return error_response("You cannot remove a pick after the game has started.", game_id, auth)
-        
-        user_picks = get_user_picks(auth)
-        for pick in user_picks:
-            if pick.game_id == game_id:
-                db.t.picks.delete(pick.id)
-                break
-        
-        week = get_game_week(game['datetime'])
-        week_games = [g for g in get_all_games() if get_game_week(g.datetime) == week]
-        
-        # Update user_picks after removing the pick
-        user_picks = get_user_picks(auth)
-        user_picks_dict = {p.game_id: p for p in user_picks}
-        
-        return create_week_table(week_games, user_picks_dict, auth)
+        await run_write(remove_pick, auth, game_id, league_id)
+        return await run_db(pick_week_table, game_id, auth, league_id)
     except Exception as e:
-        return error_response(str(e), game_id, auth)
+        return await run_db(error_response, str(e), game_id, auth, league_id)
+
+# Rank after each graded week as a tiny line chart; first place is drawn at the top
+def rank_sparkline(ranks, n_users, width=60, height=16):
+    if len(ranks) < 2:
+        return ""
+    step = width / (len(ranks) - 1)
+    scale = (height - 2) / max(n_users - 1, 1)
+    points = " ".join(f"{i * step:.1f},{1 + (rank - 1) * scale:.1f}" for i, rank in enumerate(ranks))
+    return Svg(Polyline(points=points, fill="none", stroke="currentColor", stroke_width="1.5"),
+               width=width, height=height, viewBox=f"0 0 {width} {height}", cls="rank-sparkline")
+
+# Week-over-week change in rank between the last two graded weeks
+def rank_movement(history):
+    if len(history) < 2:
+        return ""
+    change = history[-2]['rank'] - history[-1]['rank']
+    if change > 0:
+        return Span(f"▲{change}", cls="rank-up", title=f"Up {change} since week {history[-2]['week']}")
+    if change < 0:
+        return Span(f"▼{-change}", cls="rank-down", title=f"Down {-change} since week {history[-2]['week']}")
+    return Span("–", cls="rank-same")
 
 @rt('/leaderboard')
-def get(auth):
-    leaderboard_data = get_leaderboard()
+async def get(auth, session, season: int = None, as_of: str = None):
+    return await run_db(render_leaderboard, auth, session, season, as_of)
+
+def render_leaderboard(auth, session, season: int = None, as_of: str = None):
+    league_id = current_league(auth, session)
+    league = get_league(league_id)
+    # ?as_of=2025-10-12 (end of that day, Eastern) or a full ISO timestamp: standings replayed from the pick event log
+    as_of_moment = parse_as_of(as_of)
+    leaderboard_data = standings_as_of(as_of_moment.timestamp(), season, league_id) if as_of_moment else get_leaderboard(season, league_id)
+    rank_history = get_rank_history(season, league_id)
     
     # Get the current week
     current_week = get_current_week()
     
     # Create the sidebar
-    sidebar_links = [A("Picks", href=f"/#week-{current_week}", cls="nav-link")]
+    sidebar_links = [A("Picks", href=f"/#week-{current_week}", cls="nav-link"),
+                     A("Leagues", href="/leagues", cls="nav-link")]
     
-    # Add admin link if user is gregsharvey
-    if is_admin_user(auth):
+    # Add admin link for the league's admins
+    if is_admin_user(auth, league_id):
         sidebar_links.append(A("Admin", href="/admin", cls="nav-link"))
     
     sidebar = Div(
         *sidebar_links,
+        season_links("/leaderboard", season),
         H3("Weeks", cls="nav-title"),
         # Desktop: show all weeks
         Div(
@@ -440,41 +530,192 @@ def get(auth):
     # Add the "Change Display Name" link
     change_name_link = A("Change Display Name", 
                          href="/change_dname")
+    projections_link = A("Can I still win?", href="/projections")
 
     # Create the leaderboard table
+    def best_week(history):
+        best = max(history, key=lambda h: h['points'], default=None)
+        return f"Wk {best['week']}: {best['points']:g}" if best and best['points'] else ""
+
     leaderboard_table = Table(
-        Tr(Th("Rank"), Th("Name"), Th("Score")),
+        Tr(Th("Rank"), Th("Name"), Th("Score"), Th("Best Week"), Th("Trend")),
         *[Tr(
-            Td(i+1), 
+            Td(i+1, " ", rank_movement(rank_history.get(entry['user_id'], []))),
             Td(A(entry['name'], href=f"/user/{entry['username']}")),  # Use username here
-            Td(entry['score'])
+            Td(Span(entry['score'], id=f"lb-score-{league_id}-{entry['user_id']}")),
+            Td(best_week(rank_history.get(entry['user_id'], []))),
+            Td(rank_sparkline([h['rank'] for h in rank_history.get(entry['user_id'], [])], len(leaderboard_data)))
         ) for i, entry in enumerate(leaderboard_data)]
     )
 
     # Create the main content
     main_content = Div(
-        H1("Leaderboard"),
+        H1(f"{league['name']} Leaderboard" if league_id != DEFAULT_LEAGUE_ID else "Leaderboard"),
+        P(f"As of {as_of_moment.strftime('%a %b %d %Y, %I:%M %p')} ", A("(now)", href="/leaderboard")) if as_of_moment else "",
         change_name_link,
+        " | ",
+        projections_link,
         Br(),
         leaderboard_table,
         cls="main-content"
     )
 
+    return Titled(
+        "",
+        sidebar,
+        main_content,
+        "" if as_of_moment else live_updates()
+    )
+
+def parse_as_of(value: str):
+    """An Eastern datetime from YYYY-MM-DD (end of that day) or an ISO timestamp; None when missing or invalid"""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if len(value) == 10:
+        moment += timedelta(days=1)
+    return to_est(moment)
+
+# Monte Carlo projection of the final standings from the current spreads
+@rt('/projections')
+def get(auth, session):
+    projection = project_standings(league_id=current_league(auth, session))
+    
+    sidebar = Div(
+        A("Back to Leaderboard", href="/leaderboard", cls="nav-link"),
+        cls="sidebar"
+    )
+
+    projection_table = Table(
+        Tr(Th("Name"), Th("Score"), Th("Projected"), Th("Win %"), Th("Top 3 %"), Th("Avg Finish")),
+        *[Tr(
+            Td(A(entry['name'], href=f"/user/{entry['username']}")),
+            Td(entry['score']),
+            Td(f"{entry['expected_score']:.1f}"),
+            Td(f"{entry['win_probability']:.1%}"),
+            Td(f"{entry['top3_probability']:.1%}"),
+            Td(f"{entry['expected_rank']:.1f}")
+        ) for entry in projection]
+    )
+
+    main_content = Div(
+        H1("Projected Standings"),
+        P("Simulates every outstanding pick using win probabilities from the latest spreads."),
+        projection_table,
+        cls="main-content"
+    )
+
+    return Titled(
+        "",
+        sidebar,
+        main_content
+    )
+
+# Leagues: the user's pools, switching between them, creating one and joining by invite link
+@rt('/leagues')
+def get(auth, session):
+    league_id = current_league(auth, session)
+    my_leagues = get_user_leagues(auth)
+
+    sidebar = Div(
+        A("Back to Picks", href="/", cls="nav-link"),
+        A("Leaderboard", href="/leaderboard", cls="nav-link"),
+        cls="sidebar"
+    )
+
+    leagues_table = Table(
+        Tr(Th("League"), Th("Role"), Th("Invite Link"), Th("")),
+        *[Tr(
+            Td(Strong(league['name']) if league['league_id'] == league_id else league['name']),
+            Td(league['role'].capitalize()),
+            Td(Code(f"/leagues/join/{league['slug']}")),
+            Td(A("Switch", href=f"/leagues/{league['league_id']}/switch") if league['league_id'] != league_id else "Current")
+        ) for league in my_leagues]
+    )
+
+    # League admins manage roles from here
+    members = []
+    if is_admin_user(auth, league_id):
+        members = [
+            H2("Members"),
+            Table(
+                Tr(Th("Name"), Th("Role"), Th("")),
+                *[Tr(
+                    Td(member['name']),
+                    Td(member['role'].capitalize()),
+                    Td(Form(Button("Make Admin", cls="secondary"), action=f"/leagues/{league_id}/admins/{member['user_id']}", method="post")
+                       if member['role'] != 'admin' else "")
+                ) for member in get_league_members(league_id)]
+            )
+        ]
+
+    create_form = Form(
+        Input(type="text", name="name", placeholder="League name"),
+        Input(type="text", name="slug", placeholder="invite-slug"),
+        Button("Create League", type="submit"),
+        action="/leagues",
+        method="post"
+    )
+
+    main_content = Div(
+        H1("Your Leagues"),
+        leagues_table,
+        *members,
+        H2("Start a League"),
+        create_form,
+        cls="main-content"
+    )
+
     return Titled(
         "",
         sidebar,
         main_content
     )
 
+@rt('/leagues')
+def post(name: str, slug: str, auth, session):
+    try:
+        league = create_league(name, slug, auth)
+    except ValueError as e:
+        return Titled("Could not create league", P(str(e)), A("Back", href="/leagues"))
+    session['league_id'] = league['league_id']
+    return RedirectResponse('/leagues', status_code=303)
+
+@rt('/leagues/{league_id:int}/switch')
+def get(league_id: int, auth, session):
+    if get_league_role(league_id, auth) is not None:
+        session['league_id'] = league_id
+    return RedirectResponse('/', status_code=303)
+
+@rt('/leagues/join/{slug}')
+def get(slug: str, auth, session):
+    league = get_league_by_slug(slug)
+    if not league:
+        return Titled("League not found", P(f"There is no league called '{slug}'."))
+    join_league(league['league_id'], auth)
+    session['league_id'] = league['league_id']
+    return RedirectResponse('/', status_code=303)
+
+@rt('/leagues/{league_id:int}/admins/{user_id}')
+def post(league_id: int, user_id: str, auth):
+    if not is_admin_user(auth, league_id) or get_league_role(league_id, user_id) is None:
+        return P("Access denied")
+    join_league(league_id, user_id, role='admin')
+    return RedirectResponse('/leagues', status_code=303)
+
 # Add this new route for the user page
 @rt('/user/{username}')
-def get(username: str, auth):
+def get(username: str, auth, session, season: int = None):
+    league_id = current_league(auth, session)
     user_info = get_user_info_by_username(username)
     if not user_info:
         return "User not found"
     
-    user_picks = get_user_picks(user_info['user_id'])
-    user_score = calculate_user_score(user_info['user_id'])
+    user_picks = get_user_picks(user_info['user_id'], season, league_id)
+    user_score = calculate_user_score(user_info['user_id'], season, league_id)
     
     # Group picks by week
     picks_by_week = {}
@@ -491,6 +732,7 @@ def get(username: str, auth):
     # Create the sidebar
     sidebar = Div(
         A("Back to Leaderboard", href="/leaderboard", cls="nav-link"),
+        season_links(f"/user/{username}", season),
         H3("Weeks", cls="nav-title"),
         # Desktop: show all weeks
         Div(
@@ -607,7 +849,7 @@ def get(session):
     
     # Add user to database if not exists
     try:
-        db.t.users.upsert(dict(user_id='local_test_user', name='Local Test User', username='test'), pk='user_id')
+        upsert_user('local_test_user', 'Local Test User', 'test')
     except:
         pass  # Ignore if user already exists
     
@@ -644,26 +886,22 @@ else:
     logger.warning("GOOGLE_CLIENT_SECRET or GOOGLE_CLIENT_ID environment variables not set")
 
 # Admin authentication check
-def is_admin_user(auth):
-    """Check if the current user is an admin (gregsharvey)"""
+def is_admin_user(auth, league_id=DEFAULT_LEAGUE_ID):
+    """Check if the current user is an admin of the league; admins of the default league also run the instance"""
     if not auth:
         return False
-    try:
-        user = db.t.users.get(auth)
-        return user and (user.username == 'gregsharvey' or user.name == 'gregsharvey' or 'gregsharvey' in str(user.user_id).lower())
-    except:
-        return False
+    return is_league_admin(league_id, auth)
 
 # Admin page for managing picks
 @rt('/admin')
-def admin_page(auth):
-    """Admin page for managing picks - only accessible by gregsharvey"""
-    if not is_admin_user(auth):
+def admin_page(auth, session):
+    """Admin page for managing picks - only accessible by the league's admins"""
+    league_id = current_league(auth, session)
+    if not is_admin_user(auth, league_id):
         return Titled("Access Denied", P("You do not have permission to access this page."))
     
-    # Get all users for the dropdown
-    all_users = list(db.t.users())
-    users_list = [(user.user_id, user.dname or user.name or user.username) for user in all_users]
+    # Get the league's members for the dropdown
+    users_list = [(member['user_id'], member['name']) for member in get_league_members(league_id)]
     
     # Get current week
     current_week = get_current_week()
@@ -675,6 +913,9 @@ def admin_page(auth):
         H3("Admin Tools", cls="nav-title"),
         A("Update Results", href="/admin/update_results", cls="nav-link"),
         A("Update Spreads", href="/admin/update_spreads", cls="nav-link"),
+        A("Query Stats", href="/admin/queries", cls="nav-link"),
+        A("Profiles", href="/admin/profiles", cls="nav-link"),
+        A("Pick Log", href="/admin/pick_events", cls="nav-link"),
         cls="sidebar"
     )
     
@@ -725,9 +966,10 @@ def admin_page(auth):
     )
 
 @rt('/admin/load_picks')
-def load_user_picks(selected_user: str, selected_week: str, auth):
+def load_user_picks(selected_user: str, selected_week: str, auth, session):
     """Load picks for a specific user and week"""
-    if not is_admin_user(auth):
+    league_id = current_league(auth, session)
+    if not is_admin_user(auth, league_id) or get_league_role(league_id, selected_user) is None:
         return P("Access denied")
     
     try:
@@ -745,7 +987,7 @@ def load_user_picks(selected_user: str, selected_week: str, auth):
             return P(f"No games found for week {week}")
         
         # Get user's picks for this week
-        user_picks = get_user_picks(user_id)
+        user_picks = get_user_picks(user_id, league_id=league_id)
         user_picks_dict = {p.game_id: p for p in user_picks if get_game_week(get_game(p.game_id)['datetime']) == week}
         
         # Create picks table
@@ -776,8 +1018,7 @@ def create_admin_picks_table(games, user_picks, user_id, week):
 def create_admin_game_row(game, pick, user_id, week):
     """Create a row for admin pick management"""
     game_time = to_est(datetime.fromisoformat(game.datetime))
-    current_time = get_current_est_time()
-    game_started = game_time < current_time
+    game_started = is_game_locked(game.game_id)
 
     away_team_full = game.away_team
     home_team_full = game.home_team
@@ -790,7 +1031,7 @@ def create_admin_game_row(game, pick, user_id, week):
     # Show current pick
     current_pick = ""
     if pick:
-        pick_team_short = away_team_short if pick.pick == away_team_full else home_team_short
+        pick_team_short = away_team_short if pick.team_id == game.away_team_id else home_team_short
         current_pick = f"{pick_team_short} ({pick.pick_type}, {pick.points}pts)"
     
     # Create action buttons - Admin can always make picks regardless of game status
@@ -801,9 +1042,9 @@ def create_admin_game_row(game, pick, user_id, week):
     away_spread = None
     home_spread = None
     for spread in sorted(spreads, key=lambda s: s['timestamp'], reverse=True):
-        if spread['team'] == away_team_full and away_spread is None:
+        if spread['team_id'] == game.away_team_id and away_spread is None:
             away_spread = spread
-        elif spread['team'] == home_team_full and home_spread is None:
+        elif spread['team_id'] == game.home_team_id and home_spread is None:
             home_spread = spread
         if away_spread and home_spread:
             break
@@ -826,7 +1067,7 @@ def create_admin_game_row(game, pick, user_id, week):
     if away_spread and away_spread['point'] > 0:
         actions.append(
             A(f"A({away_spread['point']})", 
-              hx_post=f"/admin/add_pick/{game.game_id}/{away_team_full}/upset/{away_spread['point']}/{user_id}",
+              hx_post=f"/admin/add_pick/{game.game_id}/{away_team_full}/upset/{user_id}",
               hx_target=f"#admin-week-{week}-table",
               hx_swap="outerHTML",
               cls="pick-link")
@@ -835,7 +1076,7 @@ def create_admin_game_row(game, pick, user_id, week):
     if home_spread and home_spread['point'] > 0:
         actions.append(
             A(f"H({home_spread['point']})", 
-              hx_post=f"/admin/add_pick/{game.game_id}/{home_team_full}/upset/{home_spread['point']}/{user_id}",
+              hx_post=f"/admin/add_pick/{game.game_id}/{home_team_full}/upset/{user_id}",
               hx_target=f"#admin-week-{week}-table",
               hx_swap="outerHTML",
               cls="pick-link")
@@ -865,63 +1106,80 @@ def create_admin_game_row(game, pick, user_id, week):
     )
 
 @rt('/admin/add_pick/{game_id:int}/{team}/lock/{user_id}')
-def admin_add_pick(game_id: int, team: str, user_id: str, auth):
-    """Admin function to add a lock pick for any user"""
-    if not is_admin_user(auth):
-        return error_response("Access denied", game_id, auth)
+def admin_add_pick(game_id: int, team: str, user_id: str, auth, session):
+    """Admin function to add a lock pick for any member of the league"""
+    league_id = current_league(auth, session)
+    if not is_admin_user(auth, league_id) or get_league_role(league_id, user_id) is None:
+        return error_response("Access denied", game_id, auth, league_id)
     
     try:
-        add_pick(user_id, game_id, team, pick_type='lock', points=3.0)
+        add_pick(user_id, game_id, team, pick_type='lock', points=3.0, allow_locked=True, league_id=league_id, actor=auth)
         game = get_game(game_id)
         week = get_game_week(game['datetime'])
         week_games = get_games_for_week(week)
-        user_picks = get_user_picks(user_id)
+        user_picks = get_user_picks(user_id, league_id=league_id)
         user_picks_dict = {p.game_id: p for p in user_picks if get_game_week(get_game(p.game_id)['datetime']) == week}
         return create_admin_picks_table(week_games, user_picks_dict, user_id, week)
     except ValueError as e:
-        return error_response(str(e), game_id, auth)
-
-@rt('/admin/add_pick/{game_id:int}/{team}/upset/{points:float}/{user_id}')
-def admin_add_upset_pick(game_id: int, team: str, points: float, user_id: str, auth):
-    """Admin function to add an upset pick for any user"""
-    if not is_admin_user(auth):
-        return error_response("Access denied", game_id, auth)
+        return error_response(str(e), game_id, auth, league_id)
+
+@rt('/admin/add_pick/{game_id:int}/{team}/upset/{user_id}')
+def admin_add_upset_pick(game_id: int, team: str, user_id: str, auth, session):
+    """Admin function to add an upset pick for any member of the league"""
+    league_id = current_league(auth, session)
+    if not is_admin_user(auth, league_id) or get_league_role(league_id, user_id) is None:
+        return error_response("Access denied", game_id, auth, league_id)
     
     try:
-        add_pick(user_id, game_id, team, pick_type='upset', points=points)
+        add_pick(user_id, game_id, team, pick_type='upset', allow_locked=True, league_id=league_id, actor=auth)
         game = get_game(game_id)
         week = get_game_week(game['datetime'])
         week_games = get_games_for_week(week)
-        user_picks = get_user_picks(user_id)
+        user_picks = get_user_picks(user_id, league_id=league_id)
         user_picks_dict = {p.game_id: p for p in user_picks if get_game_week(get_game(p.game_id)['datetime']) == week}
         return create_admin_picks_table(week_games, user_picks_dict, user_id, week)
     except ValueError as e:
-        return error_response(str(e), game_id, auth)
+        return error_response(str(e), game_id, auth, league_id)
+
+@rt('/admin/picks/week/{week:int}/{user_id}')
+def admin_set_week_picks(week: int, user_id: str, auth, session, lock: list[str] = None, upset: str = None):
+    """Admin function to set a user's whole week in one request"""
+    league_id = current_league(auth, session)
+    week_games = get_games_for_week(week)
+    if not is_admin_user(auth, league_id) or get_league_role(league_id, user_id) is None or not week_games:
+        return P("Access denied" if week_games else f"No games found for week {week}")
+    
+    try:
+        locks = [parse_slate_entry(entry) for entry in lock or []]
+        user_picks = set_week_picks(user_id, week_games, locks, parse_slate_entry(upset) if upset else None,
+                                    allow_locked=True, league_id=league_id, actor=auth)
+        week_game_ids = {g.game_id for g in week_games}
+        user_picks_dict = {p.game_id: p for p in user_picks if p.game_id in week_game_ids}
+        return create_admin_picks_table(week_games, user_picks_dict, user_id, week)
+    except ValueError as e:
+        return error_response(str(e), week_games[0].game_id, auth, league_id)
 
 @rt('/admin/remove_pick/{game_id:int}/{user_id}')
-def admin_remove_pick(game_id: int, user_id: str, auth):
-    """Admin function to remove a pick for any user"""
-    if not is_admin_user(auth):
-        return error_response("Access denied", game_id, auth)
+def admin_remove_pick(game_id: int, user_id: str, auth, session):
+    """Admin function to remove a pick for any member of the league"""
+    league_id = current_league(auth, session)
+    if not is_admin_user(auth, league_id) or get_league_role(league_id, user_id) is None:
+        return error_response("Access denied", game_id, auth, league_id)
     
     try:
-        user_picks = get_user_picks(user_id)
-        for pick in user_picks:
-            if pick.game_id == game_id:
-                db.t.picks.delete(pick.id)
-                break
+        remove_pick(user_id, game_id, league_id, actor=auth)
         
         game = get_game(game_id)
         week = get_game_week(game['datetime'])
         week_games = get_games_for_week(week)
         
         # Update user_picks after removing the pick
-        user_picks = get_user_picks(user_id)
+        user_picks = get_user_picks(user_id, league_id=league_id)
         user_picks_dict = {p.game_id: p for p in user_picks if get_game_week(get_game(p.game_id)['datetime']) == week}
         
         return create_admin_picks_table(week_games, user_picks_dict, user_id, week)
     except Exception as e:
-        return error_response(str(e), game_id, auth)
+        return error_response(str(e), game_id, auth, league_id)
 
 # Cron job endpoints (no authentication required)
 @rt('/update_results')
@@ -952,74 +1210,298 @@ def update_spreads_endpoint():
         logger.error(f"Full traceback: {traceback.format_exc()}")
         return {"status": "error", "message": str(e)}, 500
 
+# Prometheus scrape endpoint; set METRICS_TOKEN to require "Authorization: Bearer <token>" (or ?token=)
+@rt('/metrics')
+def get(req):
+    """Request, job, freshness, quota, WAL and cache metrics in Prometheus text format"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and token not in (req.headers.get('authorization', '').removeprefix('Bearer '), req.query_params.get('token')):
+        return JSONResponse({"error": "Invalid metrics token"}, status_code=401)
+    return Response(render_metrics(db, db_path), media_type='text/plain; version=0.0.4')
+
+# JSON read API (v1): keyset pagination via ?after=<cursor>&limit=, field selection via ?fields=a,b
+@rt('/api/v1/schedule')
+def api_schedule(req, week: int = None, season: int = None, after: str = None, limit: int = None, fields: str = None):
+    """Schedule of a season (default: current), optionally for one week"""
+    try:
+        rows, next_key = get_schedule_page(week, decode_cursor(after), page_size(limit), season)
+    except ValueError as e:
+        return api_error(str(e))
+    return api_response(req, rows, next_key, fields)
+
+@rt('/api/v1/users/{username}/picks')
+def api_user_picks(req, auth, username: str, week: int = None, season: int = None, league: int = DEFAULT_LEAGUE_ID,
+                   after: str = None, limit: int = None, fields: str = None):
+    """A user's picks in a league and season (default: current), optionally for one week"""
+    if get_league_role(league, auth) is None:
+        return api_error("Not a member of this league", 403)
+    user_info = get_user_info_by_username(username)
+    if not user_info:
+        return api_error("User not found", 404)
+    try:
+        rows, next_key = get_user_picks_page(user_info['user_id'], week, decode_cursor(after), page_size(limit), season, league)
+    except ValueError as e:
+        return api_error(str(e))
+    return api_response(req, rows, next_key, fields)
+
+@rt('/api/v1/standings')
+def api_standings(req, auth, season: int = None, league: int = DEFAULT_LEAGUE_ID, after: str = None, limit: int = None, fields: str = None):
+    """Leaderboard of a league and season (default: current) ordered by score"""
+    if get_league_role(league, auth) is None:
+        return api_error("Not a member of this league", 403)
+    try:
+        rows, next_key = get_standings_page(decode_cursor(after, score_cursor), page_size(limit), season, league)
+    except ValueError as e:
+        return api_error(str(e))
+    return api_response(req, rows, next_key, fields)
+
+@rt('/api/v1/lines')
+def api_lines(req, week: int = None, season: int = None, after: str = None, limit: int = None, fields: str = None):
+    """Latest spread per game, bookmaker and team in a season (default: current)"""
+    try:
+        rows, next_key = get_latest_lines_page(week, decode_cursor(after), page_size(limit), season)
+    except ValueError as e:
+        return api_error(str(e))
+    return api_response(req, rows, next_key, fields)
+
+@rt('/api/v1/games/{game_id:int}/lines')
+def api_line_movement(req, game_id: int, fields: str = None):
+    """Open, close and consensus home-team spread per bookmaker, with the largest moves"""
+    movement = get_line_movement(game_id)
+    if movement is None:
+        return api_error("Game not found", 404)
+    return api_response(req, movement, fields=fields)
+
+@rt('/api/v1/projections')
+def api_projections(req, auth, league: int = DEFAULT_LEAGUE_ID, fields: str = None):
+    """Each league member's simulated finish distribution and win odds"""
+    if get_league_role(league, auth) is None:
+        return api_error("Not a member of this league", 403)
+    return api_response(req, project_standings(league_id=league), fields=fields)
+
+# Server-sent events: scores, kickoff locks and leaderboard totals as htmx fragments
+@rt('/live')
+async def live(auth, session):
+    """Live update stream shared by every open page; leaderboard totals only for the user's current league"""
+    league_id = await run_db(current_league, auth, session)
+    return EventStream(broker.stream(league_id))
+
+# Platform probes (no auth, no rendering): liveness, and readiness with database and ingest checks
+@rt('/healthz')
+def get():
+    """The process is up and serving requests"""
+    return liveness()
+
+@rt('/readyz')
+def get():
+    """Database reachable and migrated; stale ingest data is reported alongside"""
+    ready, report = readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
 @rt('/admin/health')
 def health_check():
     """Health check endpoint for monitoring"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 @rt('/admin/db/tables')
-def db_tables():
+def db_tables(auth):
     """View all database tables"""
+    if not is_admin_user(auth):
+        return JSONResponse({"error": "Access denied"}, status_code=403)
     try:
-        tables = db.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
-        return {"tables": [table[0] for table in tables]}
+        return {"tables": table_names()}
     except Exception as e:
-        return {"error": str(e)}, 500
+        return JSONResponse({"error": str(e)}, status_code=500)
 
 @rt('/admin/db/table/{table_name}')
-def db_table_view(table_name: str):
-    """View contents of a specific table"""
+def db_table_view(table_name: str, req, auth, after: int = None, limit: int = 100, order: str = 'asc'):
+    """Page through a table by rowid; any other query parameter is a column filter (col=value, col__gt=value, ...)"""
+    if not is_admin_user(auth):
+        return JSONResponse({"error": "Access denied"}, status_code=403)
     try:
-        # Get table schema
-        schema = db.execute(f"PRAGMA table_info({table_name});").fetchall()
-        
-        # Get table data (limit to 1000 rows for safety)
-        data = db.execute(f"SELECT * FROM {table_name} LIMIT 1000;").fetchall()
-        
+        schema = table_schema(table_name)
+        data, next_rowid = browse_table(table_name, dict(req.query_params), after, max(1, min(limit, 1000)), order == 'desc')
         return {
             "table": table_name,
-            "schema": [{"column": row[1], "type": row[2], "nullable": not row[3]} for row in schema],
+            "schema": schema,
             "data": data,
-            "row_count": len(data)
+            "row_count": len(data),
+            "next": next_rowid
         }
+    except KeyError as e:
+        return JSONResponse({"error": e.args[0]}, status_code=404)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     except Exception as e:
-        return {"error": str(e)}, 500
+        return JSONResponse({"error": str(e)}, status_code=500)
 
 @rt('/admin/db/spreads')
-def db_spreads_view():
-    """View spreads table specifically"""
+def db_spreads_view(req, auth, after: int = None, limit: int = 100):
+    """View spreads table specifically, newest first"""
+    return db_table_view('spreads', req, auth, after, limit, 'desc')
+
+@rt('/admin/db/export/{table_name}')
+def db_table_export(table_name: str, req, auth, format: str = 'ndjson'):
+    """Stream a whole table (with optional column filters) as NDJSON or CSV"""
+    if not is_admin_user(auth):
+        return JSONResponse({"error": "Access denied"}, status_code=403)
     try:
-        # Check if spreads table exists
-        tables = db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='spreads';").fetchall()
-        if not tables:
-            return {"error": "Spreads table does not exist"}
-        
-        # Get spreads data
-        data = db.execute("SELECT * FROM spreads ORDER BY timestamp DESC LIMIT 100;").fetchall()
-        
-        return {
-            "table": "spreads",
-            "data": data,
-            "row_count": len(data)
-        }
-    except Exception as e:
-        return {"error": str(e)}, 500
+        filters = dict(req.query_params)
+        parse_filters(table_name, filters)
+    except KeyError as e:
+        return JSONResponse({"error": e.args[0]}, status_code=404)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if format == 'csv':
+        return StreamingResponse(export_csv(table_name, filters), media_type='text/csv',
+                                 headers={'Content-Disposition': f'attachment; filename={table_name}.csv'})
+    return StreamingResponse(export_ndjson(table_name, filters), media_type='application/x-ndjson',
+                             headers={'Content-Disposition': f'attachment; filename={table_name}.ndjson'})
     
+@rt('/admin/db/rebuild_pick_counts')
+def post(auth):
+    """Recount the per-game pick shares from the picks table"""
+    if not is_admin_user(auth):
+        return JSONResponse({"error": "Access denied"}, status_code=403)
+    rebuild_pick_counts()
+    return {"status": "rebuilt"}
+
+@rt('/admin/queries')
+def admin_queries(auth):
+    """Queries per request by route, the most expensive statements and recent slow queries"""
+    if not is_admin_user(auth):
+        return Titled("Access Denied", P("You do not have permission to access this page."))
+    stats = query_stats.snapshot()
+    routes_table = Table(
+        Tr(Th("Route"), Th("Requests"), Th("Avg queries"), Th("Max queries"), Th("Avg DB ms"), Th("Avg ms"), Th("Most repeated statement")),
+        *[Tr(
+            Td(r['route']), Td(r['requests']), Td(f"{r['avg_queries']:.1f}"), Td(r['max_queries']),
+            Td(f"{r['avg_db_ms']:.1f}"), Td(f"{r['avg_ms']:.1f}"),
+            Td(Small(f"{r['repeated_count']}x {r['repeated_sql']}") if r['repeated_sql'] else "")
+        ) for r in stats['routes']]
+    )
+    statements_table = Table(
+        Tr(Th("Statement"), Th("Count"), Th("Total ms"), Th("Avg ms"), Th("Max ms")),
+        *[Tr(Td(Small(q['sql'])), Td(q['count']), Td(f"{q['total_ms']:.1f}"), Td(f"{q['avg_ms']:.2f}"), Td(f"{q['max_ms']:.1f}"))
+          for q in stats['statements']]
+    )
+    slow_table = Table(
+        Tr(Th("When"), Th("Route"), Th("ms"), Th("Statement"), Th("Parameters")),
+        *[Tr(Td(datetime.fromtimestamp(q['at']).strftime("%m/%d %H:%M:%S")), Td(q['route']), Td(q['ms']), Td(Small(q['sql'])), Td(Small(q['params'])))
+          for q in stats['slow']]
+    )
+    return Titled(
+        "Admin - Query Stats",
+        Div(
+            A("Back to Admin", href="/admin", cls="nav-link"),
+            Form(Button("Reset", type="submit"), method="post", action="/admin/queries/reset"),
+            cls="sidebar"
+        ),
+        Div(
+            H2("Routes"), routes_table,
+            H2("Statements by total time"), statements_table,
+            H2(f"Slow queries (over {stats['slow_query_ms']:.0f} ms)"), slow_table,
+            cls="main-content"
+        )
+    )
+
+@rt('/admin/queries/reset')
+def post(auth):
+    """Clear the query aggregates"""
+    if not is_admin_user(auth):
+        return JSONResponse({"error": "Access denied"}, status_code=403)
+    query_stats.reset()
+    return RedirectResponse('/admin/queries', status_code=303)
+
+@rt('/admin/profiles')
+def admin_profiles(auth):
+    """Recent request profiles; add ?profile=1 to any page to capture one"""
+    if not is_admin_user(auth):
+        return Titled("Access Denied", P("You do not have permission to access this page."))
+    table = Table(
+        Tr(Th("When"), Th("Request"), Th("Status"), Th("ms"), Th("Samples"), Th("")),
+        *[Tr(Td(datetime.fromtimestamp(p['at']).strftime("%m/%d %H:%M:%S")), Td(f"{p['method']} {p['path']}"), Td(p['status']),
+             Td(f"{p['ms']:.0f}"), Td(p['samples']),
+             Td(A("Top functions", href=f"/admin/profiles/{p['id']}"), " ", A("Collapsed stacks", href=f"/admin/profiles/{p['id']}/collapsed")))
+          for p in profiler.profiles]
+    )
+    return Titled(
+        "Admin - Profiles",
+        Div(A("Back to Admin", href="/admin", cls="nav-link"), cls="sidebar"),
+        Div(
+            P(f"Add ?profile=1 to a page to sample it every {profiler.PROFILE_INTERVAL_MS:g} ms, or ?profile=collapsed to download "
+              f"the stacks directly. The last {profiler.PROFILE_HISTORY} profiles are kept."),
+            table,
+            cls="main-content"
+        )
+    )
+
+@rt('/admin/profiles/{profile_id}')
+def admin_profile(auth, profile_id: int):
+    """The functions a profile spent the most samples in"""
+    if not is_admin_user(auth):
+        return Titled("Access Denied", P("You do not have permission to access this page."))
+    profile = get_profile(profile_id)
+    if not profile:
+        return Titled("Profile not found", A("Back to Profiles", href="/admin/profiles"))
+    return Titled(
+        f"Profile {profile_id}: {profile['method']} {profile['path']}",
+        Div(A("Back to Profiles", href="/admin/profiles", cls="nav-link"),
+            A("Collapsed stacks", href=f"/admin/profiles/{profile_id}/collapsed", cls="nav-link"), cls="sidebar"),
+        Div(
+            P(f"{profile['ms']:.0f} ms, {profile['samples']} samples every {profile['interval_ms']:g} ms, status {profile['status']}"),
+            Table(Tr(Th("Function"), Th("Self"), Th("Total")),
+                  *[Tr(Td(Small(frame)), Td(own), Td(total)) for frame, own, total in top_functions(profile)]),
+            cls="main-content"
+        )
+    )
+
+@rt('/admin/profiles/{profile_id}/collapsed')
+def admin_profile_collapsed(auth, profile_id: int):
+    """A profile's stacks in collapsed format, for flamegraph.pl or speedscope"""
+    if not is_admin_user(auth):
+        return JSONResponse({"error": "Access denied"}, status_code=403)
+    profile = get_profile(profile_id)
+    if not profile:
+        return JSONResponse({"error": "Profile not found"}, status_code=404)
+    return Response(collapsed(profile), media_type='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.collapsed.txt"'})
+
+@rt('/admin/pick_events')
+def admin_pick_events(auth, user_id: str = None):
+    """The newest pick events (placements, changes, removals, grading, admin overrides), optionally for one user"""
+    if not is_admin_user(auth):
+        return Titled("Access Denied", P("You do not have permission to access this page."))
+    events = recent_events(user_id)
+    table = Table(
+        Tr(Th("When"), Th("Event"), Th("League"), Th("User"), Th("Game"), Th("Pick"), Th("Points"), Th("Correct"), Th("By")),
+        *[Tr(Td(datetime.fromtimestamp(e['ts']).strftime("%m/%d %H:%M:%S")), Td(e['kind']), Td(e['league_id']),
+             Td(A(e['user_id'], href=f"/admin/pick_events?user_id={e['user_id']}")), Td(e['game_id']),
+             Td(f"{e['team']} ({e['pick_type']})" if e['team'] else ""), Td(e['points'] if e['points'] is not None else ""),
+             Td("" if e['correct'] is None else "yes" if e['correct'] else "no"), Td(e['actor'] or ""))
+          for e in events]
+    )
+    return Titled(
+        "Admin - Pick Log",
+        Div(A("Back to Admin", href="/admin", cls="nav-link"),
+            A("All users", href="/admin/pick_events", cls="nav-link") if user_id else "", cls="sidebar"),
+        Div(P(f"Newest {len(events)} events{f' for {user_id}' if user_id else ''}. "
+              "Standings at any point in time: /leaderboard?as_of=YYYY-MM-DD."), table, cls="main-content")
+    )
+
 @rt('/admin/download_db')
-def download_db():
-    """Download the database file"""
+def download_db(auth, compress: bool = False):
+    """Download a consistent snapshot of the database, streamed in chunks (gzip with ?compress=1)"""
+    if not is_admin_user(auth):
+        return JSONResponse({"error": "Access denied"}, status_code=403)
     try:
-        db_path = '/app/data/main.db'
-        
-        if not os.path.exists(db_path):
-            return {"error": f"Database not found at {db_path}"}, 404
-            
-        with open(db_path, 'rb') as f:
-            content = f.read()
-        return Response(content, media_type='application/octet-stream', 
-                       headers={'Content-Disposition': 'attachment; filename=main.db'})
+        snapshot = create_snapshot()
     except Exception as e:
-        return {"error": str(e)}, 500
+        logger.error(f"Error creating database snapshot: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+    return StreamingResponse(iter_file(snapshot, compress=compress, delete=True),
+                             media_type='application/gzip' if compress else 'application/octet-stream',
+                             headers={'Content-Disposition': f'attachment; filename={snapshot_filename(compress)}'})
 
 if __name__ == "__main__":
     # For Railway deployment, use the PORT environment variable
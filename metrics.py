@@ -0,0 +1,168 @@
+from contextlib import contextmanager
+from datetime import datetime
+from cache import VersionedCache
+from query_stats import route_template
+import query_stats
+import odds_api
+from writer import writer
+import os
+import threading
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition for /metrics, without a client library: route latency histograms
+# and status counts from a middleware, ingest job runs, data freshness, Odds API quota, WAL
+# size, cache hit ratios and per-route query totals.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_requests = {}   # (route, method, status) -> count
+_latency = {}    # (route, method) -> [bucket counts..., +Inf count, sum]
+_jobs = {}       # job -> dict(runs, failures, duration, rows, last_success, last_failure)
+_started = time.time()
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    with _lock:
+        key = (route, method, status)
+        _requests[key] = _requests.get(key, 0) + 1
+        hist = _latency.setdefault((route, method), [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[len(LATENCY_BUCKETS)] += 1
+        hist[-1] += seconds
+
+class MetricsMiddleware:
+    """Times every HTTP request by route template, method and response status"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def capture_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_status)
+        finally:
+            observe_request(route_template(scope), scope['method'], status, time.perf_counter() - started)
+
+@contextmanager
+def track_job(name: str):
+    """Time an ingest job; set `rows` on the yielded dict to report how many rows it wrote"""
+    run = dict(rows=0)
+    started = time.time()
+    try:
+        yield run
+    except Exception:
+        with _lock:
+            job = _jobs.setdefault(name, _new_job())
+            job['runs'] += 1
+            job['failures'] += 1
+            job['last_failure'] = time.time()
+        raise
+    with _lock:
+        job = _jobs.setdefault(name, _new_job())
+        job['runs'] += 1
+        job['duration'] = time.time() - started
+        job['rows'] = run['rows']
+        job['rows_total'] += run['rows']
+        job['last_success'] = time.time()
+
+def _new_job():
+    return dict(runs=0, failures=0, duration=None, rows=0, rows_total=0, last_success=None, last_failure=None)
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels.items()) + '}'
+
+def render_metrics(db, db_path: str):
+    """All metrics in text exposition format (version 0.0.4)"""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{_labels(**labels) if labels else ''} {value}" for labels, value in samples if value is not None)
+
+    with _lock:
+        requests = dict(_requests)
+        latency = {key: list(hist) for key, hist in _latency.items()}
+        jobs = {name: dict(job) for name, job in _jobs.items()}
+    now = time.time()
+
+    metric('pickem_http_requests_total', 'counter', 'HTTP requests by route template, method and status',
+           [(dict(route=r, method=m, status=s), n) for (r, m, s), n in sorted(requests.items())])
+    metric('pickem_http_errors_total', 'counter', 'HTTP requests answered with a 5xx status',
+           [(dict(route=r, method=m), n) for (r, m), n in sorted(_sum_errors(requests).items())])
+    lines.append("# HELP pickem_http_request_duration_seconds HTTP request latency by route template and method")
+    lines.append("# TYPE pickem_http_request_duration_seconds histogram")
+    for (route, method), hist in sorted(latency.items()):
+        for bound, count in zip(LATENCY_BUCKETS, hist):
+            lines.append(f"pickem_http_request_duration_seconds_bucket{_labels(route=route, method=method, le=bound)} {count}")
+        lines.append(f"pickem_http_request_duration_seconds_bucket{_labels(route=route, method=method, le='+Inf')} {hist[len(LATENCY_BUCKETS)]}")
+        lines.append(f"pickem_http_request_duration_seconds_sum{_labels(route=route, method=method)} {hist[-1]:.6f}")
+        lines.append(f"pickem_http_request_duration_seconds_count{_labels(route=route, method=method)} {hist[len(LATENCY_BUCKETS)]}")
+
+    metric('pickem_job_runs_total', 'counter', 'Ingest job runs', [(dict(job=j), s['runs']) for j, s in jobs.items()])
+    metric('pickem_job_failures_total', 'counter', 'Ingest job runs that raised', [(dict(job=j), s['failures']) for j, s in jobs.items()])
+    metric('pickem_job_duration_seconds', 'gauge', 'Duration of the last successful run', [(dict(job=j), s['duration']) for j, s in jobs.items()])
+    metric('pickem_job_rows', 'gauge', 'Rows written by the last successful run', [(dict(job=j), s['rows']) for j, s in jobs.items()])
+    metric('pickem_job_rows_total', 'counter', 'Rows written by all successful runs', [(dict(job=j), s['rows_total']) for j, s in jobs.items()])
+    metric('pickem_job_last_success_timestamp_seconds', 'gauge', 'When the job last succeeded',
+           [(dict(job=j), s['last_success']) for j, s in jobs.items()])
+
+    # Freshness: spreads from the newest stored poll (survives restarts), scores from this process's last run
+    freshness = [(dict(source='scores'), now - jobs['results']['last_success'] if jobs.get('results', {}).get('last_success') else None)]
+    latest_poll = db.execute('SELECT timestamp FROM spreads WHERE id = (SELECT MAX(id) FROM spreads)').fetchone()
+    if latest_poll:
+        freshness.append((dict(source='spreads'), now - datetime.fromisoformat(latest_poll[0]).timestamp()))
+    metric('pickem_data_age_seconds', 'gauge', 'Seconds since the data source was last updated', freshness)
+
+    quota = odds_api.quota
+    metric('pickem_odds_api_requests_remaining', 'gauge', 'Odds API quota left, from the last response', [({}, quota['remaining'])])
+    metric('pickem_odds_api_requests_used', 'gauge', 'Odds API quota used this period, from the last response', [({}, quota['used'])])
+
+    wal_path = f"{db_path}-wal"
+    metric('pickem_sqlite_wal_bytes', 'gauge', 'Size of the SQLite write-ahead log',
+           [({}, os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)])
+    metric('pickem_sqlite_db_bytes', 'gauge', 'Size of the SQLite database file',
+           [({}, os.path.getsize(db_path) if os.path.exists(db_path) else None)])
+
+    caches = sorted(VersionedCache.registry.items())
+    metric('pickem_cache_hits_total', 'counter', 'Cache hits', [(dict(cache=n), c.hits) for n, c in caches])
+    metric('pickem_cache_misses_total', 'counter', 'Cache misses (recomputes)', [(dict(cache=n), c.misses) for n, c in caches])
+    metric('pickem_cache_hit_ratio', 'gauge', 'Cache hits / lookups', [(dict(cache=n), c.hit_ratio) for n, c in caches])
+    metric('pickem_cache_entries', 'gauge', 'Cached entries', [(dict(cache=n), len(c._data)) for n, c in caches])
+
+    routes = query_stats.snapshot()['routes']
+    metric('pickem_db_queries_total', 'counter', 'SQL statements issued by requests, by route',
+           [(dict(route=r['route']), r['queries']) for r in routes])
+    metric('pickem_db_seconds_total', 'counter', 'Time spent in SQL by requests, by route',
+           [(dict(route=r['route']), round(r['db_ms'] / 1000, 6)) for r in routes])
+
+    metric('pickem_db_writes_total', 'counter', 'Writes run by the single writer', [({}, writer.stats['writes'])])
+    metric('pickem_db_write_failures_total', 'counter', 'Writes that raised (their savepoint rolled back)', [({}, writer.stats['failures'])])
+    metric('pickem_db_write_batches_total', 'counter', 'Group commits by the single writer', [({}, writer.stats['batches'])])
+    metric('pickem_db_write_queue_depth', 'gauge', 'Writes waiting for the writer', [({}, writer.queue.qsize())])
+
+    metric('pickem_process_start_time_seconds', 'gauge', 'When this process started', [({}, _started)])
+    return "\n".join(lines) + "\n"
+
+def _sum_errors(requests):
+    errors = {}
+    for (route, method, status), count in requests.items():
+        if status >= 500:
+            errors[(route, method)] = errors.get((route, method), 0) + count
+    return errors
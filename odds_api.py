@@ -0,0 +1,59 @@
+import os
+import time
+import requests
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The Odds API, or a stand-in (bench/odds_server.py) when ODDS_API_BASE_URL points elsewhere
+ODDS_API_BASE_URL = os.environ.get('ODDS_API_BASE_URL', 'https://api.the-odds-api.com').rstrip('/')
+ODDS_API_TIMEOUT = float(os.environ.get('ODDS_API_TIMEOUT', 20))
+ODDS_API_RETRIES = int(os.environ.get('ODDS_API_RETRIES', 2))
+# Warn when fewer requests than this are left in the month's quota
+ODDS_API_QUOTA_WARNING = int(os.environ.get('ODDS_API_QUOTA_WARNING', 50))
+SPORT = 'americanfootball_nfl'
+
+# Usage reported by the x-requests-* headers of the last response
+quota = {'remaining': None, 'used': None, 'last_cost': None, 'updated_at': None}
+
+class OddsApiError(Exception):
+    pass
+
+def record_quota(headers):
+    if 'x-requests-remaining' not in headers:
+        return
+    quota.update(remaining=int(float(headers['x-requests-remaining'])),
+                 used=int(float(headers.get('x-requests-used', 0))),
+                 last_cost=int(float(headers.get('x-requests-last', 0))),
+                 updated_at=time.time())
+    if quota['remaining'] < ODDS_API_QUOTA_WARNING:
+        logger.warning(f"Odds API quota low: {quota['remaining']} requests left ({quota['used']} used)")
+
+def get_odds_api(endpoint: str, **params):
+    """GET /v4/sports/{SPORT}/{endpoint}/ and return the JSON body.
+
+    Timeouts, 429s and 5xx responses are retried with backoff; other errors (bad key,
+    exhausted quota) raise OddsApiError straight away since retrying cannot help.
+    """
+    api_key = os.environ.get('ODDS_API_KEY')
+    if not api_key:
+        raise ValueError("API key not found. Please set the ODDS_API_KEY environment variable.")
+    url = f"{ODDS_API_BASE_URL}/v4/sports/{SPORT}/{endpoint}/"
+    for attempt in range(ODDS_API_RETRIES + 1):
+        try:
+            response = requests.get(url, params={'apiKey': api_key, **params}, timeout=ODDS_API_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = OddsApiError(f"{endpoint}: {e}")
+        else:
+            record_quota(response.headers)
+            if response.ok:
+                return response.json()
+            error = OddsApiError(f"{endpoint}: HTTP {response.status_code} {response.text[:200]}")
+            if response.status_code != 429 and response.status_code < 500:
+                raise error
+        if attempt < ODDS_API_RETRIES:
+            logger.warning(f"Odds API request failed (attempt {attempt + 1}), retrying: {error}")
+            time.sleep(0.5 * 2 ** attempt)
+    raise error
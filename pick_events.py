@@ -0,0 +1,122 @@
+from database import (db, picks, TEAM_NAMES, PICK_EVENT_KINDS, PICK_TYPE_CODES, DEFAULT_LEAGUE_ID, current_season,
+                      get_leaderboard, rebuild_pick_counts, record_rank_history, backfill_pick_events)
+from cache import bump
+from writer import serialized_write
+from datetime import datetime
+import argparse
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Replays the append-only pick_events log (written by every pick write in database.py). One pass in
+# id order folds the events into the picks as they stood at any moment, which rebuilds the picks
+# table after a loss, feeds as-of leaderboards and checks the live tables against their history.
+
+KIND_NAMES = {code: name for name, code in PICK_EVENT_KINDS.items()}
+PICK_TYPE_NAMES = {code: name for name, code in PICK_TYPE_CODES.items()}
+
+def replay(as_of: float = None, league_id: int = None):
+    """{(league_id, user_id, game_id): pick} from the events up to `as_of` (epoch seconds, default: all)"""
+    where, params = [], []
+    if as_of is not None:
+        where.append("ts <= ?")
+        params.append(as_of)
+    if league_id is not None:
+        where.append("league_id = ?")
+        params.append(league_id)
+    state = {}
+    for ts, kind, league, user_id, game_id, team_id, pick_type, points, correct in db.execute(
+            f"""SELECT ts, kind, league_id, user_id, game_id, team_id, pick_type, points, correct FROM pick_events
+                {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY id""", params):
+        key = (league, user_id, game_id)
+        kind = KIND_NAMES[kind]
+        if kind == 'graded':
+            if key in state:
+                state[key]['correct'] = correct
+        elif kind == 'removed' or team_id is None:
+            state.pop(key, None)
+        else:
+            state[key] = dict(team_id=team_id, pick_type=PICK_TYPE_NAMES[pick_type], points=points, correct=None, ts=ts)
+    return state
+
+def standings_as_of(as_of: float, season: int = None, league_id: int = DEFAULT_LEAGUE_ID):
+    """The league's leaderboard (same rows as get_leaderboard) as it stood at `as_of`"""
+    season = season or current_season()
+    seasons = dict(db.execute('SELECT game_id, season FROM schedule WHERE season = ?', [season]).fetchall())
+    scores = {}
+    for (_, user_id, game_id), pick in replay(as_of, league_id).items():
+        if game_id in seasons and pick['correct']:
+            scores[user_id] = scores.get(user_id, 0) + pick['points']
+    rows = [dict(row, score=scores.get(row['user_id'], 0)) for row in get_leaderboard(season, league_id)]
+    return sorted(rows, key=lambda row: -row['score'])
+
+def pick_counts_as_of(as_of: float = None, league_id: int = DEFAULT_LEAGUE_ID):
+    """{game_id: {(team, pick_type): count}}, the consensus as it stood at `as_of`"""
+    counts = {}
+    for (_, _, game_id), pick in replay(as_of, league_id).items():
+        key = (TEAM_NAMES[pick['team_id']], pick['pick_type'])
+        game = counts.setdefault(game_id, {})
+        game[key] = game.get(key, 0) + 1
+    return counts
+
+def _pick_rows(state):
+    seasons = dict(db.execute('SELECT game_id, season FROM schedule').fetchall())
+    return [dict(user_id=user_id, game_id=game_id, pick=TEAM_NAMES[p['team_id']], timestamp=datetime.fromtimestamp(p['ts']).isoformat(),
+                 correct=None if p['correct'] is None else bool(p['correct']), pick_type=p['pick_type'], points=p['points'],
+                 season=seasons.get(game_id), league_id=league_id, team_id=p['team_id'])
+            for (league_id, user_id, game_id), p in state.items()]
+
+def verify():
+    """Differences between the live picks table and the replayed log, as (key, live, replayed) tuples"""
+    live = {(p['league_id'], p['user_id'], p['game_id']): (p['team_id'], p['pick_type'], p['points'], p['correct'])
+            for p in db.q('SELECT league_id, user_id, game_id, team_id, pick_type, points, correct FROM picks')}
+    replayed = {key: (p['team_id'], p['pick_type'], p['points'], p['correct']) for key, p in replay().items()}
+    return [(key, live.get(key), replayed.get(key)) for key in sorted(live.keys() | replayed.keys(), key=str)
+            if live.get(key) != replayed.get(key)]
+
+@serialized_write
+def _replace_picks(rows):
+    with db.conn:
+        db.execute('DELETE FROM picks')
+        picks.insert_all(rows)
+
+def rebuild_picks():
+    """Replace the picks table with the replayed log, then recount pick counts and rank history.
+
+    The cache versions bumped here are per process: a web server running alongside the CLI keeps
+    serving pages, projections and pick counts cached from the old picks until it restarts.
+    """
+    started = time.time()
+    rows = _pick_rows(replay())
+    _replace_picks(rows)
+    rebuild_pick_counts()
+    record_rank_history()
+    bump('results', *{f"picks:{row['league_id']}" for row in rows}, *{f"results:{row['league_id']}" for row in rows})
+    logger.info(f"Rebuilt {len(rows)} picks from the event log in {time.time() - started:.2f}s")
+    return len(rows)
+
+def recent_events(user_id: str = None, limit: int = 200):
+    """The newest events, optionally for one user, with kinds, pick types and teams decoded"""
+    rows = db.q(f"""SELECT id, ts, kind, league_id, user_id, game_id, team_id, pick_type, points, correct, actor FROM pick_events
+                    {'WHERE user_id = ?' if user_id else ''} ORDER BY id DESC LIMIT ?""", ([user_id] if user_id else []) + [limit])
+    return [dict(row, kind=KIND_NAMES[row['kind']], pick_type=PICK_TYPE_NAMES.get(row['pick_type']),
+                 team=TEAM_NAMES.get(row['team_id'])) for row in rows]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the pick event log")
+    parser.add_argument('command', choices=['verify', 'rebuild', 'backfill'],
+                        help="verify: compare picks with the log; rebuild: restore picks from the log; backfill: seed an empty log")
+    args = parser.parse_args()
+    if args.command == 'verify':
+        differences = verify()
+        for key, live, replayed in differences[:50]:
+            print(f"{key}: picks={live} log={replayed}")
+        print(f"{len(differences)} differences")
+        raise SystemExit(1 if differences else 0)
+    elif args.command == 'rebuild':
+        print(f"Rebuilt {rebuild_picks()} picks; restart the web app so it drops pages cached from the old picks")
+    else:
+        print(f"Seeded {backfill_pick_events()} events")
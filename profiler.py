@@ -0,0 +1,150 @@
+from collections import Counter, deque
+from starlette.responses import Response
+from query_stats import route_template
+import itertools
+import os
+import sys
+import threading
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# On-demand sampling profiler for admin requests: ?profile=1 (or an X-Profile: 1 header) samples
+# the stacks of the request's threads while it runs and keeps the result for /admin/profiles;
+# ?profile=collapsed returns the collapsed stacks (flamegraph.pl / speedscope input) instead of
+# the page. Sync handlers run on a worker thread the middleware can't see, so every request
+# thread is sampled and stacks without a frame from this app (idle workers, the event loop
+# waiting) are dropped; concurrent requests can show up in a profile.
+
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 2))
+PROFILE_HISTORY = int(os.environ.get('PROFILE_HISTORY', 20))
+# Background threads that are never part of a request
+BACKGROUND_THREADS = ('job-', 'lock-sweeper', 'db-writer')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+profiles = deque(maxlen=PROFILE_HISTORY)
+_ids = itertools.count(1)
+_busy = threading.Lock()
+
+def frame_label(code):
+    """`function (file:line)`, with paths relative to the app or to site-packages"""
+    path = code.co_filename
+    if path.startswith(APP_DIR):
+        path = os.path.relpath(path, APP_DIR)
+    elif 'site-packages' in path:
+        path = path.split('site-packages' + os.sep, 1)[1]
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(';', ',')
+
+def _is_app_frame(code):
+    return code.co_filename.startswith(APP_DIR) and '-packages' not in code.co_filename
+
+class Sampler:
+    """Collects stack samples of every request thread on a background thread until stopped"""
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or names.get(ident, '').startswith(BACKGROUND_THREADS):
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if not any(_is_app_frame(code) for code in codes):
+                    continue
+                self.stacks[';'.join(frame_label(code) for code in reversed(codes))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def collapsed(profile):
+    """Brendan Gregg's collapsed format: one `root;...;leaf count` line per distinct stack"""
+    return "\n".join(f"{stack} {count}" for stack, count in profile['stacks'].most_common()) + "\n"
+
+def top_functions(profile, limit: int = 25):
+    """(function, self samples, total samples) for the functions on the most sampled stacks"""
+    own, total = Counter(), Counter()
+    for stack, count in profile['stacks'].items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [(frame, own[frame], count) for frame, count in total.most_common(limit)]
+
+def get_profile(profile_id: int):
+    return next((p for p in profiles if p['id'] == profile_id), None)
+
+class ProfilerMiddleware:
+    """Profiles requests that ask for it when `allowed(session)` is true; must sit inside the session middleware"""
+    def __init__(self, app, allowed):
+        self.app, self.allowed = app, allowed
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        mode = _requested_mode(scope)
+        if not mode or not self.allowed(scope.get('session') or {}):
+            return await self.app(scope, receive, send)
+        if not _busy.acquire(blocking=False):
+            logger.info("Profile requested while another is running; serving unprofiled")
+            return await self.app(scope, receive, send)
+
+        status = 500
+        profile_id = next(_ids)
+
+        async def send_with_profile(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if mode == 'collapsed':
+                    return
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile', f"/admin/profiles/{profile_id}".encode())]
+            elif mode == 'collapsed':
+                return
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            with Sampler() as sampler:
+                await self.app(scope, receive, send_with_profile)
+        finally:
+            _busy.release()
+            profile = dict(id=profile_id, route=route_template(scope), path=scope['path'], method=scope['method'],
+                           status=status, ms=(time.perf_counter() - started) * 1000, samples=sampler.samples,
+                           interval_ms=sampler.interval * 1000, stacks=sampler.stacks, at=time.time())
+            profiles.appendleft(profile)
+            logger.info(f"Profiled {profile['method']} {profile['path']}: {profile['ms']:.0f} ms, {sampler.samples} samples")
+        if mode == 'collapsed':
+            await Response(collapsed(profile), media_type='text/plain', headers={
+                'content-disposition': f'attachment; filename="profile-{profile_id}.collapsed.txt"'})(scope, receive, send)
+
+def _requested_mode(scope):
+    """'collapsed' or 'store' from ?profile= or the X-Profile header, None when not asked for"""
+    value = None
+    for part in scope.get('query_string', b'').decode().split('&'):
+        if part.startswith('profile='):
+            value = part[len('profile='):]
+    if value is None:
+        value = dict(scope.get('headers') or []).get(b'x-profile', b'').decode() or None
+    if value in (None, '', '0'):
+        return None
+    return 'collapsed' if value == 'collapsed' else 'store'
@@ -0,0 +1,128 @@
+from database import db, current_season, DEFAULT_LEAGUE_ID, USER_NAME_SQL
+from cache import VersionedCache
+import numpy as np
+import math
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Standard deviation of NFL final margins around the spread
+SPREAD_STDDEV = 13.45
+DEFAULT_SIMULATIONS = 5000
+# Simulations scored per batch; keeps the batch x users working set cache-sized
+BATCH_SIMULATIONS = 250
+# Finish positions tracked individually in the distribution
+TOP_POSITIONS = 10
+
+# Keyed by (league_id, simulations, seed); a league's entries only go stale with its own picks and grading
+projection_cache = VersionedCache('projections', lambda key: ('results', f"results:{key[0]}", f"picks:{key[0]}", 'spreads'), maxsize=32)
+
+def home_win_probabilities(home_points):
+    """P(home wins) from the home spread (negative = favored), NaN spreads count as a coin flip"""
+    z = -np.nan_to_num(np.asarray(home_points, dtype=np.float64), nan=0.0) / (SPREAD_STDDEV * math.sqrt(2))
+    return 0.5 * (1 + np.vectorize(math.erf)(z))
+
+def load_projection_inputs(league_id=DEFAULT_LEAGUE_ID):
+    """A league's members with their graded score, and every outstanding pick on an unfinished game"""
+    users = db.q(f"""SELECT u.user_id, u.username, {USER_NAME_SQL} AS name,
+                           COALESCE(SUM(CASE WHEN p.correct THEN p.points END), 0) AS score
+                    FROM league_members m JOIN users u ON u.user_id = m.user_id
+                    LEFT JOIN picks p ON p.league_id = m.league_id AND p.season = ? AND p.user_id = m.user_id
+                    WHERE m.league_id = ?
+                    GROUP BY u.user_id""", [current_season(), league_id])
+    pending = db.execute("""SELECT p.user_id, p.game_id, p.team_id = s.home_team_id, p.points
+                            FROM picks p JOIN schedule s ON s.game_id = p.game_id
+                            WHERE p.league_id = ? AND p.season = ? AND p.correct IS NULL AND NOT COALESCE(s.completed, 0)""",
+                         [league_id, current_season()]).fetchall()
+    game_ids = sorted({row[1] for row in pending})
+    lines = {}
+    if game_ids:
+        lines = dict(db.execute(f"""SELECT sp.game_id, AVG(sp.point) FROM spreads sp JOIN schedule s ON s.game_id = sp.game_id
+                                    WHERE sp.id IN (SELECT MAX(id) FROM spreads WHERE game_id IN ({','.join('?' * len(game_ids))})
+                                                    GROUP BY game_id, team_id, bookmaker)
+                                      AND sp.team_id = s.home_team_id
+                                    GROUP BY sp.game_id""", game_ids).fetchall())
+    return users, pending, game_ids, lines
+
+def simulate_standings(base_scores, pick_users, pick_games, pick_home, pick_points, home_win_prob,
+                       simulations=DEFAULT_SIMULATIONS, seed=None):
+    """Monte Carlo over the remaining games.
+
+    Picks become a games x users points matrix per side, so each simulated slate is scored
+    for every user with one matrix product. Returns per-user win share, finish-position
+    counts for the top TOP_POSITIONS, and mean rank / score.
+    """
+    n_users, n_games = len(base_scores), len(home_win_prob)
+    home = np.zeros((n_games, n_users), dtype=np.float32)
+    away = np.zeros((n_games, n_users), dtype=np.float32)
+    np.add.at(home, (pick_games[pick_home], pick_users[pick_home]), pick_points[pick_home])
+    np.add.at(away, (pick_games[~pick_home], pick_users[~pick_home]), pick_points[~pick_home])
+    swing, floor = home - away, base_scores.astype(np.float32) + away.sum(axis=0)
+
+    rng = np.random.default_rng(seed)
+    probs = home_win_prob.astype(np.float32)
+    wins = np.zeros(n_users)
+    positions = np.zeros(n_users * TOP_POSITIONS, dtype=np.int64)
+    rank_sum = np.zeros(n_users)
+    score_sum = np.zeros(n_users)
+    for start in range(0, simulations, BATCH_SIMULATIONS):
+        batch = min(BATCH_SIMULATIONS, simulations - start)
+        outcomes = (rng.random((batch, n_games), dtype=np.float32) < probs).astype(np.float32)
+        scores = outcomes @ swing + floor
+
+        # Rank = 1 + users strictly ahead. Scores are whole half-points, so each row is
+        # histogrammed and prefix-summed instead of sorted: linear in users.
+        levels = (scores * 2 + 0.5).astype(np.intp)
+        n_levels = int(levels.max()) + 1
+        cells = levels + (np.arange(batch) * n_levels)[:, None]
+        at_or_below = np.cumsum(np.bincount(cells.ravel(), minlength=batch * n_levels).reshape(batch, n_levels), axis=1)
+        ranks = n_users - at_or_below.ravel()[cells] + 1
+
+        leaders = ranks == 1
+        wins += (1 / leaders.sum(axis=1)) @ leaders
+        top = ranks <= TOP_POSITIONS
+        users_idx = np.broadcast_to(np.arange(n_users), ranks.shape)
+        positions += np.bincount(users_idx[top] * TOP_POSITIONS + ranks[top] - 1, minlength=n_users * TOP_POSITIONS)
+        rank_sum += ranks.sum(axis=0)
+        score_sum += scores.sum(axis=0, dtype=np.float64)
+
+    return dict(
+        win=wins / simulations,
+        positions=positions.reshape(n_users, TOP_POSITIONS) / simulations,
+        mean_rank=rank_sum / simulations,
+        mean_score=score_sum / simulations
+    )
+
+def project_standings(simulations=DEFAULT_SIMULATIONS, seed=None, league_id=DEFAULT_LEAGUE_ID):
+    """Finish distribution for every league member, cached until the league's results or picks, or the spreads, change"""
+    def compute():
+        started = time.time()
+        users, pending, game_ids, lines = load_projection_inputs(league_id)
+        if not users:
+            return []
+        user_index = {u['user_id']: i for i, u in enumerate(users)}
+        game_index = {game_id: i for i, game_id in enumerate(game_ids)}
+        pending = [row for row in pending if row[0] in user_index]
+        result = simulate_standings(
+            np.array([u['score'] for u in users], dtype=np.float64),
+            np.array([user_index[row[0]] for row in pending], dtype=np.int64),
+            np.array([game_index[row[1]] for row in pending], dtype=np.int64),
+            np.array([bool(row[2]) for row in pending], dtype=bool),
+            np.array([row[3] for row in pending], dtype=np.float32),
+            home_win_probabilities([lines.get(game_id, np.nan) for game_id in game_ids]),
+            simulations, seed
+        )
+        projection = sorted((dict(
+            user_id=u['user_id'], username=u['username'], name=u['name'], score=u['score'],
+            expected_score=round(float(result['mean_score'][i]), 2),
+            win_probability=round(float(result['win'][i]), 4),
+            top3_probability=round(float(result['positions'][i, :3].sum()), 4),
+            expected_rank=round(float(result['mean_rank'][i]), 2),
+            finish_distribution=[round(float(p), 4) for p in result['positions'][i]]
+        ) for i, u in enumerate(users)), key=lambda r: (-r['win_probability'], r['expected_rank']))
+        logger.info(f"Projected {len(users)} users of league {league_id} over {len(game_ids)} games x {simulations} simulations in {time.time() - started:.2f}s")
+        return projection
+    return projection_cache.get_or_compute((league_id, simulations, seed), compute)
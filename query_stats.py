@@ -0,0 +1,150 @@
+from collections import deque
+from contextvars import ContextVar
+import os
+import re
+import threading
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Query instrumentation: the database handle's execute/q are wrapped so every statement is
+# counted and timed against the request that issued it (a ContextVar, which follows sync
+# handlers into the threadpool). Per-route and per-statement aggregates feed /admin/queries.
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+# The same statement this many times in one request is logged as a likely N+1
+REPEATED_QUERY_LIMIT = int(os.environ.get('REPEATED_QUERY_LIMIT', 25))
+MAX_STATEMENTS = 500
+
+_request = ContextVar('query_stats_request', default=None)
+_local = threading.local()
+_lock = threading.Lock()
+route_stats = {}
+statement_stats = {}
+slow_queries = deque(maxlen=100)
+
+class RequestQueries:
+    """Statements issued while handling one request"""
+    def __init__(self, route: str):
+        self.route, self.count, self.db_ms, self.started = route, 0, 0.0, time.perf_counter()
+        self.statements = {}
+
+def normalize_sql(sql: str):
+    """Collapse whitespace and IN (?, ?, ...) lists so the same query shape aggregates together"""
+    return re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(?...)', ' '.join(sql.split()))
+
+def record(sql: str, params, elapsed_ms: float):
+    shape = normalize_sql(sql)
+    current = _request.get()
+    if current is not None:
+        current.count += 1
+        current.db_ms += elapsed_ms
+        current.statements[shape] = current.statements.get(shape, 0) + 1
+    with _lock:
+        stats = statement_stats.get(shape)
+        if stats is None and len(statement_stats) < MAX_STATEMENTS:
+            stats = statement_stats[shape] = dict(sql=shape, count=0, total_ms=0.0, max_ms=0.0)
+        if stats is not None:
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        route = current.route if current else 'background'
+        params_text = repr(params)[:300]
+        slow_queries.appendleft(dict(sql=shape, params=params_text, ms=round(elapsed_ms, 1), route=route, at=time.time()))
+        logger.warning(f"Slow query ({elapsed_ms:.1f} ms, {route}): {shape} params={params_text}")
+
+def instrument(db):
+    """Wrap a database handle's execute and q; q is timed as a whole (including fetching its rows)"""
+    execute, q = db.execute, db.q
+
+    def timed(fn, sql, params):
+        if getattr(_local, 'depth', 0):
+            return fn(sql, params)
+        _local.depth = 1
+        started = time.perf_counter()
+        try:
+            return fn(sql, params)
+        finally:
+            _local.depth = 0
+            record(sql, params, (time.perf_counter() - started) * 1000)
+
+    db.execute = lambda sql, parameters=None: timed(execute, sql, parameters)
+    db.q = lambda sql, params=None: timed(q, sql, params)
+    return db
+
+def route_template(scope):
+    """/user/alice -> /user/{username}, from the matched path parameters ('unmatched' for 404s, to bound the labels)"""
+    if 'endpoint' not in scope:
+        return 'unmatched'
+    path = scope.get('path', '')
+    for name, value in (scope.get('path_params') or {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+def finish_request(current: RequestQueries, route: str):
+    elapsed_ms = (time.perf_counter() - current.started) * 1000
+    repeated = max(current.statements.items(), key=lambda item: item[1], default=(None, 0))
+    with _lock:
+        stats = route_stats.setdefault(route, dict(route=route, requests=0, queries=0, max_queries=0, db_ms=0.0, total_ms=0.0,
+                                                   repeated_sql=None, repeated_count=0))
+        stats['requests'] += 1
+        stats['queries'] += current.count
+        stats['max_queries'] = max(stats['max_queries'], current.count)
+        stats['db_ms'] += current.db_ms
+        stats['total_ms'] += elapsed_ms
+        if repeated[1] > stats['repeated_count']:
+            stats['repeated_sql'], stats['repeated_count'] = repeated
+    if repeated[1] >= REPEATED_QUERY_LIMIT:
+        logger.warning(f"Possible N+1 in {route}: {repeated[1]}x {repeated[0]}",
+                       extra=dict(event='n_plus_one', route=route, repeated=repeated[1]))
+
+def server_timing(current: RequestQueries):
+    elapsed_ms = (time.perf_counter() - current.started) * 1000
+    return f'db;dur={current.db_ms:.1f};desc="{current.count} queries", app;dur={elapsed_ms:.1f}'
+
+class QueryStatsMiddleware:
+    """Tracks each HTTP request's statements and adds a Server-Timing header with the totals"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        current = RequestQueries(scope.get('path', ''))
+        token = _request.set(current)
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                message.setdefault('headers', [])
+                message['headers'] = list(message['headers']) + [(b'server-timing', server_timing(current).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request.reset(token)
+            current.route = route_template(scope)
+            finish_request(current, current.route)
+
+def snapshot():
+    """Aggregates for the admin page: routes by queries per request, statements by total time, recent slow queries"""
+    with _lock:
+        routes = [dict(s, avg_queries=s['queries'] / s['requests'], avg_db_ms=s['db_ms'] / s['requests'],
+                       avg_ms=s['total_ms'] / s['requests']) for s in route_stats.values()]
+        statements = [dict(s, avg_ms=s['total_ms'] / s['count']) for s in statement_stats.values()]
+    return dict(
+        routes=sorted(routes, key=lambda s: -s['avg_queries']),
+        statements=sorted(statements, key=lambda s: -s['total_ms'])[:50],
+        slow=list(slow_queries),
+        slow_query_ms=SLOW_QUERY_MS
+    )
+
+def reset():
+    with _lock:
+        route_stats.clear()
+        statement_stats.clear()
+        slow_queries.clear()
@@ -0,0 +1,115 @@
+from database import db, spread_summaries, get_season_year, get_game_week, to_est, db_path
+from writer import serialized_write, serialized_alone
+from itertools import groupby
+import pandas as pd
+import os
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Games this many days past kickoff get their spread polls compacted
+SPREADS_RETENTION_DAYS = float(os.environ.get('SPREADS_RETENTION_DAYS', 2))
+RETENTION_INTERVAL_HOURS = float(os.environ.get('RETENTION_INTERVAL_HOURS', 24))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(db_path)), 'archive'))
+# VACUUM only when this share of the file is free pages
+VACUUM_FREE_RATIO = 0.2
+
+SPREAD_COLUMNS = ['id', 'game_id', 'bookmaker', 'team', 'point', 'price', 'timestamp']
+
+def archive_path(game_id: int, game_datetime: str, last_id: int):
+    game_date = to_est(game_datetime)
+    partition = os.path.join(ARCHIVE_DIR, 'spreads', f"season={get_season_year(game_date)}", f"week={get_game_week(game_date):02d}")
+    os.makedirs(partition, exist_ok=True)
+    return os.path.join(partition, f"game-{game_id}-{last_id}.parquet")
+
+def _merge_summary(existing, group):
+    """Fold a (bookmaker, team) group of polls, ordered by time, into its summary row"""
+    points = [r['point'] for r in group]
+    summary = dict(
+        game_id=group[0]['game_id'],
+        bookmaker=group[0]['bookmaker'],
+        team=group[0]['team'],
+        open_point=points[0],
+        open_price=group[0]['price'],
+        first_seen=group[0]['timestamp'],
+        close_point=points[-1],
+        close_price=group[-1]['price'],
+        last_seen=group[-1]['timestamp'],
+        min_point=min(points),
+        max_point=max(points),
+        polls=len(group)
+    )
+    if existing:
+        # The oldest poll in `group` is the row kept by the previous compaction
+        summary.update(
+            open_point=existing['open_point'],
+            open_price=existing['open_price'],
+            first_seen=existing['first_seen'],
+            min_point=min(summary['min_point'], existing['min_point']),
+            max_point=max(summary['max_point'], existing['max_point']),
+            polls=existing['polls'] + len(group) - 1
+        )
+    return summary
+
+def compact_game(game_id: int, game_datetime: str):
+    """Summarize a game's spread polls, archive them to Parquet and keep only the latest poll per line"""
+    rows = db.q(f"SELECT {', '.join(SPREAD_COLUMNS)} FROM spreads WHERE game_id = ? ORDER BY bookmaker, team, timestamp, id", [game_id])
+    existing = {(s['bookmaker'], s['team']): s for s in db.q("SELECT * FROM spread_summaries WHERE game_id = ?", [game_id])}
+    summaries, archived = [], []
+    for key, group in groupby(rows, key=lambda r: (r['bookmaker'], r['team'])):
+        group = list(group)
+        summaries.append(_merge_summary(existing.get(key), group))
+        archived.extend(group[:-1])
+    if not archived:
+        return 0
+
+    # Archive first: a crash before the delete leaves duplicates in the archive, never gaps
+    pd.DataFrame(archived, columns=SPREAD_COLUMNS).to_parquet(archive_path(game_id, game_datetime, max(r['id'] for r in archived)), index=False)
+    _replace_with_summaries(summaries, [r['id'] for r in archived])
+    return len(archived)
+
+# Only the table changes go through the writer; the Parquet archive above is written off it
+@serialized_write
+def _replace_with_summaries(summaries, ids):
+    with db.conn:
+        spread_summaries.upsert_all(summaries, pk=('game_id', 'bookmaker', 'team'))
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            db.execute(f"DELETE FROM spreads WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+
+def compact_spreads(retention_days: float = SPREADS_RETENTION_DAYS):
+    cutoff = time.time() - retention_days * 86400
+    games = db.execute("""SELECT s.game_id, g.datetime FROM spreads s JOIN schedule g ON g.game_id = s.game_id
+                          WHERE g.kickoff < ?
+                          GROUP BY s.game_id HAVING COUNT(*) > COUNT(DISTINCT s.bookmaker || '|' || s.team)""", [cutoff]).fetchall()
+    total = sum(compact_game(game_id, game_datetime) for game_id, game_datetime in games)
+    logger.info(f"Compacted {total} spread rows from {len(games)} games")
+    return total
+
+# Runs on the writer's connection between batches: VACUUM can't run inside a transaction, and no
+# write can land while it rewrites the file
+@serialized_alone
+def optimize_database(vacuum: bool = None):
+    """Refresh planner statistics; VACUUM when enough of the file is free pages (or when forced)"""
+    db.execute('ANALYZE')
+    page_count = db.execute('PRAGMA page_count').fetchone()[0]
+    free_pages = db.execute('PRAGMA freelist_count').fetchone()[0]
+    if vacuum or (vacuum is None and page_count and free_pages / page_count > VACUUM_FREE_RATIO):
+        logger.info(f"Vacuuming database ({free_pages}/{page_count} pages free)")
+        db.execute('VACUUM')
+
+def run_retention():
+    compact_spreads()
+    optimize_database()
+
+def read_archived_spreads(game_id: int = None, season: int = None):
+    """Load archived spread polls from the Parquet partitions"""
+    root = os.path.join(ARCHIVE_DIR, 'spreads')
+    if season is not None:
+        root = os.path.join(root, f"season={season}")
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=SPREAD_COLUMNS)
+    return pd.read_parquet(root, filters=[('game_id', '=', game_id)] if game_id is not None else None)
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+# The app reads its database path at import: point it at a scratch database before any test imports
+# database.py. A new database is built from schedule.parquet, read relative to the repository root.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ['PICKEM_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='pickem-tests-'), 'test.db')
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def user():
+    """A new member of the default league"""
+    from database import upsert_user
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    upsert_user(f"{name}@example.com", name, name)
+    return f"{name}@example.com"
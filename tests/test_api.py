@@ -0,0 +1,43 @@
+import pytest
+from starlette.testclient import TestClient
+from api import encode_cursor, decode_cursor, id_cursor, score_cursor
+
+@pytest.mark.parametrize('key, valid', [(42, id_cursor), ([12.5, 'user@example.com'], score_cursor)])
+def test_cursor_round_trip(key, valid):
+    cursor = encode_cursor(key)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, valid) == key
+
+def test_empty_cursor_is_first_page():
+    assert encode_cursor(None) is None
+    assert decode_cursor(None) is None and decode_cursor('') is None
+
+@pytest.mark.parametrize('cursor', ['not a cursor', encode_cursor('42'), encode_cursor(True), encode_cursor([3, 'user'])])
+def test_id_cursor_rejects_other_shapes(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+@pytest.mark.parametrize('key', [42, [3], ['3', 'user'], [True, 'user'], [3, 4]])
+def test_score_cursor_rejects_other_shapes(key):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(encode_cursor(key), score_cursor)
+
+@pytest.fixture(scope='module')
+def client():
+    import main
+    client = TestClient(main.app)
+    client.get('/mock_login', follow_redirects=True)
+    return client
+
+def test_schedule_pages_follow_the_cursor(client):
+    first = client.get('/api/v1/schedule?limit=2').json()
+    second = client.get(f"/api/v1/schedule?limit=2&after={first['next']}").json()
+    assert decode_cursor(first['next']) == first['data'][-1]['game_id']
+    assert second['data'][0]['game_id'] > first['data'][-1]['game_id']
+
+def test_endpoints_reject_cursors_of_another_endpoint(client):
+    standings_cursor = encode_cursor([3.0, 'user@example.com'])
+    r = client.get(f"/api/v1/schedule?after={standings_cursor}")
+    assert r.status_code == 400 and r.json() == {'error': 'Invalid cursor'}
+    r = client.get(f"/api/v1/standings?after={encode_cursor(42)}")
+    assert r.status_code == 400 and r.json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,54 @@
+import time
+from database import db, add_pick, remove_pick, update_pick_correctness, get_all_games, get_game_week, get_team_id, DEFAULT_LEAGUE_ID
+from pick_events import replay, verify
+
+def week_games(week):
+    return [g for g in get_all_games() if get_game_week(g.datetime) == week]
+
+def user_picks(user):
+    return {p['game_id']: (p['team_id'], p['pick_type'], p['points'], p['correct'])
+            for p in db.q('SELECT game_id, team_id, pick_type, points, correct FROM picks WHERE user_id = ?', [user])}
+
+def replayed(user, as_of=None):
+    return {game_id: (p['team_id'], p['pick_type'], p['points'], p['correct'])
+            for (_, user_id, game_id), p in replay(as_of, DEFAULT_LEAGUE_ID).items() if user_id == user}
+
+def test_replay_matches_the_picks_table(user):
+    first, second = week_games(2)[:2]
+    third = week_games(5)[0]
+    add_pick(user, first.game_id, first.home_team, allow_locked=True)
+    add_pick(user, first.game_id, first.away_team, allow_locked=True)
+    add_pick(user, second.game_id, second.home_team, allow_locked=True)
+    add_pick(user, third.game_id, third.home_team, allow_locked=True)
+    remove_pick(user, third.game_id)
+    db.execute('UPDATE schedule SET away_team_score = 24, home_team_score = 17, completed = 1 WHERE game_id = ?', [first.game_id])
+    update_pick_correctness({'game_id': first.game_id})
+
+    assert replayed(user) == user_picks(user) == {
+        first.game_id: (get_team_id(first.away_team), 'lock', 3.0, 1),
+        second.game_id: (get_team_id(second.home_team), 'lock', 3.0, None),
+    }
+    assert verify() == []
+
+def test_replay_as_of_shows_earlier_picks(user):
+    game = week_games(3)[0]
+    add_pick(user, game.game_id, game.home_team, allow_locked=True)
+    before_change = time.time()
+    add_pick(user, game.game_id, game.away_team, allow_locked=True)
+    before_removal = time.time()
+    remove_pick(user, game.game_id)
+
+    assert replayed(user, before_change) == {game.game_id: (get_team_id(game.home_team), 'lock', 3.0, None)}
+    assert replayed(user, before_removal) == {game.game_id: (get_team_id(game.away_team), 'lock', 3.0, None)}
+    assert replayed(user) == {}
+
+def test_verify_reports_picks_that_differ_from_the_log(user):
+    game = week_games(4)[0]
+    add_pick(user, game.game_id, game.home_team, allow_locked=True)
+    db.execute('UPDATE picks SET points = 5 WHERE user_id = ? AND game_id = ?', [user, game.game_id])
+    try:
+        assert verify() == [((DEFAULT_LEAGUE_ID, user, game.game_id),
+                             (get_team_id(game.home_team), 'lock', 5.0, None),
+                             (get_team_id(game.home_team), 'lock', 3.0, None))]
+    finally:
+        db.execute('UPDATE picks SET points = 3 WHERE user_id = ? AND game_id = ?', [user, game.game_id])
@@ -0,0 +1,40 @@
+import numpy as np
+from projections import simulate_standings, home_win_probabilities, TOP_POSITIONS
+
+def simulate(base_scores, picks, home_win_prob, simulations=1000, seed=7):
+    """`picks` are (user, game, home side?, points) tuples"""
+    users, games, home, points = zip(*picks)
+    return simulate_standings(np.array(base_scores, dtype=np.float64), np.array(users, dtype=np.int64),
+                              np.array(games, dtype=np.int64), np.array(home, dtype=bool),
+                              np.array(points, dtype=np.float32), np.array(home_win_prob), simulations, seed)
+
+def test_settled_games_rank_every_simulation_the_same():
+    # Game 0 always goes home, game 1 always away: 13, 10 and 10.5 points
+    result = simulate([10, 10, 4], [(0, 0, True, 3), (1, 1, True, 3), (2, 1, False, 6.5)], [1.0, 0.0])
+    assert result['win'].tolist() == [1, 0, 0]
+    assert result['mean_score'].tolist() == [13, 10, 10.5]
+    assert result['mean_rank'].tolist() == [1, 3, 2]
+    assert result['positions'].shape == (3, TOP_POSITIONS)
+    assert result['positions'][:, :3].tolist() == [[1, 0, 0], [0, 0, 1], [0, 1, 0]]
+
+def test_ties_share_the_rank_and_the_win():
+    result = simulate([6, 6, 0], [(0, 0, True, 3), (1, 0, True, 3), (2, 0, False, 3)], [1.0])
+    assert result['win'].tolist() == [0.5, 0.5, 0]
+    assert result['mean_rank'].tolist() == [1, 1, 3]
+    assert result['positions'][:, 0].tolist() == [1, 1, 0]
+
+def test_coin_flip_splits_the_win():
+    result = simulate([0, 0], [(0, 0, True, 3), (1, 0, False, 3)], [0.5], simulations=20000)
+    assert abs(result['win'][0] - 0.5) < 0.02
+    assert result['win'].sum() == 1
+    assert np.allclose(result['mean_rank'], 1.5, atol=0.02)
+
+def test_same_seed_same_projection():
+    args = ([3, 0, 1], [(0, 0, True, 3), (1, 0, False, 3), (2, 1, True, 4.5)], [0.4, 0.7])
+    first, second = simulate(*args, seed=11), simulate(*args, seed=11)
+    assert all(np.array_equal(first[key], second[key]) for key in first)
+
+def test_spreads_become_home_win_probabilities():
+    favored, even, underdog, unknown = home_win_probabilities([-7, 0, 7, np.nan])
+    assert favored > 0.5 > underdog and even == unknown == 0.5
+    assert np.isclose(favored + underdog, 1)
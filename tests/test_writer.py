@@ -0,0 +1,78 @@
+import threading
+import pytest
+from database import db
+from writer import writer, after_commit
+
+@pytest.fixture
+def table():
+    db.execute('CREATE TABLE IF NOT EXISTS writer_test (n INTEGER)')
+    db.execute('DELETE FROM writer_test')
+    return 'writer_test'
+
+@pytest.fixture
+def held_writer():
+    """Keeps the writer busy until released, so the writes queued meanwhile form one batch"""
+    started, release = threading.Event(), threading.Event()
+    def block():
+        started.set()
+        release.wait(5)
+    blocker = writer.submit(block)
+    assert started.wait(5)
+    yield release.set
+    release.set()
+    blocker.result(5)
+
+def insert(n):
+    db.execute('INSERT INTO writer_test (n) VALUES (?)', [n])
+    return n
+
+def insert_then_fail(n):
+    insert(n)
+    raise ValueError(f"write {n} failed")
+
+def rows():
+    return [row[0] for row in db.execute('SELECT n FROM writer_test ORDER BY n')]
+
+def test_queued_writes_commit_as_one_batch(table, held_writer):
+    futures = [writer.submit(insert, n) for n in range(10)]
+    batches = writer.stats['batches']
+    held_writer()
+    assert [f.result(5) for f in futures] == list(range(10))
+    assert writer.stats['batches'] == batches + 2  # the blocker's batch, then all ten together
+    assert rows() == list(range(10))
+
+def test_failed_write_rolls_back_only_itself(table, held_writer):
+    futures = [writer.submit(insert, 1), writer.submit(insert_then_fail, 2), writer.submit(insert, 3)]
+    held_writer()
+    assert futures[0].result(5) == 1 and futures[2].result(5) == 3
+    with pytest.raises(ValueError, match="write 2 failed"):
+        futures[1].result(5)
+    assert rows() == [1, 3]
+
+def test_after_commit_runs_only_for_committed_writes(table):
+    seen = []
+    def write(n, fail):
+        insert(n)
+        # A reader on another thread already sees the row when the callback runs
+        after_commit(lambda: seen.append((n, db.execute('SELECT COUNT(*) FROM writer_test WHERE n = ?', [n]).fetchone()[0])))
+        if fail:
+            raise ValueError("rolled back")
+    writer.write(write, 1, False)
+    with pytest.raises(ValueError):
+        writer.write(write, 2, True)
+    assert seen == [(1, 1)]
+
+def test_cancelled_write_is_skipped(table, held_writer):
+    future = writer.submit(insert, 1)
+    assert future.cancel()
+    kept = writer.submit(insert, 2)
+    held_writer()
+    assert kept.result(5) == 2
+    assert rows() == [2]
+
+def test_nested_write_runs_inline(table):
+    def outer():
+        insert(1)
+        return writer.write(insert, 2)
+    assert writer.write(outer) == 2
+    assert rows() == [1, 2]
@@ -1,8 +1,10 @@
 import os
-import requests
 import pandas as pd
 # Modal import removed for Railway deployment
-from database import update_game_results, update_pick_correctness, delete_picks_before_date
+from database import update_game_results, update_pick_correctness, calculate_user_score, record_rank_history, get_schedule_frame, canonical_team_names
+from live import publish_leaderboard_deltas
+from odds_api import get_odds_api
+from metrics import track_job
 from pathlib import Path
 from datetime import datetime
 import pytz
@@ -15,12 +17,12 @@ logger = logging.getLogger(__name__)
 # Railway deployment - no Modal setup needed
 
 def fetch_and_process_results():
-    api_key = os.environ['ODDS_API_KEY']
-    if not api_key:
-        raise ValueError("API key not found. Please set the ODDS_API_KEY environment variable.")
+    with track_job('results') as run:
+        run['rows'] = process_results(get_odds_api('scores', daysFrom=3))
 
-    r = requests.get(f"https://api.the-odds-api.com/v4/sports/americanfootball_nfl/scores/?daysFrom=3&apiKey={api_key}")
-    results = pd.DataFrame(r.json())
+def process_results(data):
+    """Store scores from an Odds API /scores payload, grade the picks and push the new totals; returns the games matched"""
+    results = pd.DataFrame(data)
 
     # Explode the 'scores' column to create separate rows for each team's score
     results_exploded = results.explode('scores')
@@ -51,8 +53,12 @@ def fetch_and_process_results():
     column_order = ['id', 'sport_key', 'sport_title', 'commence_time', 'completed', 'home_team', 'away_team', 'home_team_score', 'away_team_score', 'last_update']
     results_fixed = results_fixed[column_order]
 
-    # Load the schedule data
-    schedule_df = pd.read_parquet("schedule.parquet")
+    # Resolve feed name variants to the schedule's team names before matching
+    for column in ('home_team', 'away_team'):
+        results_fixed[column] = canonical_team_names(results_fixed[column])
+
+    # Load the current season's schedule from the database (kept up to date by ingest_schedule.py)
+    schedule_df = get_schedule_frame()
 
     # Convert commence_time to EST
     est = pytz.timezone('US/Eastern')
@@ -77,17 +83,30 @@ def fetch_and_process_results():
     # Convert game_id to integer type
     merged_results['game_id'] = merged_results['game_id'].astype('int64')
 
-    logger.info(f"Merged results shape: {merged_results.shape}")
-    logger.info(f"Merged results columns: {merged_results.columns}")
-    logger.info(f"Sample of merged results:\n{merged_results.head().to_string()}")
+    logger.info(f"Matched {len(merged_results)} results rows to the schedule")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Sample of merged results:\n{merged_results.head().to_string()}")
 
     # Update the database with the new results
-    update_game_results(merged_results)
+    changed_games = set(update_game_results(merged_results))
 
-    # Update pick correctness for each game
+    # Update pick correctness for each game; only picks whose grade changed come back
+    graded_users = set()
     for _, row in merged_results.iterrows():
         if row['completed'] and not pd.isna(row['game_id']):
-            update_pick_correctness(row)
+            graded = update_pick_correctness(row)
+            if graded:
+                graded_users.update(graded)
+                changed_games.add(int(row['game_id']))
+
+    # Close out the standings of a week that just became fully graded (or was regraded); repeated finals change nothing
+    if changed_games:
+        record_rank_history(game_ids=sorted(changed_games))
+
+    # Push the new totals of everyone who had a graded pick to open leaderboards
+    publish_leaderboard_deltas({(league_id, user_id): calculate_user_score(user_id, league_id=league_id)
+                                for league_id, user_id in graded_users})
+    return len(merged_results)
 
 # For Railway deployment, this can be run as a standalone script
 # or called via HTTP endpoint for scheduled execution
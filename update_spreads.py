@@ -1,8 +1,9 @@
 import os
-import requests
 import pandas as pd
 # Modal import removed for Railway deployment
-from database import update_spreads_in_database
+from database import update_spreads_in_database, get_schedule_frame, canonical_team_names
+from odds_api import get_odds_api
+from metrics import track_job
 from pathlib import Path
 import logging
 import pytz
@@ -14,16 +15,11 @@ logger = logging.getLogger(__name__)
 # Railway deployment - no Modal setup needed
 
 def fetch_and_process_spreads():
-    api_key = os.environ['ODDS_API_KEY']
-    if not api_key:
-        raise ValueError("API key not found. Please set the ODDS_API_KEY environment variable.")
+    with track_job('spreads') as run:
+        run['rows'] = process_spreads(get_odds_api('odds', regions='us', markets='spreads', oddsFormat='american'))
 
-    url = f"https://api.the-odds-api.com/v4/sports/americanfootball_nfl/odds/?apiKey={api_key}&regions=us&markets=spreads&Format=american"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an exception for bad responses
-
-    data = response.json()
-    
+def process_spreads(data):
+    """Match an Odds API /odds payload to the schedule and store its spreads; returns the rows inserted"""
     # Create a list to store spread data
     spreads_data = []
 
@@ -55,8 +51,12 @@ def fetch_and_process_spreads():
     # Create a DataFrame from the spreads data
     spreads_df = pd.DataFrame(spreads_data)
 
-    # Load the schedule data
-    schedule_df = pd.read_parquet("schedule.parquet")
+    # Resolve feed name variants to the schedule's team names before matching
+    for column in ('home_team', 'away_team', 'team'):
+        spreads_df[column] = canonical_team_names(spreads_df[column])
+
+    # Load the current season's schedule from the database (kept up to date by ingest_schedule.py)
+    schedule_df = get_schedule_frame()
 
     # Convert commence_time to EST
     est = pytz.timezone('US/Eastern')
@@ -85,12 +85,12 @@ def fetch_and_process_spreads():
     # Convert game_id to integer type
     merged_spreads['game_id'] = merged_spreads['game_id'].astype('int64')
 
-    logger.info(f"Merged spreads shape: {merged_spreads.shape}")
-    logger.info(f"Merged spreads columns: {merged_spreads.columns}")
-    logger.info(f"Sample of merged spreads:\n{merged_spreads.head().to_string()}")
+    logger.info(f"Matched {len(merged_spreads)} spreads rows to the schedule")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Sample of merged spreads:\n{merged_spreads.head().to_string()}")
 
     # Update the database with the new spreads data
-    update_spreads_in_database(merged_spreads)
+    return update_spreads_in_database(merged_spreads)
 
 # For Railway deployment, this can be run as a standalone script
 # or called via HTTP endpoint for scheduled execution
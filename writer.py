@@ -0,0 +1,193 @@
+from concurrent.futures import Future
+import contextvars
+import functools
+import os
+import queue
+import threading
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Single writer for the database: functions decorated with @serialized_write run on one thread, in
+# the order they were submitted, and the writes that arrive within WRITE_BATCH_MS of each other
+# share one transaction (each in its own savepoint, so a failing write only rolls back itself).
+# Callers block until their write has committed and get its return value or exception.
+# Side effects that announce a write (cache bumps, live updates) are registered with after_commit
+# and run once the write's batch has committed, and not at all if the write fails.
+# @serialized_alone functions (ANALYZE/VACUUM) run by themselves between batches, with no transaction open.
+
+WRITE_BATCH_MS = float(os.environ.get('WRITE_BATCH_MS', 5))
+WRITE_BATCH_MAX = int(os.environ.get('WRITE_BATCH_MAX', 64))
+WRITE_TIMEOUT = float(os.environ.get('WRITE_TIMEOUT', 60))
+
+class Writer:
+    def __init__(self):
+        self.db = None
+        self.queue = queue.Queue()
+        self.thread = None
+        self._start_lock = threading.Lock()
+        self._held = None
+        self._after_commit = None
+        self.stats = dict(writes=0, batches=0, failures=0, largest_batch=0)
+
+    def attach(self, db):
+        """Use this database handle (db.conn a ThreadConnections); the thread starts, and opens its connection, with the first write"""
+        self.db = db
+
+    def on_writer_thread(self):
+        return self.thread is not None and threading.get_ident() == self.thread.ident
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); the returned Future resolves once its batch has committed"""
+        return self._enqueue(fn, args, kwargs, batched=True)
+
+    def submit_alone(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) to run by itself with no transaction open (VACUUM can't run inside one)"""
+        return self._enqueue(fn, args, kwargs, batched=False)
+
+    def _enqueue(self, fn, args, kwargs, batched: bool):
+        if self.thread is None:
+            with self._start_lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self.thread.start()
+        future = Future()
+        # The caller's context goes along so the write is logged and counted against its request
+        self.queue.put((contextvars.copy_context(), fn, args, kwargs, future, batched))
+        return future
+
+    def write(self, fn, *args, **kwargs):
+        # Writes made by a write (join_league inside upsert_user) are already serialized
+        if self.on_writer_thread() or self.db is None:
+            return fn(*args, **kwargs)
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=WRITE_TIMEOUT)
+        except TimeoutError:
+            # A write still in the queue is dropped; one already running is waited for, since it may commit
+            if future.cancel():
+                raise
+            return future.result()
+
+    def write_alone(self, fn, *args, **kwargs):
+        if self.on_writer_thread() or self.db is None:
+            return fn(*args, **kwargs)
+        return self.submit_alone(fn, *args, **kwargs).result()
+
+    def after_commit(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) once the running write has committed; right away outside a serialized write"""
+        if self._after_commit is not None and self.on_writer_thread():
+            self._after_commit.append(functools.partial(fn, *args, **kwargs))
+        else:
+            fn(*args, **kwargs)
+
+    def _call(self, context, fn, args, kwargs, callbacks):
+        """Run one write, collecting the callbacks it registers with after_commit"""
+        self._after_commit = callbacks
+        try:
+            return context.run(fn, *args, **kwargs)
+        finally:
+            self._after_commit = None
+
+    def _run_callbacks(self, context, callbacks):
+        for callback in callbacks:
+            try:
+                context.run(callback)
+            except Exception as e:
+                logger.error(f"After-commit callback {callback.func.__name__} failed: {e}")
+
+    def _next_batch(self):
+        batch = [self._held or self.queue.get()]
+        self._held = None
+        if not batch[0][-1]:
+            return batch
+        deadline = time.perf_counter() + WRITE_BATCH_MS / 1000
+        while len(batch) < WRITE_BATCH_MAX:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if not item[-1]:
+                # Runs on its own once this batch has committed
+                self._held = item
+                break
+            batch.append(item)
+        return batch
+
+    def _run_alone(self, context, fn, args, kwargs, future, batched):
+        if not future.set_running_or_notify_cancel():
+            return
+        callbacks = []
+        try:
+            result = self._call(context, fn, args, kwargs, callbacks)
+        except Exception as e:
+            self.stats['failures'] += 1
+            future.set_exception(e)
+            return
+        self._run_callbacks(context, callbacks)
+        future.set_result(result)
+
+    def _run(self):
+        # Batches commit on the writer's own connection (db.conn is per thread): readers never see
+        # one half-written, and the connection is never in use by another thread
+        self.db.conn.open()
+        while True:
+            batch = self._next_batch()
+            if not batch[0][-1]:
+                self._run_alone(*batch[0])
+                continue
+            # Writes cancelled while they waited in the queue (their caller timed out) are skipped
+            batch = [item for item in batch if item[4].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            results = []
+            try:
+                with self.db.conn:
+                    for context, fn, args, kwargs, future, _ in batch:
+                        callbacks = []
+                        try:
+                            with self.db.conn:
+                                result = self._call(context, fn, args, kwargs, callbacks)
+                            results.append((context, future, result, None, callbacks))
+                        except Exception as e:
+                            results.append((context, future, None, e, []))
+            except Exception as e:
+                # The commit itself failed: nothing in the batch was written
+                logger.error(f"Write batch of {len(batch)} failed to commit: {e}")
+                results = [(context, future, None, e, []) for context, *_, future, _ in batch]
+            for context, future, result, error, callbacks in results:
+                if error is None:
+                    self._run_callbacks(context, callbacks)
+                    future.set_result(result)
+                else:
+                    self.stats['failures'] += 1
+                    future.set_exception(error)
+            self.stats['writes'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+
+writer = Writer()
+
+def serialized_write(fn):
+    """Run the decorated function on the writer thread, group-committed with other writes"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return writer.write(fn, *args, **kwargs)
+    return wrapper
+
+def after_commit(fn, *args, **kwargs):
+    """Call fn(*args, **kwargs) once the current serialized write has committed"""
+    writer.after_commit(fn, *args, **kwargs)
+
+def serialized_alone(fn):
+    """Run the decorated function on the writer thread between batches, outside any transaction"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return writer.write_alone(fn, *args, **kwargs)
+    return wrapper